@@ -203,14 +203,20 @@ def get_provider_address(soup: BeautifulSoup) -> str | None:
     return " ".join(lines).strip()
 
 
-def scrape_store_html(store_id: str, country: str, proxies: dict | None = None) -> dict:
+def scrape_store_html(
+    store_id: str,
+    country: str,
+    proxies: dict | None = None,
+    session: requests.Session | None = None,
+) -> dict:
     """
     Scrape the store html for the developer site.
     """
     logger.info(f"{store_id=} {country=} scrape store html for info")
     url = f"https://apps.apple.com/{country}/app/-/id{store_id}?l=en-GB"
     headers = {"User-Agent": "Mozilla/5.0"}
-    response = requests.get(url, headers=headers, proxies=proxies)
+    http = session or requests
+    response = http.get(url, headers=headers, proxies=proxies)
 
     if response.status_code != 200:
         logger.error(f"Failed to retrieve the page: {response.status_code}")
@@ -310,8 +316,12 @@ def scrape_app_ios(
     language: str,
     scrape_html: bool = False,
     proxies: dict | None = None,
+    scraper: AppStoreScraper | None = None,
+    session: requests.Session | None = None,
 ) -> dict:
     """Scrape iOS app details from the App Store.
+
+    scraper and session can be passed in to reuse them across apps.
     yt_us = scrape_app_ios("544007664", "us", language="en")
     yt_de = scrape_app_ios("544007664", "de", language="en")
 
@@ -332,7 +342,8 @@ def scrape_app_ios(
 
     """
     # NOTE: averageUserRating, Rating_count, Histogram are country specific
-    scraper = AppStoreScraper()
+    if scraper is None:
+        scraper = AppStoreScraper()
     # Note add_ratings is pulling reviews, then not storing them!
     result_dict: dict = scraper.get_app_details(
         store_id,
@@ -347,7 +358,7 @@ def scrape_app_ios(
     result_dict["artistId"] = str(result_dict["artistId"])
     if scrape_html:
         result_dict = scrape_itunes_additional_html(
-            result_dict, store_id, country, proxies
+            result_dict, store_id, country, proxies, session=session
         )
     else:
         result_dict["additional_html_crawl_result"] = 0
@@ -356,11 +367,17 @@ def scrape_app_ios(
 
 
 def scrape_itunes_additional_html(
-    result: dict, store_id: str, country: str, proxies: dict | None = None
+    result: dict,
+    store_id: str,
+    country: str,
+    proxies: dict | None = None,
+    session: requests.Session | None = None,
 ) -> dict:
     try:
         # This is slow and returns 401 often, so use sparingly
-        html_res = scrape_store_html(store_id=store_id, country="de", proxies=proxies)
+        html_res = scrape_store_html(
+            store_id=store_id, country="de", proxies=proxies, session=session
+        )
 
         result["in_app_purchases"] = html_res["in_app_purchases"]
         result["ad_supported"] = html_res["ad_supported"]
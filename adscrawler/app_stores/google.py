@@ -383,14 +383,16 @@ def search_play_store(
         lambda: _run_node_search(node_path, search_term, country, language),
     ]
 
+    last_error = None
     for strategy in strategies:
         try:
             results = strategy()
             break
-        except Exception:
+        except Exception as e:
+            last_error = e
             continue
     else:
-        raise RuntimeError("All Play Store search strategies failed")
+        raise RuntimeError("All Play Store search strategies failed") from last_error
 
     results = normalize_google_search_results(
         results, country=country, language=language
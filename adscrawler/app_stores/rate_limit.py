@@ -0,0 +1,245 @@
+"""Request pacing for store scrapes.
+
+Google Play and the App Store throttle per country storefront, so requests are
+spaced per ``(store, country)`` rather than globally. When a request hits a
+temporary block the whole key is pushed back, so other scrapes of the same
+storefront back off too instead of piling on.
+
+``StoreRateLimiter`` paces the threads of one process. ``RedisTokenBucket``
+shares one budget per storefront across every worker host through Redis: a
+block shrinks the rate for the whole cluster, which then recovers linearly
+back to the configured rate.
+"""
+
+import threading
+import time
+from typing import Any
+
+from adscrawler.config import CONFIG, get_logger
+from adscrawler.metrics import (
+    STORE_RATE_LIMIT_BLOCKS_COUNTER,
+    STORE_RATE_LIMIT_WAIT_HISTOGRAM,
+)
+
+logger = get_logger(__name__)
+
+# Seconds between requests to the same (store, country) storefront
+STORE_MIN_INTERVAL = {1: 0.2, 2: 0.5}
+
+# Requests per second to one storefront shared by all workers
+STORE_CLUSTER_RATE = {1: 20.0, 2: 10.0}
+# A keyword search is heavier than an app page and is the request stores
+# block first, so it costs this many requests of the storefront budget
+SEARCH_REQUEST_WEIGHT = 5.0
+# After a block the rate is multiplied by SHRINK_FACTOR, never below
+# MIN_RATE_FRACTION of the configured rate, and regains the full rate over
+# RECOVERY_SECONDS
+SHRINK_FACTOR = 0.5
+MIN_RATE_FRACTION = 0.05
+RECOVERY_SECONDS = 300
+# Idle storefront buckets expire from Redis
+BUCKET_TTL_SECONDS = 3600
+
+# KEYS[1] bucket hash. ARGV: max_rate, burst, recovery per second, ttl ms,
+# weight. Reserves weight tokens and returns the seconds to wait before using it. Tokens
+# may go negative so concurrent callers queue up behind each other.
+ACQUIRE_SCRIPT = """
+local max_rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local recovery = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'rate', 'ts')
+local tokens = tonumber(state[1]) or burst
+local rate = tonumber(state[2]) or max_rate
+local ts = tonumber(state[3]) or now
+local elapsed = math.max(0, now - ts)
+rate = math.min(max_rate, rate + recovery * elapsed)
+tokens = math.min(burst, tokens + elapsed * rate) - tonumber(ARGV[5])
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'rate', rate, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], ARGV[4])
+if tokens >= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+# KEYS[1] bucket hash. ARGV: max_rate, shrink factor, min rate, pause
+# seconds, ttl ms. Shrinks the rate and drains the bucket so every caller
+# waits at least the pause. Returns the new rate.
+PENALIZE_SCRIPT = """
+local max_rate = tonumber(ARGV[1])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'rate')
+local rate = tonumber(state[2]) or max_rate
+rate = math.max(tonumber(ARGV[3]), rate * tonumber(ARGV[2]))
+local tokens = math.min(tonumber(state[1]) or 0, -tonumber(ARGV[4]) * rate)
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'rate', rate, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], ARGV[5])
+return tostring(rate)
+"""
+
+
+class StoreRateLimiter:
+    """Space out requests per (store, country) across scrape threads."""
+
+    def __init__(self, min_interval: dict[int, float]) -> None:
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_allowed: dict[tuple[int, str], float] = {}
+
+    def wait(self, store: int, country: str, weight: float = 1.0) -> float:
+        """Block until the next request for this storefront may start.
+
+        A request of weight n holds the storefront for n intervals. Returns
+        the seconds slept.
+        """
+        key = (store, country.lower())
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_allowed.get(key, now))
+            self._next_allowed[key] = (
+                start_at + self.min_interval.get(store, 0) * weight
+            )
+        if start_at > now:
+            time.sleep(start_at - now)
+        return max(start_at - now, 0)
+
+    def penalize(self, store: int, country: str, seconds: float) -> None:
+        """Hold back every request for this storefront for at least seconds."""
+        key = (store, country.lower())
+        with self._lock:
+            now = time.monotonic()
+            self._next_allowed[key] = max(
+                self._next_allowed.get(key, now), now + seconds
+            )
+
+
+class RedisTokenBucket:
+    """Token bucket per (store, country) shared by all workers via Redis.
+
+    Same interface as StoreRateLimiter. If Redis is unreachable requests are
+    paced by the local fallback limiter instead of failing the scrape.
+    """
+
+    def __init__(
+        self,
+        client: Any,  # noqa: ANN401
+        rates: dict[int, float],
+        fallback: StoreRateLimiter,
+        key_prefix: str = "store_rate",
+    ) -> None:
+        self.client = client
+        self.rates = rates
+        self.fallback = fallback
+        self.key_prefix = key_prefix
+        self._acquire = client.register_script(ACQUIRE_SCRIPT)
+        self._penalize = client.register_script(PENALIZE_SCRIPT)
+
+    def _key(self, store: int, country: str) -> str:
+        return f"{self.key_prefix}:{store}:{country.lower()}"
+
+    def _rate(self, store: int) -> float:
+        return self.rates.get(store, min(self.rates.values()))
+
+    def wait(self, store: int, country: str, weight: float = 1.0) -> float:
+        """Block until this storefront has weight tokens.
+
+        Returns the seconds slept.
+        """
+        max_rate = self._rate(store)
+        try:
+            wait_s = float(
+                self._acquire(
+                    keys=[self._key(store, country)],
+                    args=[
+                        max_rate,
+                        # Allow a one second burst at the full rate
+                        max(1.0, max_rate),
+                        max_rate / RECOVERY_SECONDS,
+                        BUCKET_TTL_SECONDS * 1000,
+                        weight,
+                    ],
+                )
+            )
+        except Exception as e:
+            logger.warning(f"{store=} {country=} redis rate limit unavailable: {e}")
+            return self.fallback.wait(store, country, weight=weight)
+        STORE_RATE_LIMIT_WAIT_HISTOGRAM.record(wait_s, {"store": str(store)})
+        if wait_s > 0:
+            time.sleep(wait_s)
+        return wait_s
+
+    def penalize(self, store: int, country: str, seconds: float) -> None:
+        """Shrink the storefront rate for all workers and pause it for seconds."""
+        max_rate = self._rate(store)
+        STORE_RATE_LIMIT_BLOCKS_COUNTER.add(1, {"store": str(store)})
+        try:
+            rate = float(
+                self._penalize(
+                    keys=[self._key(store, country)],
+                    args=[
+                        max_rate,
+                        SHRINK_FACTOR,
+                        max_rate * MIN_RATE_FRACTION,
+                        seconds,
+                        BUCKET_TTL_SECONDS * 1000,
+                    ],
+                )
+            )
+            logger.info(f"{store=} {country=} cluster rate shrunk to {rate:.2f}/s")
+        except Exception as e:
+            logger.warning(f"{store=} {country=} redis rate limit unavailable: {e}")
+            self.fallback.penalize(store, country, seconds)
+
+
+RateLimiter = StoreRateLimiter | RedisTokenBucket
+
+
+def _configured_intervals() -> dict[int, float]:
+    settings = CONFIG.get("crawl-settings", {})
+    return {
+        store: float(settings.get(f"store_{store}_min_interval", default))
+        for store, default in STORE_MIN_INTERVAL.items()
+    }
+
+
+def _configured_cluster_rates() -> dict[int, float]:
+    settings = CONFIG.get("crawl-settings", {})
+    return {
+        store: float(settings.get(f"store_{store}_cluster_rate", default))
+        for store, default in STORE_CLUSTER_RATE.items()
+    }
+
+
+STORE_RATE_LIMITER = StoreRateLimiter(min_interval=_configured_intervals())
+
+_cluster_lock = threading.Lock()
+_cluster_limiter: RedisTokenBucket | None = None
+
+
+def get_cluster_rate_limiter() -> RateLimiter:
+    """Return the Redis token bucket, or the local limiter without [redis].
+
+    The Redis client is created lazily so it is never shared across a fork.
+    """
+    global _cluster_limiter  # noqa: PLW0603
+    if "redis" not in CONFIG:
+        return STORE_RATE_LIMITER
+    if _cluster_limiter is None:
+        with _cluster_lock:
+            if _cluster_limiter is None:
+                import redis as redis_module  # noqa: PLC0415
+
+                client = redis_module.from_url(
+                    CONFIG.get("redis", {}).get("url", "redis://127.0.0.1:6379/0"),
+                    socket_connect_timeout=5,
+                    socket_timeout=5,
+                )
+                _cluster_limiter = RedisTokenBucket(
+                    client,
+                    rates=_configured_cluster_rates(),
+                    fallback=STORE_RATE_LIMITER,
+                )
+    return _cluster_limiter
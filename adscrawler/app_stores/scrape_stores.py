@@ -1,8 +1,10 @@
 import datetime
 import random
 import ssl
+import threading
 import time
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from urllib.error import URLError
 from urllib.parse import unquote_plus
 
@@ -14,7 +16,9 @@ from appgoblin_itunes_scraper.exceptions import (
     NotFoundError,
     TemporaryBlockException,
 )
+from appgoblin_itunes_scraper.scraper import AppStoreScraper
 from appgoblin_play_scraper.exceptions import ExtraHTTPError
+from requests.adapters import HTTPAdapter
 
 from adscrawler.app_stores.apkcombo import get_apkcombo_android_apps
 from adscrawler.app_stores.appbrain import get_appbrain_android_apps
@@ -33,12 +37,17 @@ from adscrawler.app_stores.google import (
     search_play_store,
 )
 from adscrawler.app_stores.process_icons import process_app_icon
+from adscrawler.app_stores.rate_limit import (
+    SEARCH_REQUEST_WEIGHT,
+    STORE_RATE_LIMITER,
+    RateLimiter,
+    get_cluster_rate_limiter,
+)
 from adscrawler.app_stores.utils import (
-    build_country_map,
     check_and_insert_new_apps,
     extract_domains_with_sub,
     extract_root_domain,
-    resolve_country_id,
+    get_country_resolver,
 )
 from adscrawler.config import CONFIG, get_logger
 from adscrawler.dbcon.connection import (
@@ -49,8 +58,6 @@ from adscrawler.dbcon.queries import (
     get_crawl_scenario_countries,
     get_store_app_columns,
     prepare_for_psycopg,
-    query_all_developers,
-    query_all_domains,
     query_categories,
     query_collections,
     query_countries,
@@ -60,6 +67,8 @@ from adscrawler.dbcon.queries import (
     query_store_apps_to_update,
     query_store_id_map,
     query_store_ids,
+    resolve_developer_ids,
+    resolve_domain_ids,
     update_from_df,
     upsert_df,
 )
@@ -73,6 +82,58 @@ from adscrawler.process.storage import rankings_parquet_exists_in_s3
 
 logger = get_logger(__name__, "scrape_stores")
 
+# Apps scraped at once per process by process_scrape_apps_and_save
+SCRAPE_CONCURRENCY = int(CONFIG.get("crawl-settings", {}).get("scrape_concurrency", 1))
+
+_thread_local = threading.local()
+
+
+def get_store_clients() -> dict:
+    """HTTP clients reused by every scrape on the current thread.
+
+    requests.Session is not thread safe, so each scrape thread keeps its own
+    session and App Store scraper instead of building new ones per app.
+    """
+    clients = getattr(_thread_local, "store_clients", None)
+    if clients is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=4, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        clients = {"session": session, "ios_scraper": AppStoreScraper()}
+        _thread_local.store_clients = clients
+    return clients
+
+
+def _scrape_chunk_row(
+    row: pd.Series,
+    store: int,
+    process_icon: bool,
+    chunk_info: str,
+    rate_limiter: RateLimiter | None,
+) -> dict | None:
+    try:
+        html_recently_scraped = None
+        if store == 2:
+            html_recently_scraped = row["html_recently_scraped"]
+        result = scrape_app(
+            store=store,
+            store_id=row["store_id"],
+            country=row["country_code"].lower(),
+            language=row["language"].lower(),
+            html_recently_scraped=html_recently_scraped,
+            rate_limiter=rate_limiter,
+        )
+        result["store_app_db_id"] = row["store_app"]
+        if process_icon:
+            result["icon_url_100"] = row.get("icon_url_100", None)
+        return result
+    except Exception as e:
+        logger.exception(
+            f"{chunk_info} store_id={row['store_id']} scrape_app failed: {e}"
+        )
+        return None
+
 
 def process_scrape_apps_and_save(
     df_chunk: pd.DataFrame,
@@ -80,6 +141,8 @@ def process_scrape_apps_and_save(
     process_icon: bool = False,
     total_rows: int | None = None,
     do_pg_update: bool = False,
+    concurrency: int | None = None,
+    rate_limiter: RateLimiter | None = None,
 ) -> None:
     """Process a chunk of apps, scrape app, store to S3 and if country === US store app details to db store_apps table.
 
@@ -88,57 +151,60 @@ def process_scrape_apps_and_save(
         store: Store ID
         process_icon: Whether to process app icons
         total_rows: Total number of apps in the chunk, if None, will be calculated from df_chunk
+        concurrency: Number of apps scraped at once by this process, requests are
+            still spaced per store and country. Defaults to crawl-settings scrape_concurrency
+        rate_limiter: Paces every scrape, ie the cluster wide Redis bucket. Concurrent
+            scrapes default to the in-process limiter, serial scrapes are unpaced
     """
     if total_rows is None:
         total_rows = len(df_chunk)
+    if concurrency is None:
+        concurrency = SCRAPE_CONCURRENCY
     chunk_info = f"{store=} process_scrape_apps_and_save {total_rows=}"
-    logger.info(f"{chunk_info} start")
-    html_recently_scraped = None
+    logger.info(f"{chunk_info} start {concurrency=}")
+    if rate_limiter is None and concurrency > 1:
+        rate_limiter = STORE_RATE_LIMITER
     pgdb = get_db_connection()
-    chunk_results = []
-    try:
-        for _, row in df_chunk.iterrows():
-            try:
-                if store == 2:
-                    html_recently_scraped = row["html_recently_scraped"]
-                result = scrape_app(
-                    store=store,
-                    store_id=row["store_id"],
-                    country=row["country_code"].lower(),
-                    language=row["language"].lower(),
-                    html_recently_scraped=html_recently_scraped,
-                )
-                result["store_app_db_id"] = row["store_app"]
-                if process_icon:
-                    result["icon_url_100"] = row.get("icon_url_100", None)
-                chunk_results.append(result)
-            except Exception as e:
-                logger.exception(
-                    f"{chunk_info} store_id={row['store_id']} scrape_app failed: {e}"
+    rows = [row for _, row in df_chunk.iterrows()]
+    if concurrency <= 1:
+        chunk_results = [
+            _scrape_chunk_row(row, store, process_icon, chunk_info, rate_limiter)
+            for row in rows
+        ]
+    else:
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="scrape_app"
+        ) as executor:
+            # map keeps the chunk order so results_df matches the serial path
+            chunk_results = list(
+                executor.map(
+                    lambda row: _scrape_chunk_row(
+                        row, store, process_icon, chunk_info, rate_limiter
+                    ),
+                    rows,
                 )
-
-        if not chunk_results:
-            logger.warning(f"{chunk_info} produced no results.")
-            return
-        results_df = pd.DataFrame(chunk_results)
-        results_df["crawled_date"] = results_df["crawled_at"].dt.date
-        app_details_to_s3(results_df, store=store)
-        results_df["store_app"] = results_df["store_app_db_id"].astype(int)
-        log_crawl_results(results_df, pgdb=pgdb, store=store)
-        logger.info(f"{chunk_info} S3 and logging upload finished")
-        if do_pg_update:
-            results_df = results_df[(results_df["country"] == "US")]
-            process_live_app_details(
-                store=store,
-                results_df=results_df,
-                pgdb=pgdb,
-                process_icon=process_icon,
             )
-        logger.info(f"{chunk_info} finished")
-    finally:
-        if pgdb and hasattr(pgdb, "engine"):
-            pgdb.engine.dispose()
-            logger.debug(f"{chunk_info} database connection disposed")
+    chunk_results = [result for result in chunk_results if result is not None]
+
+    if not chunk_results:
+        logger.warning(f"{chunk_info} produced no results.")
+        return
+    results_df = pd.DataFrame(chunk_results)
+    results_df["crawled_date"] = results_df["crawled_at"].dt.date
+    app_details_to_s3(results_df, store=store)
+    results_df["store_app"] = results_df["store_app_db_id"].astype(int)
+    log_crawl_results(results_df, pgdb=pgdb, store=store)
+    logger.info(f"{chunk_info} S3 and logging upload finished")
+    if do_pg_update:
+        results_df = results_df[(results_df["country"] == "US")]
+        process_live_app_details(
+            store=store,
+            results_df=results_df,
+            pgdb=pgdb,
+            process_icon=process_icon,
+        )
+    logger.info(f"{chunk_info} finished")
+    logger.debug(f"{chunk_info} db pool {pgdb.pool_status()}")
 
 
 def update_app_details(
@@ -148,6 +214,7 @@ def update_app_details(
     process_icon: bool,
     limit: int,
     country_priority_group: int,
+    concurrency: int | None = None,
 ) -> None:
     """Process apps with dynamic work queue
 
@@ -158,7 +225,10 @@ def update_app_details(
         process_icon: Whether to process app icons
         limit: Limit on number of apps to process
         country_priority_group: Country priority group
+        concurrency: Number of apps each process scrapes at once
     """
+    if concurrency is None:
+        concurrency = SCRAPE_CONCURRENCY
     log_info = f"{store=} group={country_priority_group} update_app_details"
 
     df = query_store_apps_to_update(
@@ -194,7 +264,7 @@ def update_app_details(
 
     logger.info(
         f"{log_info} processing {total_rows} apps in {total_chunks} chunks "
-        f"({workers} processes, sequential per process)"
+        f"({workers} processes, {concurrency} concurrent scrapes per process)"
     )
 
     completed_count = 0
@@ -210,6 +280,7 @@ def update_app_details(
                 process_icon=process_icon,
                 total_rows=total_rows,
                 do_pg_update=True,
+                concurrency=concurrency,
             )
             future_to_idx[future] = idx
             # Only stagger the initial batch to avoid simultaneous API burst
@@ -236,7 +307,9 @@ def crawl_keyword_ranks(pgdb: PostgresEngine) -> None:
     language = "en"
     kdf = query_keywords_to_crawl(pgdb, limit=500)
     all_keywords = pd.DataFrame()
-    sleep_time = 1
+    # Searches share the per storefront budget with app scrapes, each one
+    # costing SEARCH_REQUEST_WEIGHT requests of it
+    rate_limiter = get_cluster_rate_limiter()
     crawl_log = []
     crawl_result_counts: dict[int, int] = {}
     log_info = "crawl_keywords"
@@ -248,6 +321,7 @@ def crawl_keyword_ranks(pgdb: PostgresEngine) -> None:
                 country=country,
                 language=language,
                 keyword=keyword,
+                rate_limiter=rate_limiter,
             )
             if df.empty:
                 crawl_result_counts[3] = crawl_result_counts.get(3, 0) + 1
@@ -270,8 +344,6 @@ def crawl_keyword_ranks(pgdb: PostgresEngine) -> None:
                     "crawled_at": datetime.datetime.now(tz=datetime.UTC),
                 }
             )
-        # Backoff: 1–3 seconds depending on recent errors
-        time.sleep(sleep_time)
     if all_keywords.empty:
         logger.error(f"{log_info} all keywords failed!")
         return
@@ -391,29 +463,58 @@ def scrape_store_ranks(pgdb: PostgresEngine, store: int) -> None:
             logger.exception("ApkCombo RSS feed failed")
 
 
+def _is_block_error(error: BaseException) -> bool:
+    """Whether a search failed on a rate limit / temporary block."""
+    block_errors = (ExtraHTTPError, TemporaryBlockException)
+    return isinstance(error, block_errors) or isinstance(error.__cause__, block_errors)
+
+
+def _search_with_retries(
+    search: Callable[[], list],
+    store: int,
+    country: str,
+    rate_limiter: RateLimiter | None,
+) -> list:
+    """Run a store search, retrying twice with a growing delay.
+
+    On a block the storefront is penalized like in scrape_app, so every
+    worker backs off and the retry waits in rate_limiter.wait instead of a
+    local sleep.
+    """
+    retry_delays = (0.5, 1.0)
+    last_error: Exception | None = None
+    penalized = False
+    for attempt in range(len(retry_delays) + 1):
+        if attempt and not penalized:
+            time.sleep(retry_delays[attempt - 1])
+        if rate_limiter is not None:
+            rate_limiter.wait(store, country, weight=SEARCH_REQUEST_WEIGHT)
+        try:
+            return search()
+        except Exception as exc:
+            last_error = exc
+            penalized = rate_limiter is not None and _is_block_error(exc)
+            if penalized:
+                delay = retry_delays[min(attempt, len(retry_delays) - 1)]
+                logger.warning(f"{store=} {country=} search blocked: {exc!r}")
+                rate_limiter.penalize(store, country, delay)
+    raise last_error
+
+
 def scrape_keyword(
     country: str,
     language: str,
     keyword: str,
+    rate_limiter: RateLimiter | None = None,
 ) -> pd.DataFrame:
     logger.info(f"{keyword=} start")
-    retry_delay = 0.5
-    retry_delays = (0, retry_delay, 1.0)
     try:
-        google_apps = None
-        last_google_error = None
-        for delay in retry_delays:
-            try:
-                if delay:
-                    time.sleep(delay)
-                google_apps = search_play_store(
-                    keyword, country=country, language=language
-                )
-                break
-            except Exception as exc:
-                last_google_error = exc
-        if google_apps is None and last_google_error is not None:
-            raise last_google_error
+        google_apps = _search_with_retries(
+            lambda: search_play_store(keyword, country=country, language=language),
+            store=1,
+            country=country,
+            rate_limiter=rate_limiter,
+        )
         gdf = pd.DataFrame(google_apps)
         gdf["store"] = 1
         gdf["rank"] = range(1, len(gdf) + 1)
@@ -421,20 +522,14 @@ def scrape_keyword(
         gdf = pd.DataFrame()
         logger.exception(f"{keyword=} google failed")
     try:
-        apple_apps = None
-        last_apple_error = None
-        for delay in retry_delays:
-            try:
-                if delay:
-                    time.sleep(delay)
-                apple_apps = search_app_store_for_ids(
-                    keyword, country=country, language=language
-                )
-                break
-            except Exception as exc:
-                last_apple_error = exc
-        if apple_apps is None and last_apple_error is not None:
-            raise last_apple_error
+        apple_apps = _search_with_retries(
+            lambda: search_app_store_for_ids(
+                keyword, country=country, language=language
+            ),
+            store=2,
+            country=country,
+            rate_limiter=rate_limiter,
+        )
         adf = pd.DataFrame(
             {
                 "store": 2,
@@ -553,122 +648,54 @@ def crawl_developers_for_new_store_ids(
 
 
 def check_and_insert_developers(
-    developers_df: pd.DataFrame,
     apps_df: pd.DataFrame,
     pgdb: PostgresEngine,
 ) -> pd.DataFrame:
-    """Adds missing developers to the database and returns updated developer DataFrame."""
-    missing_devs = apps_df[
-        (~apps_df["developer_id"].isin(developers_df["developer_id"]))
-        & (apps_df["developer_id"].notna())
-    ]
-    if not missing_devs.empty:
-        new_devs = missing_devs[
-            ["store", "developer_id", "developer_name"]
-        ].drop_duplicates()
-        new_devs = upsert_df(
-            table_name="developers",
-            df=new_devs.rename(columns={"developer_name": "name"}),
-            insert_columns=["store", "developer_id", "name"],
-            key_columns=["store", "developer_id"],
-            pgdb=pgdb,
-            return_rows=True,
-        )
-        developers_df = pd.concat([new_devs, developers_df])
-    return developers_df
+    """Resolves developer ids for apps_df, inserting any missing developers."""
+    devs = (
+        apps_df.loc[
+            apps_df["developer_id"].notna(),
+            ["store", "developer_id", "developer_name"],
+        ]
+        .drop_duplicates(subset=["store", "developer_id"])
+        .rename(columns={"developer_name": "name"})
+    )
+    return resolve_developer_ids(devs, pgdb=pgdb)
 
 
 def check_and_insert_domains(
-    domains_df: pd.DataFrame,
     apps_df: pd.DataFrame,
     pgdb: PostgresEngine,
 ) -> pd.DataFrame:
-    """Adds missing ad domains to the database and returns updated domain DataFrame.
+    """Resolves domain ids for the apps' urls, inserting any missing domains.
 
     For URLs with subdomains, ensures the root domain exists first and links
-    the subdomain entry to it via ``root_domain_id``.
+    the subdomain entry to it via ``root_domain_id`` (also backfilling
+    existing subdomain entries that lack it).
     """
-
-    # --- 1. Insert any missing root domains first ---
-    root_urls = (
-        apps_df[["root_url"]]
-        .drop_duplicates()
-        .rename(columns={"root_url": "domain_name"})
-    )
-    root_urls = root_urls[root_urls["domain_name"].notna()]
-
-    missing_roots = root_urls[~root_urls["domain_name"].isin(domains_df["domain_name"])]
-    if not missing_roots.empty:
-        new_roots = upsert_df(
-            table_name="domains",
-            df=missing_roots,
-            insert_columns=["domain_name"],
-            key_columns=["domain_name"],
-            pgdb=pgdb,
-            return_rows=True,
-        )
-        domains_df = pd.concat([new_roots, domains_df], ignore_index=True)
-
-    # --- 2. Build domain_name -> id lookup (now includes newly inserted roots) ---
-    domain_id_map = dict(zip(domains_df["domain_name"], domains_df["id"]))
-
-    # --- 3. Backfill root_domain_id on existing subdomain entries that lack it ---
-    stale_subs = domains_df[
-        domains_df["root_domain_id"].isna() & domains_df["domain_name"].notna()
-    ].copy()
-    if not stale_subs.empty:
-        stale_subs["root_domain"] = stale_subs["domain_name"].apply(extract_root_domain)
-        stale_subs = stale_subs[
-            (stale_subs["root_domain"].notna())
-            & (stale_subs["root_domain"] != stale_subs["domain_name"])
+    # --- 1. Resolve root domains first ---
+    root_urls = pd.DataFrame({"domain_name": apps_df["root_url"].dropna().unique()})
+    roots_df = resolve_domain_ids(root_urls, pgdb=pgdb)
+    root_id_map = dict(zip(roots_df["domain_name"], roots_df["id"], strict=True))
+
+    # --- 2. Resolve subdomain URLs with root_domain_id ---
+    subs = (
+        apps_df.loc[
+            apps_df["url"].notna()
+            & apps_df["root_url"].notna()
+            & (apps_df["url"] != apps_df["root_url"]),
+            ["url", "root_url"],
         ]
-        stale_subs["root_domain_id"] = stale_subs["root_domain"].map(domain_id_map)
-        to_update = stale_subs[stale_subs["root_domain_id"].notna()][
-            ["domain_name", "root_domain_id"]
-        ]
-        if not to_update.empty:
-            upsert_df(
-                table_name="domains",
-                df=to_update,
-                insert_columns=["domain_name", "root_domain_id"],
-                key_columns=["domain_name"],
-                pgdb=pgdb,
-                on_conflict_update=True,
-            )
-            # Refresh in-memory copy with updated root_domain_ids
-            domains_df = query_all_domains(pgdb=pgdb)
-            domain_id_map = dict(zip(domains_df["domain_name"], domains_df["id"]))
-            logger.info(
-                f"Backfilled root_domain_id for {len(to_update)} existing subdomain entries"
-            )
-
-    # --- 4. Insert subdomain URLs with root_domain_id ---
-    missing_subdomains = apps_df[
-        (~apps_df["url"].isin(domains_df["domain_name"]))
-        & (apps_df["url"].notna())
-        & (apps_df["root_url"].notna())
-        & (apps_df["url"] != apps_df["root_url"])
-    ]
-    if not missing_subdomains.empty:
-        subs_to_insert = (
-            missing_subdomains[["url", "root_url"]]
-            .drop_duplicates()
-            .rename(columns={"url": "domain_name"})
-        )
-        subs_to_insert["root_domain_id"] = subs_to_insert["root_url"].map(domain_id_map)
-        subs_to_insert = subs_to_insert.drop(columns=["root_url"])
-
-        new_subs = upsert_df(
-            table_name="domains",
-            df=subs_to_insert,
-            insert_columns=["domain_name", "root_domain_id"],
-            key_columns=["domain_name"],
-            pgdb=pgdb,
-            return_rows=True,
-        )
-        domains_df = pd.concat([new_subs, domains_df], ignore_index=True)
+        .drop_duplicates(subset=["url"])
+        .rename(columns={"url": "domain_name"})
+    )
+    subs["root_domain_id"] = subs["root_url"].map(root_id_map)
+    subs_df = resolve_domain_ids(subs, pgdb=pgdb)
 
-    return domains_df
+    new_domains = int(roots_df["created"].sum() + subs_df["created"].sum())
+    if new_domains:
+        logger.info(f"Inserted {new_domains} new domains")
+    return pd.concat([roots_df, subs_df], ignore_index=True)
 
 
 def save_app_domains(
@@ -681,14 +708,11 @@ def save_app_domains(
     apps_df = apps_df[~apps_df["root_url"].isna()]
     # This would mean that urls are frozen if 'removed' but more likely they failed a crawl
     apps_df = apps_df[~apps_df["url"].isna()]
-    all_domains_df = query_all_domains(pgdb=pgdb)
-    all_domains_df = check_and_insert_domains(
-        domains_df=all_domains_df,
-        apps_df=apps_df,
-        pgdb=pgdb,
-    )
+    app_domains_df = check_and_insert_domains(apps_df=apps_df, pgdb=pgdb)
     domain_ids_df = apps_df.merge(
-        all_domains_df.rename(columns={"id": "pub_domain"}),
+        app_domains_df.rename(columns={"id": "pub_domain"})[
+            ["pub_domain", "domain_name"]
+        ],
         left_on="url",
         right_on="domain_name",
         how="left",
@@ -715,6 +739,7 @@ def scrape_from_store(
     html_recently_scraped: bool | None = None,
     proxies: dict | None = None,
 ) -> dict:
+    clients = get_store_clients()
     if store == 1:
         result_dict = scrape_app_gp(
             store_id, country=country, language=language, proxies=proxies
@@ -730,6 +755,8 @@ def scrape_from_store(
             language=language,
             scrape_html=scrape_html,
             proxies=proxies,
+            scraper=clients["ios_scraper"],
+            session=clients["session"],
         )
     else:
         logger.error(f"Store not supported {store=}")
@@ -772,7 +799,13 @@ def scrape_app(
     country: str,
     language: str,
     html_recently_scraped: bool | None = None,
+    rate_limiter: RateLimiter | None = None,
 ) -> dict:
+    """Scrape one app, retrying once via proxies or after a backoff.
+
+    With a rate_limiter every attempt waits for its (store, country) slot and
+    a temporary block backs off the whole storefront instead of only this app.
+    """
     scrape_info = f"{store=}, {country=}, {language=}, {store_id=} scrape_app"
     proxies = None
     max_retries = 1
@@ -785,6 +818,8 @@ def scrape_app(
         retries += 1
         if retries > 1:
             proxies = CONFIG.get("proxies", None)
+        if rate_limiter is not None:
+            rate_limiter.wait(store, country)
         try:
             result_dict = scrape_from_store(
                 store=store,
@@ -814,7 +849,10 @@ def scrape_app(
                 # Add extra jitter for rate-limit errors to avoid conflicts
                 sleep_time = base_delay * (2**retries) + random.uniform(0.05, 1)
                 logger.info(f"{scrape_info} Retrying in {sleep_time:.2f} seconds...")
-                time.sleep(sleep_time)
+                if rate_limiter is not None:
+                    rate_limiter.penalize(store, country, sleep_time)
+                else:
+                    time.sleep(sleep_time)
                 continue
             else:
                 logger.error(
@@ -830,6 +868,7 @@ def scrape_app(
                 # Add extra jitter for SSL errors to avoid connection conflicts
                 sleep_time = base_delay * (2**retries) + random.uniform(0.1, 0.5)
                 logger.info(f"{scrape_info} Retrying in {sleep_time:.2f} seconds...")
+                # Network errors are per connection, only this app backs off
                 time.sleep(sleep_time)
                 continue
             else:
@@ -864,15 +903,10 @@ def save_developer_info(
     apps_df: pd.DataFrame,
     pgdb: PostgresEngine,
 ) -> pd.DataFrame:
-    all_developers_df = query_all_developers(pgdb=pgdb)
-    all_developers_df = check_and_insert_developers(
-        developers_df=all_developers_df,
-        apps_df=apps_df,
-        pgdb=pgdb,
-    )
+    developers_df = check_and_insert_developers(apps_df=apps_df, pgdb=pgdb)
     apps_df = pd.merge(
         apps_df,
-        all_developers_df.rename(columns={"id": "developer"})[
+        developers_df.rename(columns={"id": "developer"})[
             ["store", "developer_id", "developer"]
         ],
         how="left",
@@ -944,6 +978,7 @@ def process_live_app_details(
             update_columns=insert_columns,
             key_columns=key_columns,
             pgdb=pgdb,
+            bulk=True,
         )
         if apps_df is None or apps_df.empty or crawl_result != 1:
             continue
@@ -1017,8 +1052,7 @@ def upsert_app_country_evidence(
     if apps_df.empty:
         return
 
-    # Build country maps once
-    country_id_map, name_to_alpha2 = build_country_map(pgdb)
+    country_resolver = get_country_resolver(pgdb)
 
     if "developer_address" not in apps_df.columns:
         apps_df["developer_address"] = pd.NA
@@ -1036,11 +1070,7 @@ def upsert_app_country_evidence(
     # Drop rows that ended up with no address at all
     apps_df = apps_df.dropna(subset=["raw_address"])
 
-    def get_country_id(raw_address: str) -> int | None:
-        country_id = resolve_country_id(raw_address, country_id_map, name_to_alpha2)
-        return country_id
-
-    apps_df["country_id"] = apps_df["raw_address"].apply(get_country_id)
+    apps_df["country_id"] = country_resolver.resolve_many(apps_df["raw_address"])
 
     evidence_df = apps_df[["store_app", "raw_address", "country_id"]]
 
@@ -6,11 +6,28 @@ import pandas as pd
 import tldextract
 
 from adscrawler.config import get_logger
+from adscrawler.dbcon.cache import STATIC_TTL, reference_cache
 from adscrawler.dbcon.connection import PostgresEngine
-from adscrawler.dbcon.queries import query_countries, query_store_id_map, upsert_df
+from adscrawler.dbcon.queries import (
+    query_countries,
+    resolve_store_app_ids,
+    upsert_df,
+)
 
 logger = get_logger(__name__, "scrape_stores")
 
+COUNTRY_ALIASES = {
+    "korea, south": "KR",
+    "south korea": "KR",
+    "republic of korea": "KR",
+    "usa": "US",
+    "united states of america": "US",
+    "uk": "GB",
+    "united kingdom": "GB",
+}
+
+ADDRESS_TOKEN_RE = re.compile(r"\b\w+\b")
+
 
 def build_name_to_alpha2(countries_df: pd.DataFrame) -> dict[str, str]:
     """Build a lowercase-name -> alpha2 lookup from all language columns."""
@@ -49,16 +66,7 @@ def guess_country_local(
     normalized_address = address_string.lower()
 
     # 1. Handle common edge-case aliases first
-    aliases = {
-        "korea, south": "KR",
-        "south korea": "KR",
-        "republic of korea": "KR",
-        "usa": "US",
-        "united states of america": "US",
-        "uk": "GB",
-        "united kingdom": "GB",
-    }
-    for alias, alpha2 in aliases.items():
+    for alias, alpha2 in COUNTRY_ALIASES.items():
         if alias in normalized_address:
             return alpha2
 
@@ -69,7 +77,7 @@ def guess_country_local(
                 return alpha2
 
     # 3. Check tokens from right to left (countries are usually at the end)
-    tokens = re.findall(r"\b\w+\b", address_string.upper())
+    tokens = ADDRESS_TOKEN_RE.findall(address_string.upper())
     for token in reversed(tokens):
         if name_to_alpha2 is not None and token in name_to_alpha2:
             return name_to_alpha2[token]
@@ -103,6 +111,95 @@ def resolve_country_id(
     return None
 
 
+def _trie_pattern(words: list[str]) -> str:
+    """Regex for any of words, factored as a trie.
+
+    Siblings start with different characters so at most one branch can
+    continue, and optional tails are greedy: the match at a position is
+    always the longest word starting there.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [
+            re.escape(char) + build(child) for char, child in node.items() if char
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class CountryResolver:
+    """Compiled guess_country_local + countries.id lookup.
+
+    Gives the same answers as resolve_country_id, but all country names are
+    matched in one regex pass instead of a sorted scan per address.
+    """
+
+    def __init__(self, countries_df: pd.DataFrame) -> None:
+        self.name_to_alpha2 = build_name_to_alpha2(countries_df)
+        self.country_id_map = dict(
+            zip(
+                countries_df["alpha2"].astype(str).str.strip().str.upper(),
+                countries_df["id"].astype(int),
+                strict=True,
+            )
+        )
+        # guess_country_local prefers longer names, then dict order
+        self._name_rank = {name: i for i, name in enumerate(self.name_to_alpha2)}
+        self._names_re = re.compile(
+            "(?=(" + _trie_pattern(list(self.name_to_alpha2)) + "))"
+        )
+
+    def guess_alpha2(self, address_string: str) -> str | None:
+        if not address_string or not address_string.strip():
+            return None
+        normalized_address = address_string.lower()
+        for alias, alpha2 in COUNTRY_ALIASES.items():
+            if alias in normalized_address:
+                return alpha2
+        best = None
+        for match in self._names_re.finditer(normalized_address):
+            name = match.group(1)
+            if best is None or (len(name), -self._name_rank[name]) > (
+                len(best),
+                -self._name_rank[best],
+            ):
+                best = name
+        if best is not None:
+            return self.name_to_alpha2[best]
+        for token in reversed(ADDRESS_TOKEN_RE.findall(address_string.upper())):
+            if token in self.name_to_alpha2:
+                return self.name_to_alpha2[token]
+        return None
+
+    def resolve(self, address_string: str) -> int | None:
+        alpha2 = self.guess_alpha2(address_string)
+        return self.country_id_map.get(alpha2) if alpha2 else None
+
+    def resolve_many(self, addresses: pd.Series) -> pd.Series:
+        """countries.id per address (Int64, NA if unresolved), same index."""
+        addresses = pd.Series(addresses)
+        ids = {
+            address: self.resolve(address) for address in addresses.dropna().unique()
+        }
+        return addresses.map(ids).astype("Int64")
+
+
+@reference_cache(ttl=STATIC_TTL, tables=("countries",))
+def get_country_resolver(pgdb: PostgresEngine) -> CountryResolver:
+    """Process-wide CountryResolver, rebuilt only when countries change."""
+    return CountryResolver(query_countries(pgdb=pgdb))
+
+
 def truncate_utf8_bytes(s: str, max_bytes: int = 2400) -> str:
     if s is None:
         return ""
@@ -136,42 +233,27 @@ def check_and_insert_new_apps(
     if found_bad_ids:
         logger.error(f"Scrape {store=} {crawl_source=} found bad store_ids")
         raise ValueError("Found bad store_ids")
-    all_scraped_ids = df["store_id"].unique().tolist()
-    existing_ids_map = query_store_id_map(
-        pgdb,
-        store_ids=all_scraped_ids,
+    store_apps_df = resolve_store_app_ids(
+        df[["store", "store_id"]].drop_duplicates(), pgdb=pgdb
     )
-    existing_store_ids = existing_ids_map["store_id"].tolist()
-    new_apps_df = df[~(df["store_id"].isin(existing_store_ids))][
-        ["store", "store_id"]
-    ].drop_duplicates()
-    if new_apps_df.empty:
+    inserted_apps = store_apps_df[store_apps_df["created"]]
+    if inserted_apps.empty:
         logger.info(f"Scrape {store=} {crawl_source=} no new apps")
         return
     logger.info(
-        f"Scrape {store=} {crawl_source=} insert new apps to db {new_apps_df.shape[0]:,}",
+        f"Scrape {store=} {crawl_source=} inserted new apps to db {inserted_apps.shape[0]:,}",
     )
-    insert_columns = ["store", "store_id"]
-    inserted_apps: pd.DataFrame = upsert_df(
-        table_name="store_apps",
-        insert_columns=insert_columns,
-        df=new_apps_df,
+    inserted_apps = inserted_apps.rename(columns={"id": "store_app"})
+    inserted_apps["crawl_source"] = crawl_source
+    insert_columns = ["store", "store_app"]
+    upsert_df(
+        table_name="store_app_sources",
+        insert_columns=insert_columns + ["crawl_source"],
+        df=inserted_apps,
         key_columns=insert_columns,
         pgdb=pgdb,
-        return_rows=True,
+        schema="logging",
     )
-    if inserted_apps is not None and not inserted_apps.empty:
-        inserted_apps["crawl_source"] = crawl_source
-        inserted_apps = inserted_apps.rename(columns={"id": "store_app"})
-        insert_columns = ["store", "store_app"]
-        upsert_df(
-            table_name="store_app_sources",
-            insert_columns=insert_columns + ["crawl_source"],
-            df=inserted_apps,
-            key_columns=insert_columns,
-            pgdb=pgdb,
-            schema="logging",
-        )
     return None
 
 
@@ -7,6 +7,7 @@ from typing import Any
 
 import pandas as pd
 from psycopg import sql
+from psycopg.copy import QueuedLibpqWriter
 
 from adscrawler.config import get_logger
 from adscrawler.dbcon.connection import PostgresEngine
@@ -184,14 +185,18 @@ def _copy_df_to_table_freeze(
 
 
 def atomic_swap_partition_stream(
-    stream: Iterable[str],
+    stream: Iterable[bytes],
     columns: list[str],
     batch_date: datetime.date,
     pgdb: PostgresEngine,
     schema: str,
     table: str,
 ) -> None:
-    """Swap data into a list-partitioned table using a streaming chunk generator (no DataFrame required)."""
+    """Swap data into a list-partitioned table using a streaming chunk generator (no DataFrame required).
+
+    stream yields Postgres CSV chunks of the columns, ie from stream_duckdb_csv,
+    where an unquoted empty field is NULL.
+    """
     date_str = batch_date.strftime("%Y%m%d")
     staging_table_name = f"{table}_{date_str}"
 
@@ -274,13 +279,15 @@ def atomic_swap_partition_stream(
 
 
 def _copy_stream_to_table_freeze(
-    stream: Iterable[str], columns: list[str], id_staging: sql.Identifier, cursor: Any
+    stream: Iterable[bytes], columns: list[str], id_staging: sql.Identifier, cursor: Any
 ) -> None:
     col_list = sql.SQL(", ").join([sql.Identifier(c) for c in columns])
-    copy_query = sql.SQL(
-        "COPY {} ({}) FROM STDIN WITH (FREEZE, FORMAT text, NULL '\\N')"
-    ).format(id_staging, col_list)
+    copy_query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FREEZE, FORMAT csv)").format(
+        id_staging, col_list
+    )
 
-    with cursor.copy(copy_query) as copy:
+    # The writer thread sends to the socket while the next chunk is encoded.
+    # Its queue is bounded, so write() blocks once Postgres falls behind.
+    with cursor.copy(copy_query, writer=QueuedLibpqWriter(cursor)) as copy:
         for chunk in stream:
             copy.write(chunk)
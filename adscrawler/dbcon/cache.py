@@ -0,0 +1,140 @@
+"""Process-wide cache for reference data read from Postgres.
+
+Lookups such as countries, languages or the domains table are small, change
+rarely and are read on every chunk. ``reference_cache`` memoizes them with a
+TTL and an LRU size limit. Each cache is tagged with the tables it reads so
+writers can drop stale entries with ``invalidate_tables`` right after an
+insert, or hand the updated frame back with ``prime``.
+"""
+
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from adscrawler.config import get_logger
+from adscrawler.dbcon.connection import PostgresEngine
+from adscrawler.metrics import (
+    REFERENCE_CACHE_EVICTIONS_COUNTER,
+    REFERENCE_CACHE_HITS_COUNTER,
+    REFERENCE_CACHE_MISSES_COUNTER,
+)
+
+logger = get_logger(__name__)
+
+# Lookup tables that only change with migrations, ie countries, languages
+STATIC_TTL = 24 * 60 * 60
+DEFAULT_TTL = 60 * 60
+
+_CACHES: list["ReferenceCache"] = []
+
+
+class ReferenceCache:
+    """TTL + LRU memoizer for one query function."""
+
+    def __init__(
+        self,
+        func: Callable,
+        ttl: float,
+        maxsize: int,
+        tables: tuple[str, ...],
+    ) -> None:
+        self.func = func
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.tables = tables
+        self.name = func.__name__
+        self._signature = inspect.signature(func)
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._labels = {"cache": self.name}
+        self.hits = 0
+        self.misses = 0
+        functools.update_wrapper(self, func)
+
+    def _make_key(self, args: tuple, kwargs: dict) -> Hashable:
+        """Normalize positional/keyword calls and key engines by config_key."""
+        bound = self._signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return tuple(
+            (name, value.config_key if isinstance(value, PostgresEngine) else value)
+            for name, value in bound.arguments.items()
+        )
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        key = self._make_key(args, kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                REFERENCE_CACHE_HITS_COUNTER.add(1, self._labels)
+                return entry[1]
+            self.misses += 1
+        REFERENCE_CACHE_MISSES_COUNTER.add(1, self._labels)
+        # Query outside the lock, concurrent misses may both hit the database
+        value = self.func(*args, **kwargs)
+        self._store(key, value)
+        return value
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                REFERENCE_CACHE_EVICTIONS_COUNTER.add(1, self._labels)
+
+    def prime(self, value: Any, *args: Any, **kwargs: Any) -> None:
+        """Store value for these arguments, ie after merging in new rows."""
+        self._store(self._make_key(args, kwargs), value)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    # Kept so callers written against functools.lru_cache keep working
+    cache_clear = invalidate
+
+    def cache_info(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "maxsize": self.maxsize,
+                "currsize": len(self._entries),
+            }
+
+
+def reference_cache(
+    ttl: float,
+    maxsize: int = 1,
+    tables: tuple[str, ...] = (),
+) -> Callable[[Callable], ReferenceCache]:
+    """Cache a reference-data query for ttl seconds, keeping maxsize entries.
+
+    tables lists the tables the query reads, for invalidate_tables.
+    """
+
+    def decorator(func: Callable) -> ReferenceCache:
+        cache = ReferenceCache(func, ttl=ttl, maxsize=maxsize, tables=tables)
+        _CACHES.append(cache)
+        return cache
+
+    return decorator
+
+
+def invalidate_tables(*tables: str) -> None:
+    """Drop every cached lookup that reads any of these tables."""
+    for cache in _CACHES:
+        if set(cache.tables).intersection(tables):
+            cache.invalidate()
+            logger.debug(f"reference cache {cache.name} invalidated for {tables=}")
+
+
+def clear_all_caches() -> None:
+    for cache in _CACHES:
+        cache.invalidate()
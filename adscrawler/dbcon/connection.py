@@ -1,6 +1,8 @@
 import asyncio
+import os
 import socket
 import threading
+import time
 from collections.abc import Generator
 from contextlib import contextmanager
 from socket import gethostbyname
@@ -8,27 +10,64 @@ from typing import Any
 
 import asyncssh
 import sqlalchemy
+from sqlalchemy import event
 from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
 
 from adscrawler.config import CONFIG, SSH_KNOWN_HOSTS, get_logger
+from adscrawler.metrics import (
+    DB_POOL_CHECKED_OUT_COUNTER,
+    DB_POOL_CHECKOUT_COUNTER,
+    DB_POOL_CHECKOUT_WAIT_HISTOGRAM,
+)
 
 logger = get_logger(__name__)
 
+TUNNEL_CONNECT_TIMEOUT = 30
+POOL_SIZE = 5
+POOL_MAX_OVERFLOW = 5
+POOL_TIMEOUT = 30
+POOL_RECYCLE = 1800
+
+# Process wide tunnels and engines, keyed by config_key
+_PROCESS_LOCK = threading.RLock()
+_TUNNELS: dict[str, "SSHTunnel"] = {}
+_ENGINES: dict[str, "PostgresEngine"] = {}
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    def _do_get(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT_HISTOGRAM.record(time.perf_counter() - start)
+
 
 class PostgresEngine:
     """Class for managing the connection to PostgreSQL with extended database operations."""
 
-    def __init__(self, config_key: str, db_ip: str, db_port: str) -> None:
+    def __init__(
+        self,
+        config_key: str,
+        db_ip: str,
+        db_port: str,
+        tunnel: "SSHTunnel | None" = None,
+    ) -> None:
         """
         Initialize the PostgreSQL connection.
         Args:
             db_name (str): Name of the database.
             db_ip (str): IP address of the database server.
             db_port (str): Port number of the database server.
+            tunnel (SSHTunnel): Tunnel db_port is forwarded through, if any.
         """
         self.db_ip = db_ip
         self.config_key = config_key
         self.db_port = db_port
+        self.tunnel = tunnel
         self.engine: Engine
 
         try:
@@ -40,7 +79,8 @@ class PostgresEngine:
             raise
 
     def set_engine(self) -> None:
-        """Set up the SQLAlchemy engine."""
+        """Set up the SQLAlchemy engine with a bounded, pre-pinged pool."""
+        db_config = CONFIG[self.config_key]
         try:
             if self.db_pass:
                 db_login = f"postgresql+psycopg://{self.db_user}:{self.db_pass}"
@@ -51,13 +91,47 @@ class PostgresEngine:
             self.engine = sqlalchemy.create_engine(
                 db_uri,
                 connect_args={"connect_timeout": 10, "application_name": "adscrawler"},
+                poolclass=TimedQueuePool,
+                pool_size=db_config.get("pool_size", POOL_SIZE),
+                max_overflow=db_config.get("pool_max_overflow", POOL_MAX_OVERFLOW),
+                pool_timeout=db_config.get("pool_timeout", POOL_TIMEOUT),
+                pool_recycle=db_config.get("pool_recycle", POOL_RECYCLE),
+                pool_pre_ping=True,
             )
+            self._add_pool_listeners()
         except Exception as error:
             logger.error(
                 f"Failed to connect {self.db_name} @ {self.db_ip}, error: {error}",
             )
             raise
 
+    def _add_pool_listeners(self) -> None:
+        labels = {"config_key": self.config_key}
+
+        @event.listens_for(self.engine, "do_connect")
+        def wait_for_tunnel(*_args: Any) -> None:
+            if self.tunnel is not None:
+                self.tunnel.wait_ready()
+
+        @event.listens_for(self.engine, "checkout")
+        def on_checkout(*_args: Any) -> None:
+            DB_POOL_CHECKOUT_COUNTER.add(1, labels)
+            DB_POOL_CHECKED_OUT_COUNTER.add(1, labels)
+
+        @event.listens_for(self.engine, "checkin")
+        def on_checkin(*_args: Any) -> None:
+            DB_POOL_CHECKED_OUT_COUNTER.add(-1, labels)
+
+    def pool_status(self) -> dict[str, int]:
+        """Current pool usage, for logging."""
+        pool = self.engine.pool
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checked_in": pool.checkedin(),
+        }
+
     @contextmanager
     def get_driver_connection(
         self, autocommit: bool = False
@@ -99,66 +173,136 @@ class PostgresEngine:
             conn.close()
 
 
-def manage_tunnel_thread(
-    host: str,
-    os_user: str,
-    ssh_port: int,
-    remote_port: int,
-    ssh_pkey: str,
-    ssh_pkey_password: str,
-) -> int:
-    result = {}
-
-    def runner() -> None:
-        async def main() -> None:
-            async with asyncssh.connect(
-                host,
-                username=os_user,
-                port=ssh_port,
-                known_hosts=SSH_KNOWN_HOSTS.as_posix(),
-                client_keys=ssh_pkey,
-                passphrase=ssh_pkey_password,
-                family=socket.AF_INET,
-            ) as conn:
-                listener = await conn.forward_local_port(
-                    listen_host="localhost",
-                    listen_port=0,
-                    dest_host="127.0.0.1",
-                    dest_port=remote_port,
+class SSHTunnel:
+    """Local port forward to a database host, kept alive in a daemon thread.
+
+    If the SSH connection drops it is re-established on the same local port,
+    so engines built against that port keep working once it is back.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        os_user: str,
+        ssh_port: int,
+        remote_port: int,
+        ssh_pkey: str | None,
+        ssh_pkey_password: str | None,
+    ) -> None:
+        self.host = host
+        self.os_user = os_user
+        self.ssh_port = ssh_port
+        self.remote_port = remote_port
+        self.ssh_pkey = ssh_pkey
+        self.ssh_pkey_password = ssh_pkey_password
+        self.port = 0
+        self._ready = threading.Event()
+        self._error: Exception | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self, timeout: float = TUNNEL_CONNECT_TIMEOUT) -> int:
+        """Start the tunnel thread and block until the local port is listening."""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f"SSH tunnel to {self.host} not ready after {timeout}s")
+        if self._error is not None and not self.port:
+            raise self._error
+        return self.port
+
+    def wait_ready(self, timeout: float = TUNNEL_CONNECT_TIMEOUT) -> None:
+        """Block new database connections while the tunnel is reconnecting."""
+        if not self._ready.wait(timeout):
+            raise ConnectionError(
+                f"SSH tunnel to {self.host} down for more than {timeout}s"
+            )
+
+    def _run(self) -> None:
+        asyncio.run(self._serve())
+
+    async def _serve(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                async with asyncssh.connect(
+                    self.host,
+                    username=self.os_user,
+                    port=self.ssh_port,
+                    known_hosts=SSH_KNOWN_HOSTS.as_posix(),
+                    client_keys=self.ssh_pkey,
+                    passphrase=self.ssh_pkey_password,
+                    family=socket.AF_INET,
+                ) as conn:
+                    listener = await conn.forward_local_port(
+                        listen_host="localhost",
+                        listen_port=self.port,
+                        dest_host="127.0.0.1",
+                        dest_port=self.remote_port,
+                    )
+                    self.port = listener.get_port()
+                    self._error = None
+                    backoff = 1.0
+                    self._ready.set()
+                    await conn.wait_closed()
+                logger.warning(f"SSH tunnel to {self.host} closed, reconnecting")
+            except Exception as error:
+                self._error = error
+                if not self.port:
+                    # Never came up, let start() raise instead of retrying
+                    self._ready.set()
+                    return
+                logger.warning(
+                    f"SSH tunnel to {self.host} failed, retry in {backoff}s: {error}"
                 )
-                result["port"] = listener.get_port()
-                await listener.wait_closed()
+            self._ready.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
 
-        asyncio.run(main())
 
-    t = threading.Thread(target=runner, daemon=True)
-    t.start()
-    while "port" not in result:
-        pass  # wait for listener to be ready
-    port: int = result["port"]
-    return port
+def get_ssh_tunnel(config_key: str) -> SSHTunnel:
+    """Return this process's tunnel for config_key, starting it on first use."""
+    with _PROCESS_LOCK:
+        tunnel = _TUNNELS.get(config_key)
+        if tunnel is None:
+            tunnel = SSHTunnel(
+                host=CONFIG[config_key]["host"],
+                os_user=CONFIG[config_key]["os_user"],
+                ssh_port=CONFIG[config_key].get("ssh_port", 22),
+                remote_port=CONFIG[config_key].get("remote_port", 5432),
+                ssh_pkey=CONFIG[config_key].get("ssh_pkey"),
+                ssh_pkey_password=CONFIG[config_key].get("ssh_pkey_password"),
+            )
+            port = tunnel.start()
+            logger.info(f"SSH tunnel established for {config_key} on local port {port}")
+            _TUNNELS[config_key] = tunnel
+        return tunnel
 
 
 def start_ssh_tunnel(config_key: str) -> int:
-    ssh_port = CONFIG[config_key].get("ssh_port", 22)
-    remote_port = CONFIG[config_key].get("remote_port", 5432)
-    host = CONFIG[config_key]["host"]
-    # host = get_host_ip(CONFIG[server_name]["host"])
-    os_user = CONFIG[config_key]["os_user"]
-    ssh_pkey = CONFIG[config_key].get("ssh_pkey")
-    ssh_pkey_password = CONFIG[config_key].get("ssh_pkey_password")
-    ssh_local_port = manage_tunnel_thread(
-        host, os_user, ssh_port, remote_port, ssh_pkey, ssh_pkey_password
-    )
-    logger.info(
-        f"SSH tunnel established for {config_key} on local port {ssh_local_port}"
-    )
-    return ssh_local_port
+    return get_ssh_tunnel(config_key).port
+
+
+def _reset_after_fork() -> None:
+    """Drop tunnels and engines inherited from a parent process.
+
+    Tunnel threads do not survive fork and pooled sockets must not be shared,
+    so a forked worker builds its own on first use.
+    """
+    for pgdb in _ENGINES.values():
+        pgdb.engine.dispose(close=False)
+    _ENGINES.clear()
+    _TUNNELS.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
 
 
 def get_db_connection(config_key: str = "madrone") -> PostgresEngine:
     """
-    Get a database connection, optionally using an SSH tunnel.
+    Get this process's database connection, optionally using an SSH tunnel.
+
+    The tunnel and engine are built once per process and config_key and then
+    shared, so callers should not dispose the engine.
 
     Args:
         config_key (str): Key to identify which database configuration to use.
@@ -166,26 +310,30 @@ def get_db_connection(config_key: str = "madrone") -> PostgresEngine:
     Returns:
         PostgresCon: A PostgreSQL connection object.
     """
-    host = CONFIG[config_key]["host"]
-    use_ssh_tunnel = CONFIG[config_key].get("use_ssh_tunnel", False)
+    with _PROCESS_LOCK:
+        pgdb = _ENGINES.get(config_key)
+        if pgdb is not None:
+            return pgdb
+        host = CONFIG[config_key]["host"]
+        use_ssh_tunnel = CONFIG[config_key].get("use_ssh_tunnel", False)
 
-    if use_ssh_tunnel:
-        ssh_local_port = start_ssh_tunnel(config_key)
-        host = "127.0.0.1"
-        db_port = str(ssh_local_port)
-    else:
-        db_port = "5432"
-    conn = PostgresEngine(config_key, host, db_port)
-    conn.set_engine()
-    return conn
+        tunnel = None
+        if use_ssh_tunnel:
+            tunnel = get_ssh_tunnel(config_key)
+            host = "127.0.0.1"
+            db_port = str(tunnel.port)
+        else:
+            db_port = "5432"
+        pgdb = PostgresEngine(config_key, host, db_port, tunnel=tunnel)
+        pgdb.set_engine()
+        _ENGINES[config_key] = pgdb
+        return pgdb
 
 
 def get_host_ip(hostname: str) -> str:
     """Convert hostname to IPv4 address if needed."""
     # Check if hostname is already an IPv4 address
-    if all(
-        part.isdigit() and 0 <= int(part) <= 255 for part in hostname.split(".")
-    ):  # noqa: PLR2004
+    if all(part.isdigit() and 0 <= int(part) <= 255 for part in hostname.split(".")):  # noqa: PLR2004
         return hostname
     ip_address = gethostbyname(hostname)
     logger.info(f"Resolved {hostname} to {ip_address}")
@@ -4,7 +4,6 @@ import io
 import pathlib
 import time
 from collections.abc import Callable
-from functools import lru_cache
 from typing import Any
 
 import numpy as np
@@ -16,6 +15,12 @@ from sqlalchemy.exc import OperationalError
 from sqlalchemy.sql.elements import TextClause
 
 from adscrawler.config import CONFIG, SQL_DIR, get_logger
+from adscrawler.dbcon.cache import (
+    DEFAULT_TTL,
+    STATIC_TTL,
+    invalidate_tables,
+    reference_cache,
+)
 from adscrawler.metrics import (
     ADS_TXT_BACKLOG_GAUGE,
     CRAWL_BACKLOG_GAUGE,
@@ -92,8 +97,6 @@ def insert_df(
         The name of the schema containing the target table.
     """
 
-    raw_conn = pgdb.engine.raw_connection()
-
     if "crawled_date" in df.columns and df["crawled_date"].isna().all():
         df["crawled_date"] = pd.to_datetime(df["crawled_date"]).dt.date
         df["crawled_date"] = None
@@ -126,24 +129,28 @@ def insert_df(
         returning_clause=returning_clause,
     )
 
-    if log:
-        logger.info(f"Insert query: {insert_query.as_string(raw_conn)}")
-
-    results = []
-    column_names = None
-    with raw_conn.cursor() as cur:
-        data = [
-            tuple(row) for row in df[all_columns].itertuples(index=False, name=None)
-        ]
+    raw_conn = pgdb.engine.raw_connection()
+    try:
         if log:
-            logger.info(f"Insert data: {data}")
-        for row in data:
-            cur.execute(insert_query, row)
-            if return_rows:
-                results.append(cur.fetchone())
-                if column_names is None:
-                    column_names = [desc[0] for desc in cur.description]
-        raw_conn.commit()
+            logger.info(f"Insert query: {insert_query.as_string(raw_conn)}")
+
+        results = []
+        column_names = None
+        with raw_conn.cursor() as cur:
+            data = [
+                tuple(row) for row in df[all_columns].itertuples(index=False, name=None)
+            ]
+            if log:
+                logger.info(f"Insert data: {data}")
+            for row in data:
+                cur.execute(insert_query, row)
+                if return_rows:
+                    results.append(cur.fetchone())
+                    if column_names is None:
+                        column_names = [desc[0] for desc in cur.description]
+            raw_conn.commit()
+    finally:
+        raw_conn.close()
 
     if return_rows:
         return_df = pd.DataFrame(results, columns=column_names)
@@ -179,6 +186,7 @@ def update_from_df(
     schema: str | None = None,
     md5_key_columns: list[str] | None = None,
     log: bool = False,
+    bulk: bool = False,
 ) -> pd.DataFrame | None:
     """Perform an UPDATE on a PostgreSQL table from a DataFrame.
     Parameters
@@ -201,12 +209,14 @@ def update_from_df(
         Key columns that use MD5 hashing in their index.
     log : bool, optional
         Print generated SQL statement for debugging.
+    bulk : bool, optional
+        COPY the DataFrame into a temp table and run a single UPDATE ... FROM
+        instead of one UPDATE per row. Rows with duplicate keys keep the last.
     Returns
     -------
     pd.DataFrame or None
         DataFrame of updated rows if return_rows=True, else None.
     """
-    raw_conn = pgdb.engine.raw_connection()
     # Handle special date columns
     if "crawled_date" in df.columns and df["crawled_date"].isna().all():
         df["crawled_date"] = pd.to_datetime(df["crawled_date"]).dt.date
@@ -217,6 +227,17 @@ def update_from_df(
     table_identifier = Identifier(table_name)
     if schema:
         table_identifier = Composed([Identifier(schema), SQL("."), table_identifier])
+    if bulk:
+        return _update_from_df_bulk(
+            df=df,
+            table_identifier=table_identifier,
+            pgdb=pgdb,
+            key_columns=key_columns,
+            update_columns=update_columns,
+            return_rows=return_rows,
+            md5_key_columns=md5_key_columns,
+            log=log,
+        )
     # Build UPDATE SET clause for update_columns only
     update_set = SQL(", ").join(
         SQL("{0} = %s").format(Identifier(col)) for col in update_columns
@@ -256,32 +277,148 @@ def update_from_df(
             update_set=update_set,
             where_conditions=where_conditions,
         )
-    if log:
-        logger.info(f"Update query: {update_query.as_string(raw_conn)}")
-    all_columns = update_columns + key_columns
-    with raw_conn.cursor() as cur:
-        # Prepare data
-        data = [
-            tuple(row) for row in df[all_columns].itertuples(index=False, name=None)
-        ]
+    raw_conn = pgdb.engine.raw_connection()
+    try:
         if log:
-            logger.info(f"Update data sample: {data[:5] if len(data) > 5 else data}")
-        # Execute updates
-        if return_rows:
-            all_results = []
-            for row in data:
-                cur.execute(update_query, row)
-                result = cur.fetchall()
-                all_results.extend(result)
-            if all_results:
-                column_names = [desc[0] for desc in cur.description]
-                return_df = pd.DataFrame(all_results, columns=column_names)
+            logger.info(f"Update query: {update_query.as_string(raw_conn)}")
+        all_columns = update_columns + key_columns
+        with raw_conn.cursor() as cur:
+            # Prepare data
+            data = [
+                tuple(row) for row in df[all_columns].itertuples(index=False, name=None)
+            ]
+            if log:
+                logger.info(
+                    f"Update data sample: {data[:5] if len(data) > 5 else data}"
+                )
+            # Execute updates
+            if return_rows:
+                all_results = []
+                for row in data:
+                    cur.execute(update_query, row)
+                    result = cur.fetchall()
+                    all_results.extend(result)
+                if all_results:
+                    column_names = [desc[0] for desc in cur.description]
+                    return_df = pd.DataFrame(all_results, columns=column_names)
+                else:
+                    return_df = pd.DataFrame()
             else:
-                return_df = pd.DataFrame()
-        else:
-            cur.executemany(update_query, data)
-            return_df = None
-    raw_conn.commit()
+                cur.executemany(update_query, data)
+                return_df = None
+        raw_conn.commit()
+        return return_df
+    finally:
+        raw_conn.close()
+
+
+def _update_from_df_bulk(
+    df: pd.DataFrame,
+    table_identifier: Identifier | Composed,
+    pgdb: PostgresEngine,
+    key_columns: list[str],
+    update_columns: list[str],
+    return_rows: bool,
+    md5_key_columns: list[str] | None,
+    log: bool,
+) -> pd.DataFrame | None:
+    """COPY df into a temp table and apply it with one UPDATE ... FROM."""
+    md5_key_columns = md5_key_columns or []
+    temp_columns = list(dict.fromkeys(update_columns + key_columns))
+    df = df[temp_columns].drop_duplicates(subset=key_columns, keep="last")
+    # md5 key columns hold hashes in df, so stage them as text
+    select_columns = SQL(", ").join(
+        (
+            SQL("md5({col}) AS {col}").format(col=Identifier(col))
+            if col in md5_key_columns
+            else Identifier(col)
+        )
+        for col in temp_columns
+    )
+    create_query = SQL("""
+        CREATE TEMP TABLE tmp_update_from_df ON COMMIT DROP AS
+        SELECT {select_columns} FROM {table} WITH NO DATA
+        """).format(select_columns=select_columns, table=table_identifier)
+    update_set = SQL(", ").join(
+        SQL("{col} = s.{col}").format(col=Identifier(col)) for col in update_columns
+    )
+    where_conditions = SQL(" AND ").join(
+        (
+            SQL("md5(t.{col}) = s.{col}")
+            if col in md5_key_columns
+            else SQL("t.{col} = s.{col}")
+        ).format(col=Identifier(col))
+        for col in key_columns
+    )
+    returning_clause = SQL("RETURNING t.*") if return_rows else SQL("")
+    update_query = SQL("""
+        UPDATE {table} AS t
+        SET {update_set}
+        FROM tmp_update_from_df AS s
+        WHERE {where_conditions}
+        {returning_clause}
+        """).format(
+        table=table_identifier,
+        update_set=update_set,
+        where_conditions=where_conditions,
+        returning_clause=returning_clause,
+    )
+    return_df = None
+    with pgdb.get_driver_connection() as (conn, cur):
+        if log:
+            logger.info(f"Update query: {update_query.as_string(conn)}")
+        cur.execute(create_query)
+        _copy_rows(df, "tmp_update_from_df", cur)
+        cur.execute(update_query)
+        if return_rows:
+            column_names = [desc[0] for desc in cur.description]
+            return_df = pd.DataFrame(cur.fetchall(), columns=column_names)
+    return return_df
+
+
+def _upsert_df_bulk(
+    df: pd.DataFrame,
+    table_identifier: Identifier | Composed,
+    pgdb: PostgresEngine,
+    key_columns: list[str],
+    all_columns: list[str],
+    conflict_columns: Composed,
+    action_clause: Composed | SQL,
+    return_rows: bool,
+    log: bool,
+) -> pd.DataFrame | None:
+    """COPY df into a temp table and upsert it with one INSERT ... SELECT."""
+    # ON CONFLICT cannot touch the same row twice in one statement
+    df = df[all_columns].drop_duplicates(subset=key_columns, keep="last")
+    columns = SQL(", ").join(map(Identifier, all_columns))
+    create_query = SQL("""
+        CREATE TEMP TABLE tmp_upsert_df ON COMMIT DROP AS
+        SELECT {columns} FROM {table} WITH NO DATA
+        """).format(columns=columns, table=table_identifier)
+    returning_clause = SQL("RETURNING *") if return_rows else SQL("")
+    upsert_query = SQL("""
+        INSERT INTO {table} ({columns})
+        SELECT {columns} FROM tmp_upsert_df
+        ON CONFLICT ({conflict_columns})
+        {action_clause}
+        {returning_clause}
+        """).format(
+        table=table_identifier,
+        columns=columns,
+        conflict_columns=conflict_columns,
+        action_clause=action_clause,
+        returning_clause=returning_clause,
+    )
+    return_df = None
+    with pgdb.get_driver_connection() as (conn, cur):
+        if log:
+            logger.info(f"Upsert query: {upsert_query.as_string(conn)}")
+        cur.execute(create_query)
+        _copy_rows(df, "tmp_upsert_df", cur)
+        cur.execute(upsert_query)
+        if return_rows:
+            column_names = [desc[0] for desc in cur.description]
+            return_df = pd.DataFrame(cur.fetchall(), columns=column_names)
     return return_df
 
 
@@ -351,6 +488,7 @@ def upsert_df(
     md5_key_columns: list[str] | None = None,
     on_conflict_update: bool = True,
     log: bool = False,
+    bulk: bool = False,
 ) -> pd.DataFrame | None:
     """Perform an "upsert" on a PostgreSQL table from a DataFrame.
     Constructs an INSERT … ON CONFLICT statement, uploads the DataFrame to a
@@ -379,6 +517,10 @@ def upsert_df(
         Whether to update the existing rows on conflict, default True
     log : bool, optional
         Print generated SQL statement for debugging.
+    bulk : bool, optional
+        COPY the DataFrame into a temp table and run a single
+        INSERT ... ON CONFLICT ... RETURNING, so only the affected rows are
+        returned. Rows with duplicate keys keep the last.
     """
 
     # Validate parameters
@@ -388,8 +530,6 @@ def upsert_df(
             "because DO NOTHING doesn't guarantee the returned rows were actually inserted"
         )
 
-    raw_conn = pgdb.engine.raw_connection()
-
     if "crawled_date" in df.columns and df["crawled_date"].isna().all():
         df["crawled_date"] = pd.to_datetime(df["crawled_date"]).dt.date
         df["crawled_date"] = None
@@ -420,6 +560,19 @@ def upsert_df(
     else:
         action_clause = SQL("DO NOTHING")
 
+    if bulk:
+        return _upsert_df_bulk(
+            df=df,
+            table_identifier=table_identifier,
+            pgdb=pgdb,
+            key_columns=key_columns,
+            all_columns=all_columns,
+            conflict_columns=conflict_columns,
+            action_clause=action_clause,
+            return_rows=return_rows,
+            log=log,
+        )
+
     # Upsert query without RETURNING clause
     upsert_query = SQL("""
         INSERT INTO {table} ({columns})
@@ -447,42 +600,168 @@ def upsert_df(
         SELECT * FROM {table}
         WHERE {where_conditions}
     """).format(table=table_identifier, where_conditions=sel_where_conditions)
-    if log:
-        logger.info(f"Upsert query: {upsert_query.as_string(raw_conn)}")
-        logger.info(f"Select query: {select_query.as_string(raw_conn)}")
-
-    with raw_conn.cursor() as cur:
-        # Perform upsert
-        data = [
-            tuple(row) for row in df[all_columns].itertuples(index=False, name=None)
-        ]
+    raw_conn = pgdb.engine.raw_connection()
+    try:
         if log:
-            logger.info(f"Upsert data: {data}")
-        cur.executemany(upsert_query, data)
-
-        # Fetch affected rows if required
-        if return_rows:
-            if len(key_columns) == 1 and key_columns[0] in (md5_key_columns or []):
-                md5_values = [
-                    (
-                        hashlib.md5(v.encode("utf-8")).hexdigest()
-                        if v is not None
-                        else None
-                    )
-                    for v in df[key_columns[0]].tolist()
-                ]
-                where_values = [md5_values]
+            logger.info(f"Upsert query: {upsert_query.as_string(raw_conn)}")
+            logger.info(f"Select query: {select_query.as_string(raw_conn)}")
+
+        with raw_conn.cursor() as cur:
+            # Perform upsert
+            data = [
+                tuple(row) for row in df[all_columns].itertuples(index=False, name=None)
+            ]
+            if log:
+                logger.info(f"Upsert data: {data}")
+            cur.executemany(upsert_query, data)
+
+            # Fetch affected rows if required
+            if return_rows:
+                if len(key_columns) == 1 and key_columns[0] in (md5_key_columns or []):
+                    md5_values = [
+                        (
+                            hashlib.md5(v.encode("utf-8")).hexdigest()
+                            if v is not None
+                            else None
+                        )
+                        for v in df[key_columns[0]].tolist()
+                    ]
+                    where_values = [md5_values]
+                else:
+                    where_values = [df[col].tolist() for col in key_columns]
+                cur.execute(select_query, where_values)
+                result = cur.fetchall()
+                column_names = [desc[0] for desc in cur.description]
+                return_df = pd.DataFrame(result, columns=column_names)
             else:
-                where_values = [df[col].tolist() for col in key_columns]
-            cur.execute(select_query, where_values)
-            result = cur.fetchall()
-            column_names = [desc[0] for desc in cur.description]
-            return_df = pd.DataFrame(result, columns=column_names)
-        else:
-            return_df = None
+                return_df = None
 
-    raw_conn.commit()
-    return return_df
+        raw_conn.commit()
+        return return_df
+    finally:
+        raw_conn.close()
+
+
+def _copy_rows(df: pd.DataFrame, table_name: str, cur: Any) -> None:
+    """COPY a DataFrame into an existing (usually temp) table row by row.
+
+    Uses psycopg's write_row so NULLs and empty strings stay distinct.
+    """
+    copy_query = SQL("COPY {table} ({columns}) FROM STDIN").format(
+        table=Identifier(table_name),
+        columns=SQL(", ").join(map(Identifier, df.columns)),
+    )
+    df = prepare_for_psycopg(df)
+    with cur.copy(copy_query) as copy:
+        for row in df.itertuples(index=False, name=None):
+            copy.write_row(row)
+
+
+def upsert_app_ads_batch(
+    crawl_df: pd.DataFrame,
+    entries_df: pd.DataFrame,
+    pgdb: PostgresEngine,
+) -> int:
+    """Write app-ads.txt results for many pub domains in one transaction.
+
+    Both frames are COPYed into temp staging tables and the four target
+    tables are then written with set-based INSERT ... ON CONFLICT statements.
+    Ad domain and app_ads_entrys ids are resolved by joins inside those
+    statements rather than by returning rows to Python.
+
+    Parameters
+    ----------
+    crawl_df : pandas.DataFrame
+        One row per pub domain with columns domain_id, crawl_result, crawled_at.
+    entries_df : pandas.DataFrame
+        Parsed entries with columns pub_domain, domain_name, publisher_id,
+        relationship, certification_auth, notes.
+
+    Returns
+    -------
+    int
+        Number of app_ads_map rows written.
+    """
+    entry_columns = [
+        "pub_domain",
+        "domain_name",
+        "publisher_id",
+        "relationship",
+        "certification_auth",
+        "notes",
+    ]
+    with pgdb.get_driver_connection() as (_conn, cur):
+        cur.execute("""
+            CREATE TEMP TABLE tmp_adstxt_crawl_results (
+                domain_id integer,
+                crawl_result integer,
+                crawled_at timestamp
+            ) ON COMMIT DROP
+        """)
+        cur.execute("""
+            CREATE TEMP TABLE tmp_app_ads (
+                pub_domain integer,
+                domain_name text,
+                publisher_id text,
+                relationship text,
+                certification_auth text,
+                notes text
+            ) ON COMMIT DROP
+        """)
+        _copy_rows(
+            crawl_df[["domain_id", "crawl_result", "crawled_at"]],
+            "tmp_adstxt_crawl_results",
+            cur,
+        )
+        _copy_rows(entries_df[entry_columns], "tmp_app_ads", cur)
+        cur.execute("""
+            INSERT INTO adstxt_crawl_results (domain_id, crawl_result, crawled_at)
+            SELECT DISTINCT ON (domain_id) domain_id, crawl_result, crawled_at
+            FROM tmp_adstxt_crawl_results
+            ORDER BY domain_id, crawled_at DESC
+            ON CONFLICT (domain_id) DO UPDATE SET
+                crawl_result = EXCLUDED.crawl_result,
+                crawled_at = EXCLUDED.crawled_at
+        """)
+        # Sorted inserts keep lock order stable between concurrent writers
+        cur.execute("""
+            INSERT INTO domains (domain_name)
+            SELECT DISTINCT domain_name
+            FROM tmp_app_ads
+            ORDER BY domain_name
+            ON CONFLICT (domain_name) DO NOTHING
+        """)
+        cur.execute("""
+            INSERT INTO app_ads_entrys (
+                ad_domain, publisher_id, relationship, certification_auth, notes
+            )
+            SELECT DISTINCT ON (d.id, t.publisher_id, t.relationship)
+                d.id, t.publisher_id, t.relationship, t.certification_auth, t.notes
+            FROM tmp_app_ads t
+            JOIN domains d ON d.domain_name = t.domain_name
+            ORDER BY d.id, t.publisher_id, t.relationship
+            ON CONFLICT (ad_domain, publisher_id, relationship) DO UPDATE SET
+                certification_auth = EXCLUDED.certification_auth,
+                notes = EXCLUDED.notes
+        """)
+        cur.execute("""
+            INSERT INTO app_ads_map (pub_domain, app_ads_entry)
+            SELECT DISTINCT t.pub_domain, e.id
+            FROM tmp_app_ads t
+            JOIN domains d ON d.domain_name = t.domain_name
+            JOIN app_ads_entrys e
+                ON e.ad_domain = d.id
+                AND e.publisher_id = t.publisher_id
+                AND e.relationship = t.relationship
+            ORDER BY t.pub_domain, e.id
+            ON CONFLICT (pub_domain, app_ads_entry) DO UPDATE SET
+                pub_domain = EXCLUDED.pub_domain,
+                app_ads_entry = EXCLUDED.app_ads_entry
+        """)
+        map_rows: int = cur.rowcount
+    # New ad domains may have been inserted
+    invalidate_tables("domains")
+    return map_rows
 
 
 def clean_app_ranks_weekly_table(pgdb: PostgresEngine) -> None:
@@ -588,7 +867,7 @@ def delete_and_insert(
     )
 
 
-@lru_cache(maxsize=1)
+@reference_cache(ttl=DEFAULT_TTL, tables=("developers",))
 def query_all_developers(pgdb: PostgresEngine) -> pd.DataFrame:
     """Query all developers from the database."""
     sel_query = """SELECT 
@@ -767,7 +1046,7 @@ def query_latest_api_scan_by_store_id(
     return df
 
 
-@lru_cache(maxsize=2)
+@reference_cache(ttl=DEFAULT_TTL, maxsize=2, tables=("store_apps",))
 def query_store_id_map_cached(
     pgdb: PostgresEngine,
     store: int | None,
@@ -812,6 +1091,187 @@ def query_store_id_map(
     return df
 
 
+def _resolve_ids(
+    query: str, params: dict[str, list], table_name: str, pgdb: PostgresEngine
+) -> pd.DataFrame:
+    with pgdb.get_driver_connection() as (_conn, cur):
+        cur.execute(query, params)
+        column_names = [desc[0] for desc in cur.description]
+        df = pd.DataFrame(cur.fetchall(), columns=column_names)
+    if df["created"].any():
+        invalidate_tables(table_name)
+    return df
+
+
+def _to_pg_list(values: pd.Series) -> list:
+    """Series to a plain list with None for missing values."""
+    return [None if pd.isna(x) else x for x in values.tolist()]
+
+
+RESOLVE_DOMAIN_IDS = """
+    WITH input AS (
+        SELECT DISTINCT ON (domain_name) domain_name, root_domain_id
+        FROM unnest(%(domain_names)s::text[], %(root_domain_ids)s::int[])
+            AS t(domain_name, root_domain_id)
+        WHERE domain_name IS NOT NULL
+        ORDER BY domain_name, root_domain_id
+    ),
+    existing AS (
+        SELECT d.id, d.domain_name, d.root_domain_id
+        FROM domains d
+        WHERE d.domain_name = ANY(%(domain_names)s::text[])
+    ),
+    backfilled AS (
+        UPDATE domains d
+        SET root_domain_id = i.root_domain_id
+        FROM input i
+        WHERE d.domain_name = i.domain_name
+            AND d.root_domain_id IS NULL
+            AND i.root_domain_id IS NOT NULL
+            AND i.root_domain_id <> d.id
+        RETURNING d.id, d.domain_name, d.root_domain_id
+    ),
+    inserted AS (
+        INSERT INTO domains (domain_name, root_domain_id)
+        SELECT i.domain_name, i.root_domain_id
+        FROM input i
+        WHERE NOT EXISTS (
+            SELECT 1 FROM existing e WHERE e.domain_name = i.domain_name
+        )
+        ORDER BY i.domain_name
+        ON CONFLICT (domain_name) DO UPDATE SET domain_name = EXCLUDED.domain_name
+        RETURNING id, domain_name, root_domain_id, (xmax = 0) AS created
+    )
+    SELECT e.id, e.domain_name, e.root_domain_id, false AS created
+    FROM existing e
+    WHERE NOT EXISTS (SELECT 1 FROM backfilled b WHERE b.id = e.id)
+    UNION ALL
+    SELECT id, domain_name, root_domain_id, false AS created FROM backfilled
+    UNION ALL
+    SELECT id, domain_name, root_domain_id, created FROM inserted
+"""
+
+
+def resolve_domain_ids(df: pd.DataFrame, pgdb: PostgresEngine) -> pd.DataFrame:
+    """Return ids for df's domain_name values, inserting missing domains.
+
+    df may carry a root_domain_id column, used for new domains and to backfill
+    existing ones that have none. One round trip regardless of table size.
+
+    Returns
+    -------
+    pd.DataFrame
+        id, domain_name, root_domain_id and created for each distinct domain.
+    """
+    root_domain_ids = (
+        _to_pg_list(df["root_domain_id"])
+        if "root_domain_id" in df.columns
+        else [None] * len(df)
+    )
+    params = {
+        "domain_names": _to_pg_list(df["domain_name"]),
+        "root_domain_ids": [None if x is None else int(x) for x in root_domain_ids],
+    }
+    return _resolve_ids(RESOLVE_DOMAIN_IDS, params, "domains", pgdb)
+
+
+RESOLVE_DEVELOPER_IDS = """
+    WITH input AS (
+        SELECT DISTINCT ON (store, developer_id) store, developer_id, name
+        FROM unnest(
+            %(stores)s::int[], %(developer_ids)s::text[], %(names)s::text[]
+        ) AS t(store, developer_id, name)
+        WHERE developer_id IS NOT NULL
+        ORDER BY store, developer_id, name
+    ),
+    existing AS (
+        SELECT d.id, d.store, d.developer_id
+        FROM developers d
+        JOIN input i ON d.store = i.store AND d.developer_id = i.developer_id
+        WHERE d.developer_id = ANY(%(developer_ids)s::text[])
+    ),
+    inserted AS (
+        INSERT INTO developers (store, developer_id, name)
+        SELECT i.store, i.developer_id, i.name
+        FROM input i
+        WHERE NOT EXISTS (
+            SELECT 1 FROM existing e
+            WHERE e.store = i.store AND e.developer_id = i.developer_id
+        )
+        ORDER BY i.store, i.developer_id
+        ON CONFLICT (store, developer_id) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id, store, developer_id, (xmax = 0) AS created
+    )
+    SELECT id, store, developer_id, false AS created FROM existing
+    UNION ALL
+    SELECT id, store, developer_id, created FROM inserted
+"""
+
+
+def resolve_developer_ids(df: pd.DataFrame, pgdb: PostgresEngine) -> pd.DataFrame:
+    """Return ids for df's (store, developer_id) keys, inserting missing ones.
+
+    An optional name column is stored for new developers.
+
+    Returns
+    -------
+    pd.DataFrame
+        id, store, developer_id and created for each distinct key.
+    """
+    names = _to_pg_list(df["name"]) if "name" in df.columns else [None] * len(df)
+    params = {
+        "stores": [int(x) for x in df["store"].tolist()],
+        "developer_ids": _to_pg_list(df["developer_id"].astype("str")),
+        "names": names,
+    }
+    return _resolve_ids(RESOLVE_DEVELOPER_IDS, params, "developers", pgdb)
+
+
+RESOLVE_STORE_APP_IDS = """
+    WITH input AS (
+        SELECT DISTINCT store, store_id
+        FROM unnest(%(stores)s::int[], %(store_ids)s::text[]) AS t(store, store_id)
+        WHERE store_id IS NOT NULL
+    ),
+    existing AS (
+        SELECT sa.id, sa.store, sa.store_id
+        FROM store_apps sa
+        JOIN input i ON sa.store = i.store AND sa.store_id = i.store_id
+        WHERE sa.store_id = ANY(%(store_ids)s::text[])
+    ),
+    inserted AS (
+        INSERT INTO store_apps (store, store_id)
+        SELECT i.store, i.store_id
+        FROM input i
+        WHERE NOT EXISTS (
+            SELECT 1 FROM existing e
+            WHERE e.store = i.store AND e.store_id = i.store_id
+        )
+        ORDER BY i.store, i.store_id
+        ON CONFLICT (store, store_id) DO UPDATE SET store_id = EXCLUDED.store_id
+        RETURNING id, store, store_id, (xmax = 0) AS created
+    )
+    SELECT id, store, store_id, false AS created FROM existing
+    UNION ALL
+    SELECT id, store, store_id, created FROM inserted
+"""
+
+
+def resolve_store_app_ids(df: pd.DataFrame, pgdb: PostgresEngine) -> pd.DataFrame:
+    """Return ids for df's (store, store_id) keys, inserting missing apps.
+
+    Returns
+    -------
+    pd.DataFrame
+        id, store, store_id and created for each distinct key.
+    """
+    params = {
+        "stores": [int(x) for x in df["store"].tolist()],
+        "store_ids": _to_pg_list(df["store_id"]),
+    }
+    return _resolve_ids(RESOLVE_STORE_APP_IDS, params, "store_apps", pgdb)
+
+
 def query_collections(pgdb: PostgresEngine) -> pd.DataFrame:
     sel_query = """SELECT
         *
@@ -834,7 +1294,7 @@ def query_categories(pgdb: PostgresEngine) -> pd.DataFrame:
     return df
 
 
-@lru_cache(maxsize=1)
+@reference_cache(ttl=STATIC_TTL, tables=("countries",))
 def query_countries(pgdb: PostgresEngine) -> pd.DataFrame:
     sel_query = """SELECT
         c.*, t.tier_slug as tier
@@ -879,7 +1339,7 @@ def query_company_countries_resolved(pgdb: PostgresEngine) -> pd.DataFrame:
     return df
 
 
-@lru_cache(maxsize=1)
+@reference_cache(ttl=DEFAULT_TTL, tables=("adtech.companies", "domains"))
 def query_companies(pgdb: PostgresEngine) -> pd.DataFrame:
     sel_query = """SELECT
         c.id as company_id,
@@ -926,7 +1386,7 @@ def update_company_github_user(
         cur.execute(update_query, (github_user, company_id))
 
 
-@lru_cache(maxsize=1)
+@reference_cache(ttl=STATIC_TTL, tables=("languages",))
 def query_languages(pgdb: PostgresEngine) -> pd.DataFrame:
     sel_query = """SELECT
         *
@@ -988,7 +1448,7 @@ def query_pub_domains_to_crawl_ads_txt(
     return df
 
 
-@lru_cache(maxsize=1)
+@reference_cache(ttl=DEFAULT_TTL, tables=("adtech.urls",))
 def query_urls_hash_map_cached(pgdb: PostgresEngine) -> pd.DataFrame:
     """
     Get URL IDs and hashes from the urls table.
@@ -1001,8 +1461,7 @@ def query_urls_hash_map_cached(pgdb: PostgresEngine) -> pd.DataFrame:
 
 
 def clear_url_query_caches() -> None:
-    query_urls_hash_map_cached.cache_clear()
-    _query_urls_by_hashes_cached.cache_clear()
+    invalidate_tables("adtech.urls")
 
 
 def query_urls_by_hashes(hashes: list[str], pgdb: PostgresEngine) -> pd.DataFrame:
@@ -1012,7 +1471,7 @@ def query_urls_by_hashes(hashes: list[str], pgdb: PostgresEngine) -> pd.DataFram
     return _query_urls_by_hashes_cached(hashes_tuple, pgdb)
 
 
-@lru_cache(maxsize=1000)
+@reference_cache(ttl=DEFAULT_TTL, maxsize=1000, tables=("adtech.urls",))
 def _query_urls_by_hashes_cached(
     hashes: tuple[str, ...], pgdb: PostgresEngine
 ) -> pd.DataFrame:
@@ -1023,7 +1482,11 @@ def _query_urls_by_hashes_cached(
     return df
 
 
-@lru_cache(maxsize=1000)
+@reference_cache(
+    ttl=DEFAULT_TTL,
+    maxsize=1000,
+    tables=("adtech.url_redirect_chains", "adtech.urls"),
+)
 def get_click_url_redirect_chains(run_id: int, pgdb: PostgresEngine) -> pd.DataFrame:
     sel_query = f"""SELECT
         urc.api_call_id,
@@ -1043,6 +1506,44 @@ def get_click_url_redirect_chains(run_id: int, pgdb: PostgresEngine) -> pd.DataF
     return df
 
 
+def get_redirect_chains_by_url_hashes(
+    url_hashes: list[str], pgdb: PostgresEngine
+) -> pd.DataFrame:
+    """Latest stored redirect chain of each start url hash, from any run.
+
+    A url that was resolved without redirects has one hop with a null
+    redirect_url.
+    """
+    if not url_hashes:
+        return pd.DataFrame(columns=["url_hash", "url", "hop_index", "redirect_url"])
+    sel_query = text(
+        """WITH chains AS (
+            SELECT
+                u.url_hash,
+                u.url,
+                urc.hop_index,
+                ur.url AS redirect_url,
+                DENSE_RANK() OVER (
+                    PARTITION BY u.url_hash
+                    ORDER BY urc.run_id DESC, urc.api_call_id DESC
+                ) AS chain_rank
+            FROM
+                adtech.urls u
+            JOIN adtech.url_redirect_chains urc ON urc.url_id = u.id
+            LEFT JOIN adtech.urls ur ON urc.next_url_id = ur.id
+            WHERE
+                u.url_hash IN :hashes
+        )
+        SELECT url_hash, url, hop_index, redirect_url
+        FROM chains
+        WHERE chain_rank = 1
+        ORDER BY url_hash, hop_index
+        """
+    ).bindparams(bindparam("hashes", expanding=True))
+    df = pd.read_sql(sel_query, pgdb.engine, params={"hashes": tuple(url_hashes)})
+    return df
+
+
 def delete_app_url_mapping(app_url_id: int, pgdb: PostgresEngine) -> None:
     del_query = "DELETE FROM app_urls_map WHERE id = %s"
     logger.info(f"{app_url_id=} delete app_urls_map start")
@@ -1055,7 +1556,7 @@ def delete_app_url_mapping(app_url_id: int, pgdb: PostgresEngine) -> None:
         raise
 
 
-@lru_cache(maxsize=1)
+@reference_cache(ttl=STATIC_TTL)
 def get_store_app_columns(pgdb: PostgresEngine) -> list[str]:
     sel_query = """SELECT * FROM store_apps LIMIT 1"""
     df = pd.read_sql(sel_query, pgdb.engine)
@@ -1384,7 +1885,7 @@ def query_report_combined_domains(
     )
 
 
-@lru_cache(maxsize=1)
+@reference_cache(ttl=DEFAULT_TTL, tables=("ad_network_sdk_keys",))
 def query_sdk_keys(pgdb: PostgresEngine) -> pd.DataFrame:
     sel_query = """SELECT * FROM ad_network_sdk_keys;"""
     df = pd.read_sql(
@@ -1520,7 +2021,7 @@ def query_apps_mitm_in_s3(pgdb: PostgresEngine) -> pd.DataFrame:
     return df
 
 
-@lru_cache(maxsize=2)
+@reference_cache(ttl=DEFAULT_TTL, maxsize=2, tables=("api_calls",))
 def query_api_calls_to_creative_scan(
     pgdb: PostgresEngine, recent_months: bool = False
 ) -> pd.DataFrame:
@@ -1539,7 +2040,7 @@ def query_api_calls_to_creative_scan(
     return df
 
 
-@lru_cache(maxsize=1)
+@reference_cache(ttl=DEFAULT_TTL, tables=("creative_assets",))
 def query_creative_assets(pgdb: PostgresEngine) -> pd.DataFrame:
     sel_query = """SELECT
         *
@@ -1581,7 +2082,7 @@ def query_all_store_app_descriptions(
     return df
 
 
-@lru_cache(maxsize=1)
+@reference_cache(ttl=DEFAULT_TTL, tables=("domains",))
 def query_all_domains(pgdb: PostgresEngine) -> pd.DataFrame:
     sel_query = """SELECT
         id, domain_name, root_domain_id
@@ -1593,13 +2094,13 @@ def query_all_domains(pgdb: PostgresEngine) -> pd.DataFrame:
     return df
 
 
-@lru_cache(maxsize=1)
+@reference_cache(ttl=DEFAULT_TTL, tables=("domains",))
 def query_domains_set(pgdb: PostgresEngine) -> set[str]:
     df = query_all_domains(pgdb)
     return set(df["domain_name"].tolist())
 
 
-@lru_cache(maxsize=1)
+@reference_cache(ttl=DEFAULT_TTL, tables=("keywords_base", "keywords"))
 def query_keywords_base(pgdb: PostgresEngine) -> pd.DataFrame:
     sel_query = """SELECT
     k.id as keyword_id, k.keyword_text
@@ -1613,7 +2114,7 @@ def query_keywords_base(pgdb: PostgresEngine) -> pd.DataFrame:
     return df
 
 
-@lru_cache(maxsize=1000)
+@reference_cache(ttl=DEFAULT_TTL, maxsize=1000, tables=("store_apps",))
 def query_store_app_by_store_id_cached(
     pgdb: PostgresEngine,
     store_id: str,
@@ -1720,7 +2221,7 @@ def get_failed_mitm_logs(pgdb: PostgresEngine, lookback_days: int = 90) -> pd.Da
     return df
 
 
-@lru_cache(maxsize=1000)
+@reference_cache(ttl=DEFAULT_TTL, maxsize=1000, tables=("api_calls",))
 def query_api_call_id_for_uuid(mitm_uuid: str, pgdb: PostgresEngine) -> int:
     api_calls = query_api_calls_id_uuid_map(pgdb)
     filtered_df = api_calls[api_calls["mitm_uuid"] == mitm_uuid]
@@ -1729,7 +2230,7 @@ def query_api_call_id_for_uuid(mitm_uuid: str, pgdb: PostgresEngine) -> int:
     return api_call_id
 
 
-@lru_cache(maxsize=1)
+@reference_cache(ttl=DEFAULT_TTL, tables=("api_calls",))
 def query_api_calls_id_uuid_map(pgdb: PostgresEngine) -> pd.DataFrame:
     sel_query = """SELECT id, mitm_uuid FROM api_calls"""
     df = pd.read_sql(sel_query, con=pgdb.engine)
@@ -1746,7 +2247,7 @@ def query_api_calls_for_mitm_uuids(
     return filtered_df
 
 
-@lru_cache(maxsize=1)
+@reference_cache(ttl=DEFAULT_TTL, tables=("adtech.companies", "domains"))
 def get_all_mmp_tlds_set(pgdb: PostgresEngine) -> set[str]:
     sel_query = """SELECT
                 c.id,
@@ -1879,7 +2380,7 @@ def query_store_app_categories(
     return df
 
 
-@lru_cache(maxsize=2)
+@reference_cache(ttl=DEFAULT_TTL, maxsize=2, tables=("store_apps",))
 def query_live_apps(pgdb: PostgresEngine, store: int) -> pd.DataFrame:
     sel_query = f"""SELECT
             id, store, store_id
@@ -22,13 +22,22 @@ binding the actors to whichever broker that process configured first.
 Fork safety + connection hygiene
 ---------------------------------
 Dramatiq can fork worker processes after module import.  The Postgres
-connection is **not** shared — ``process_scrape_apps_and_save`` creates a
-fresh connection per chunk and disposes it in its ``finally`` block (via the
-``pgdb=None`` default).  This prevents dead SSH tunnels from hanging workers.
+engine and SSH tunnel are **not** inherited — ``get_db_connection`` keeps one
+pooled engine and tunnel per process, and forked children drop the parent's
+and build their own on first use.  Chunks check connections out of that pool
+(``pool_pre_ping`` drops stale ones) and a dropped tunnel reconnects on the
+same local port, so dead SSH tunnels do not hang workers.
 
 The Redis lock client is initialised **lazily** inside the actor body (fork-
 safe, guarded by ``threading.Lock``), since it doesn't hold long-lived state
 across chunks.
+
+Rate limiting
+-------------
+Every store request waits for a token from the Redis token bucket of its
+``(store, country)`` storefront (see ``adscrawler.app_stores.rate_limit``), so
+all workers on all hosts share one request budget. A temporary block shrinks
+that storefront's rate for the whole cluster.
 """
 
 import threading
@@ -37,6 +46,7 @@ from typing import Any
 import dramatiq
 import pandas as pd
 
+from adscrawler.app_stores.rate_limit import get_cluster_rate_limiter
 from adscrawler.app_stores.scrape_stores import process_scrape_apps_and_save
 from adscrawler.config import CONFIG, get_logger
 
@@ -104,6 +114,7 @@ def _actor_body(
         process_scrape_apps_and_save(
             df_chunk=df_chunk,
             store=store,
+            rate_limiter=get_cluster_rate_limiter(),
         )
         # Group 2 apps are split across 36 chunks, locks expire naturally via TTL
         if group == 1:
@@ -139,3 +139,48 @@ CRAWL_KEYWORDS_RESULTS_COUNTER = meter.create_counter(
     "crawl_keywords_results_total",
     description="Total keywords crawled for ranks by outcome",
 )
+
+# --- Database connection pool ---
+DB_POOL_CHECKOUT_COUNTER = meter.create_counter(
+    "db_pool_checkouts_total",
+    description="Total connections checked out of the Postgres pool",
+)
+
+DB_POOL_CHECKED_OUT_COUNTER = meter.create_up_down_counter(
+    "db_pool_checked_out",
+    description="Postgres pool connections currently checked out",
+)
+
+DB_POOL_CHECKOUT_WAIT_HISTOGRAM = meter.create_histogram(
+    "db_pool_checkout_wait_seconds",
+    unit="s",
+    description="Time spent waiting for a Postgres pool connection",
+)
+
+# --- Reference data cache ---
+REFERENCE_CACHE_HITS_COUNTER = meter.create_counter(
+    "reference_cache_hits_total",
+    description="Reference data lookups served from the in-process cache",
+)
+
+REFERENCE_CACHE_MISSES_COUNTER = meter.create_counter(
+    "reference_cache_misses_total",
+    description="Reference data lookups that queried Postgres",
+)
+
+REFERENCE_CACHE_EVICTIONS_COUNTER = meter.create_counter(
+    "reference_cache_evictions_total",
+    description="Reference data cache entries evicted by the size limit",
+)
+
+# --- Store request rate limiting ---
+STORE_RATE_LIMIT_WAIT_HISTOGRAM = meter.create_histogram(
+    "store_rate_limit_wait_seconds",
+    unit="s",
+    description="Time a store request waited for a rate limit token",
+)
+
+STORE_RATE_LIMIT_BLOCKS_COUNTER = meter.create_counter(
+    "store_rate_limit_blocks_total",
+    description="Store blocks that shrank the shared request rate",
+)
@@ -1,7 +1,10 @@
+import bisect
+import functools
 import hashlib
+import itertools
 import pathlib
+import re
 import subprocess
-import uuid
 
 import imagehash
 import pandas as pd
@@ -19,32 +22,193 @@ from adscrawler.dbcon.queries import query_creative_assets
 
 logger = get_logger(__name__, "mitm_scrape_ads")
 
+# Phashes this many bits apart or less are logged as near-duplicates
+PHASH_NEAR_DISTANCE = 4
 
-def extract_frame_at(local_path: pathlib.Path, second: int) -> Image.Image:
-    """Extracts a single frame from a video file at the specified second."""
-    tmp_path = pathlib.Path(f"/tmp/frame_{uuid.uuid4()}.jpg")
-    subprocess.run(
+PHASH_BITS = 64
+
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_SECOND = 5
+# Video frames sampled for phashes and thumbnails, 0 is the first frame
+SAMPLE_SECONDS = (0, 1, 3, 5, 10)
+
+
+class PhashIndex:
+    """Phashes of creative assets by md5, searchable by hamming distance.
+
+    Multi-index hashing: the bits are split into max_distance + 1 chunks and
+    each chunk has a dict of chunk value to md5s. Two phashes at most
+    max_distance bits apart share at least one chunk, so a search checks
+    only the few assets in its own chunk buckets instead of every asset.
+    """
+
+    def __init__(self, max_distance: int = PHASH_NEAR_DISTANCE) -> None:
+        self.max_distance = max_distance
+        self.phashes: dict[str, str] = {}
+        self._values: dict[str, int] = {}
+        bounds = [PHASH_BITS * i // (max_distance + 1) for i in range(max_distance + 2)]
+        self._chunks = [
+            (start, (1 << (end - start)) - 1)
+            for start, end in itertools.pairwise(bounds)
+        ]
+        self._buckets: list[dict[int, set[str]]] = [{} for _ in self._chunks]
+
+    def __len__(self) -> int:
+        return len(self.phashes)
+
+    def _chunk_values(self, value: int) -> list[int]:
+        return [(value >> start) & mask for start, mask in self._chunks]
+
+    def get(self, md5_hash: str) -> str | None:
+        return self.phashes.get(md5_hash)
+
+    def add(self, md5_hash: str, phash: str) -> None:
+        old_value = self._values.get(md5_hash)
+        value = int(phash, 16)
+        if old_value is not None:
+            for buckets, chunk in zip(
+                self._buckets, self._chunk_values(old_value), strict=True
+            ):
+                buckets[chunk].discard(md5_hash)
+        self.phashes[md5_hash] = phash
+        self._values[md5_hash] = value
+        for buckets, chunk in zip(
+            self._buckets, self._chunk_values(value), strict=True
+        ):
+            buckets.setdefault(chunk, set()).add(md5_hash)
+
+    def update(self, assets_df: pd.DataFrame) -> None:
+        """Adds the md5_hash and phash of creative_assets rows."""
+        for md5_hash, phash in zip(
+            assets_df["md5_hash"], assets_df["phash"], strict=True
+        ):
+            if pd.notna(phash):
+                self.add(md5_hash, phash)
+
+    def find_near(self, phash: str, max_distance: int | None = None) -> list[str]:
+        """md5 hashes of assets with a phash at most max_distance bits away."""
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            raise ValueError(f"{max_distance=} above {self.max_distance=}")
+        value = int(phash, 16)
+        candidates = set().union(
+            *(
+                buckets.get(chunk, ())
+                for buckets, chunk in zip(
+                    self._buckets, self._chunk_values(value), strict=True
+                )
+            )
+        )
+        return sorted(
+            md5_hash
+            for md5_hash in candidates
+            if (self._values[md5_hash] ^ value).bit_count() <= max_distance
+        )
+
+
+_PHASH_INDEXES: dict[str, PhashIndex] = {}
+
+
+def get_phash_index(pgdb: PostgresEngine) -> PhashIndex:
+    """The creative_assets PhashIndex, read from the database once per process.
+
+    Writers add new assets with ``PhashIndex.update`` rather than reloading.
+    """
+    index = _PHASH_INDEXES.get(pgdb.config_key)
+    if index is None:
+        index = PhashIndex()
+        index.update(query_creative_assets(pgdb))
+        _PHASH_INDEXES[pgdb.config_key] = index
+    return index
+
+
+_PPM_HEADER = re.compile(rb"P6\s+(\d+)\s+(\d+)\s+255\s")
+
+
+def read_ppm_frames(data: bytes) -> list[Image.Image]:
+    """Splits a stream of binary PPM images, as ffmpeg pipes them, into PIL images."""
+    frames = []
+    offset = 0
+    while offset < len(data):
+        header = _PPM_HEADER.match(data, offset)
+        if header is None:
+            raise ValueError(f"Bad PPM header at byte {offset}")
+        size = (int(header.group(1)), int(header.group(2)))
+        end = header.end() + size[0] * size[1] * 3
+        frames.append(Image.frombytes("RGB", size, data[header.end() : end]))
+        offset = end
+    return frames
+
+
+_SHOWINFO_PTS_TIME = re.compile(rb"\bn:\s*\d+\s+pts:\s*-?\d+\s+pts_time:(-?[\d.]+)")
+
+
+def frames_by_second(
+    frames: list[Image.Image], pts_times: list[float]
+) -> dict[int, Image.Image]:
+    """Each of SAMPLE_SECONDS mapped to the first of frames at or after it.
+
+    A frame shown for several seconds, common in GIFs, is the frame of each
+    of them. Seconds after the last frame are missing.
+    """
+    if len(frames) != len(pts_times):
+        raise ValueError(f"{len(frames)} frames for {len(pts_times)} timestamps")
+    sample_frames = {}
+    for second in SAMPLE_SECONDS:
+        position = bisect.bisect_left(pts_times, second)
+        if position < len(frames):
+            sample_frames[second] = frames[position]
+    return sample_frames
+
+
+@functools.lru_cache(maxsize=2)
+def get_sample_frames(local_path: pathlib.Path) -> dict[int, Image.Image]:
+    """Full size frames of a video at SAMPLE_SECONDS.
+
+    One ffmpeg run decodes the start of the video once, selects the first
+    frame at or after each second and pipes them as PPM images straight into
+    PIL. showinfo logs the timestamp of each selected frame, which places
+    frames shown for more than one sample second. Cached so the thumbnail
+    and the phash of a creative share the run.
+    """
+    selects = [
+        "eq(n\\,0)" if second == 0 else f"gte(t\\,{second})*lt(prev_t\\,{second})"
+        for second in SAMPLE_SECONDS
+    ]
+    result = subprocess.run(
         [
             "ffmpeg",
+            "-hide_banner",
             "-loglevel",
-            "error",
-            "-y",
-            "-ss",
-            str(second),
+            "info",
+            "-t",
+            str(max(SAMPLE_SECONDS) + 1),
             "-i",
             str(local_path),
-            "-vframes",
-            "1",
-            "-q:v",
-            "2",
+            "-vf",
+            f"setpts=PTS-STARTPTS,select={'+'.join(selects)},showinfo",
+            "-vsync",
+            "0",
+            "-pix_fmt",
+            "rgb24",
+            "-c:v",
+            "ppm",
             "-f",
-            "image2",
-            str(tmp_path),
+            "image2pipe",
+            "-",
         ],
         check=True,
+        capture_output=True,
     )
-    img = Image.open(tmp_path)
-    return img
+    pts_times = [float(x) for x in _SHOWINFO_PTS_TIME.findall(result.stderr)]
+    return frames_by_second(read_ppm_frames(result.stdout), pts_times)
+
+
+def make_thumbnail(frame: Image.Image) -> Image.Image:
+    """A frame scaled to THUMBNAIL_WIDTH, keeping its aspect ratio."""
+    height = max(1, round(frame.height * THUMBNAIL_WIDTH / frame.width))
+    return frame.resize((THUMBNAIL_WIDTH, height))
 
 
 def average_hashes(hashes: list[imagehash.ImageHash]) -> str:
@@ -57,12 +221,8 @@ def average_hashes(hashes: list[imagehash.ImageHash]) -> str:
 
 def compute_phash_multiple_frames(local_path: pathlib.Path, seconds: list[int]) -> str:
     """Computes perceptual hash from multiple video frames at specified time points."""
-    hashes = []
-    for second in seconds:
-        try:
-            hashes.append(imagehash.phash(extract_frame_at(local_path, second)))
-        except Exception:
-            pass
+    frames = get_sample_frames(local_path)
+    hashes = [imagehash.phash(frames[second]) for second in seconds if second in frames]
     phash = average_hashes(hashes)
     return str(phash)
 
@@ -70,27 +230,29 @@ def compute_phash_multiple_frames(local_path: pathlib.Path, seconds: list[int])
 def get_phash(md5_hash: str, file_extension: str, pgdb: PostgresEngine) -> str:
     """Generates a perceptual hash for a creative file, using multiple frames for videos."""
     phash = None
-    cached_assets = query_creative_assets(pgdb)
-    cached_row = cached_assets[cached_assets["md5_hash"] == md5_hash]
-    if not cached_row.empty and pd.notna(cached_row.iloc[0]["phash"]):
-        return cached_row.iloc[0]["phash"]
+    phash_index = get_phash_index(pgdb)
+    cached_phash = phash_index.get(md5_hash)
+    if cached_phash is not None:
+        return cached_phash
 
     local_path = CREATIVE_RAW_DIR / f"{md5_hash}.{file_extension}"
     seekable_formats = {"mp4", "webm", "gif"}
     if file_extension in seekable_formats:
         try:
-            seconds = [1, 3, 5, 10]
+            seconds = [second for second in SAMPLE_SECONDS if second > 0]
             phash = str(compute_phash_multiple_frames(local_path, seconds))
         except Exception:
             logger.error("Failed to compute multiframe phash")
     if phash is None:
         phash = str(imagehash.phash(Image.open(local_path)))
+    near_md5_hashes = phash_index.find_near(phash)
+    if near_md5_hashes:
+        logger.debug(f"{md5_hash=} is a near-duplicate of {len(near_md5_hashes)}")
     return phash
 
 
 def store_creative_and_thumb_to_local(row: pd.Series, file_extension: str) -> str:
     """Stores creative files locally and generates thumbnails, returning the MD5 hash."""
-    thumbnail_width = 320
     md5_hash = hashlib.md5(row["response_content"]).hexdigest()
     local_path = CREATIVE_RAW_DIR / f"{md5_hash}.{file_extension}"
     if not local_path.exists():
@@ -102,54 +264,10 @@ def store_creative_and_thumb_to_local(row: pd.Series, file_extension: str) -> st
         try:
             ext = file_extension.lower()
             if ext in ANY_CREATIVE_VIDEO_EXTENSIONS:
-                try:
-                    # Attempt to extract a thumbnail at 5s (works for video or animated gif/webp)
-                    ffmpg_thumb_at_5s = [
-                        "ffmpeg",
-                        "-loglevel",
-                        "error",
-                        "-y",
-                        "-ss",
-                        "5",
-                        "-i",
-                        str(local_path),
-                        "-vframes",
-                        "1",
-                        "-vf",
-                        f"scale={thumbnail_width}:-1",
-                        "-q:v",
-                        "2",
-                        "-update",
-                        "1",
-                        str(thumb_path),
-                    ]
-                    print(" ".join(ffmpg_thumb_at_5s))
-                    subprocess.run(
-                        ffmpg_thumb_at_5s,
-                        check=True,
-                    )
-                except subprocess.CalledProcessError:
-                    # Fallback: use first frame (or static image frame)
-                    subprocess.run(
-                        [
-                            "ffmpeg",
-                            "-loglevel",
-                            "error",
-                            "-y",
-                            "-i",
-                            str(local_path),
-                            "-vframes",
-                            "1",
-                            "-vf",
-                            f"scale={thumbnail_width}:-1",
-                            "-q:v",
-                            "2",
-                            "-update",
-                            "1",
-                            str(thumb_path),
-                        ],
-                        check=True,
-                    )
+                frames = get_sample_frames(local_path)
+                # The first frame when the video is shorter than the thumbnail second
+                thumb = make_thumbnail(frames.get(THUMBNAIL_SECOND, frames[0]))
+                thumb.save(thumb_path, "JPEG", quality=95)
             elif ext in CREATIVE_STATIC_MIME_EXTENSIONS:
                 # Static images: no need to seek, just resize
                 subprocess.run(
@@ -161,7 +279,7 @@ def store_creative_and_thumb_to_local(row: pd.Series, file_extension: str) -> st
                         "-i",
                         str(local_path),
                         "-vf",
-                        f"scale={thumbnail_width}:-1",
+                        f"scale={THUMBNAIL_WIDTH}:-1",
                         "-q:v",
                         "2",
                         "-update",
@@ -4,12 +4,16 @@ import hashlib
 import zlib
 from functools import lru_cache
 
+import numpy as np
+
 from adscrawler.config import CONFIG, get_logger
 from adscrawler.dbcon.connection import PostgresEngine
 from adscrawler.dbcon.queries import query_sdk_keys
 
 logger = get_logger(__name__)
 
+MASK_64 = (1 << 64) - 1
+
 
 def sha1_hex(b: bytes) -> str:
     return hashlib.sha1(b).hexdigest()
@@ -131,6 +135,19 @@ def decode_v1_from(payload: bytes, sdk_prefix32: str) -> str | None:
     # seed = int.from_bytes(encrypted_seed_bytes, "little", signed=False)
     seed = int.from_bytes(encrypted_seed_bytes, "little")
     # Now decrypt the ciphertext
+    decrypted_data = xor_permute_v1_np(ciphertext, seed, ckey)
+    # Try to decompress and decode
+    plain, comp = try_decompress(decrypted_data)
+    try:
+        plain = plain.decode("utf-8")
+    except Exception:
+        logger.debug("Decode V1 failed final decode to utf-8")
+        return None
+    return plain
+
+
+def xor_permute_v1(ciphertext: bytes, seed: int, ckey: bytes) -> bytearray:
+    """Byte by byte V1 decryption, the reference for ``xor_permute_v1_np``."""
     decrypted_data = bytearray()
 
     # Process 8 bytes at a time (matching Java's 8-byte block processing)
@@ -174,14 +191,26 @@ def decode_v1_from(payload: bytes, sdk_prefix32: str) -> str | None:
             # Apply the triple XOR: cipher ^ key ^ prng
             decrypted_byte = cipher_byte ^ key_byte ^ prng_byte
             decrypted_data.append(decrypted_byte)
-    # Try to decompress and decode
-    plain, comp = try_decompress(decrypted_data)
-    try:
-        plain = plain.decode("utf-8")
-    except Exception:
-        logger.debug("Decode V1 failed final decode to utf-8")
-        return None
-    return plain
+    return decrypted_data
+
+
+def xor_permute_v1_np(ciphertext: bytes, seed: int, ckey: bytes) -> bytes:
+    """V1 decryption with the keystream built in uint64 blocks.
+
+    Byte-identical to ``xor_permute_v1``, which does not wrap ``seed +
+    counter`` to 64 bits and shifts the signed products arithmetically.
+    """
+    counters = np.arange(0, len(ciphertext), 8, dtype=np.uint64)
+    z = counters + np.uint64(seed)
+    # The carry out of the 64-bit sum lands on bit 31 of z >> 33
+    carry = (z < counters).astype(np.uint64) << np.uint64(31)
+    x = (z ^ (z >> np.uint64(33)) ^ carry) * np.uint64(
+        CONFIG["applovin"]["C1"] & MASK_64
+    )
+    x ^= (x.view(np.int64) >> 29).view(np.uint64)
+    x *= np.uint64(CONFIG["applovin"]["C2"] & MASK_64)
+    x ^= (x.view(np.int64) >> 32).view(np.uint64)
+    return _xor_keystream(ciphertext, x, ckey)
 
 
 def decode_v2_from(blob: bytes, sdk_prefix32: str) -> str | None:
@@ -215,7 +244,7 @@ def decode_v2_from(blob: bytes, sdk_prefix32: str) -> str | None:
     for kval in candidates:
         try:
             seed = seed_enc_le ^ kval
-            dec = xor_permute(payload, seed, digest)
+            dec = xor_permute_np(payload, seed, digest)
             plain, comp = try_decompress(dec)
             text = plain.decode("utf-8", errors="ignore").strip()
             # print(text[0:40])
@@ -252,3 +281,25 @@ def xor_permute(data: bytes, seed: int, key: bytes) -> bytes:
         ks_byte = (cur >> ((i % 8) * 8)) & 0xFF
         out[i] ^= key[i % len(key)] ^ ks_byte
     return bytes(out)
+
+
+def mix64_blocks(seed: int, length: int) -> np.ndarray:
+    """``mix64(seed, i)`` for every 8-byte block start ``i`` below ``length``."""
+    z = np.arange(0, length, 8, dtype=np.uint64) + np.uint64(seed & MASK_64)
+    x = (z ^ (z >> np.uint64(33))) * np.uint64(CONFIG["applovin"]["C1"] & MASK_64)
+    x ^= x >> np.uint64(29)
+    x *= np.uint64(CONFIG["applovin"]["C2"] & MASK_64)
+    x ^= x >> np.uint64(32)
+    return x
+
+
+def xor_permute_np(data: bytes, seed: int, key: bytes) -> bytes:
+    """``xor_permute`` with the keystream built in uint64 blocks."""
+    return _xor_keystream(data, mix64_blocks(seed, len(data)), key)
+
+
+def _xor_keystream(data: bytes, blocks: np.ndarray, key: bytes) -> bytes:
+    """XOR data with key[i%len] and the little-endian bytes of the blocks."""
+    stream = blocks.astype("<u8", copy=False).view(np.uint8)[: len(data)]
+    key_stream = np.resize(np.frombuffer(key, dtype=np.uint8), len(data))
+    return (np.frombuffer(data, dtype=np.uint8) ^ key_stream ^ stream).tobytes()
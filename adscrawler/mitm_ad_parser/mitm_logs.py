@@ -1,7 +1,10 @@
+import dataclasses
 import datetime
+import mmap
 import pathlib
 import re
 import struct
+import tempfile
 
 import numpy as np
 import pandas as pd
@@ -21,7 +24,7 @@ from adscrawler.process.storage import (
     download_mitm_log_by_key,
     get_store_id_mitm_s3_keys,
 )
-from adscrawler.tools.geo import get_geo
+from adscrawler.tools.geo import lookup_ips
 
 logger = get_logger(__name__, "mitm_scrape_ads")
 
@@ -42,6 +45,128 @@ IGNORE_URLS = [
     "https://ota.waydro.id/system/lineage/waydroid_x86_64/GAPPS.json",
 ]
 
+FLOW_COLUMNS = [
+    "mitm_uuid",
+    "flow_type",
+    "tld_url",
+    "status_code",
+    "ip_address",
+    "request_mime_type",
+    "response_mime_type",
+    "response_size_bytes",
+    "url",
+    "called_at",
+]
+
+BODY_COLUMNS = [
+    "request_text",
+    "query_params",
+    "post_params",
+    "response_headers",
+    "response_text",
+    "response_content",
+]
+
+URL_FILE_EXTENSION_PATTERN = r"\.([a-z0-9]{2,4})(?:\?|#|$)"
+
+MEDIA_MIME_PREFIXES = ("image/", "video/", "audio/")
+UNTYPED_MIME_TYPES = {"", "application/octet-stream", "binary/octet-stream"}
+
+# Response bodies at least this large are kept on disk, creatives start at 50KB
+SPILL_MIN_BYTES = 32 * 1024
+
+# Responses decoded to text and searched for the creatives they sent: any
+# response of these ad networks, the ones with their own parser, and other
+# structured responses large enough to hold an ad
+AD_NETWORK_TLDS = frozenset(
+    {
+        "applovin.com",
+        "bidmachine.io",
+        "doubleclick.net",
+        "everestop.io",
+        "fyber.com",
+        "inner-active.mobi",
+        "mtgglobals.com",
+        "tpbid.com",
+        "unity3d.com",
+        "vungle.com",
+        "yandex.ru",
+        "youappi.com",
+    }
+)
+AD_RESPONSE_MIME_PATTERN = r"json|xml|protobuf"
+AD_RESPONSE_MIN_BYTES = 256
+
+
+@dataclasses.dataclass(frozen=True)
+class _SpilledPayload:
+    offset: int
+    length: int
+
+
+class PayloadSpill:
+    """Keeps large payloads of a log in an unlinked temp file instead of memory.
+
+    ``add`` returns a placeholder while the log is read, ``resolve`` then maps
+    the file and swaps the placeholders for memoryviews of it. The views are
+    read from disk only when used and the file is freed with the last of them.
+    """
+
+    def __init__(self, min_bytes: int = SPILL_MIN_BYTES) -> None:
+        self.min_bytes = min_bytes
+        self.file: tempfile._TemporaryFileWrapper | None = None
+
+    def add(self, payload: bytes) -> bytes | _SpilledPayload:
+        if len(payload) < self.min_bytes:
+            return payload
+        if self.file is None:
+            self.file = tempfile.TemporaryFile()
+        offset = self.file.tell()
+        self.file.write(payload)
+        return _SpilledPayload(offset, len(payload))
+
+    def resolve(self, values: list) -> list:
+        if self.file is None:
+            return values
+        with self.file:
+            self.file.flush()
+            # The map keeps its own handle on the file after it is closed
+            view = memoryview(mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ))
+        self.file = None
+        return [
+            (
+                view[value.offset : value.offset + value.length]
+                if isinstance(value, _SpilledPayload)
+                else value
+            )
+            for value in values
+        ]
+
+
+def is_media_response(url: str | None, mime_type: str | None) -> bool:
+    """Whether a response body is an image, video or audio file rather than text.
+
+    Untyped responses count as media when the URL has a creative file extension.
+    """
+    mime_type = (mime_type or "").split(";")[0].strip().lower()
+    if mime_type.startswith(MEDIA_MIME_PREFIXES):
+        return True
+    if mime_type not in UNTYPED_MIME_TYPES:
+        return False
+    match = re.search(URL_FILE_EXTENSION_PATTERN, url or "", flags=re.IGNORECASE)
+    return match is not None and match.group(1).lower() in ALL_CREATIVE_EXTENSIONS
+
+
+def is_ad_response(tld_url: str | None, mime_type: str | None, size_bytes: int) -> bool:
+    """Whether a non media response could be the ad that sent a creative."""
+    if tld_url in AD_NETWORK_TLDS:
+        return True
+    mime_type = (mime_type or "").split(";")[0].strip().lower()
+    return (
+        size_bytes >= AD_RESPONSE_MIN_BYTES
+        and re.search(AD_RESPONSE_MIME_PATTERN, mime_type) is not None
+    )
+
 
 def get_content_text(
     tld_url: str, flowpart: http.HTTPFlow, pgdb: PostgresEngine
@@ -93,8 +218,12 @@ def make_ip_geo_snapshot_df(df: pd.DataFrame, pgdb: PostgresEngine) -> pd.DataFr
     IP to geo location changes over time (days/weeks), so subsequent calls to this function could have incorrect values.
     """
     country_map = query_countries(pgdb)
-    df[["country_iso", "state_iso", "city_name", "org"]] = df["ip_address"].apply(
-        lambda x: pd.Series(get_geo(x))
+    df = pd.merge(
+        df,
+        lookup_ips(df["ip_address"]),
+        how="left",
+        on="ip_address",
+        validate="m:1",
     )
     df = pd.merge(
         df,
@@ -113,7 +242,14 @@ def parse_log(
     pgdb: PostgresEngine,
     include_all: bool = False,
 ) -> pd.DataFrame:
-    """Parses MITM proxy log files and extracts HTTP request/response data into a DataFrame."""
+    """Parses MITM proxy log files and extracts HTTP request/response data into a DataFrame.
+
+    Flows are read one at a time into columns. Flows to IGNORE_URLS are dropped
+    before their bodies are decoded. Every response keeps its bytes, large
+    ones spilled to disk, see ``PayloadSpill``. Only responses that could be
+    ads, see ``is_ad_response``, are decoded to response_text, which is null
+    for the rest.
+    """
     if run_id is None:
         mitm_log_path = pathlib.Path(MITM_DIR, f"traffic_{store_id}.log")
     else:
@@ -129,7 +265,9 @@ def parse_log(
     if not mitm_log_path.exists():
         logger.error(f"mitm log file not found at {mitm_log_path}")
         raise FileNotFoundError
-    parsed_flows = []
+    columns = FLOW_COLUMNS + BODY_COLUMNS if include_all else FLOW_COLUMNS
+    parsed_flows: dict[str, list] = {column: [] for column in columns}
+    spill = PayloadSpill()
     with open(mitm_log_path, "rb") as f:
         reader = FlowReader(f)
         try:
@@ -138,20 +276,22 @@ def parse_log(
                     flow,
                     include_all=include_all,
                     pgdb=pgdb,
+                    spill=spill,
                 )
-                parsed_flows.append(flow_data)
+                if flow_data is None:
+                    continue
+                for column, values in parsed_flows.items():
+                    values.append(flow_data.get(column))
         except FlowReadException:
             logger.warning(f"FlowReadException, bad mitm file, {mitm_log_path}")
-    no_logs_found_msg = "No HTTP requests found in mitm log"
-    if not parsed_flows:
-        logger.warning(no_logs_found_msg)
+    if not parsed_flows["mitm_uuid"]:
+        logger.warning("No HTTP requests found in mitm log")
         return pd.DataFrame()
+    if include_all:
+        parsed_flows["response_content"] = spill.resolve(
+            parsed_flows["response_content"]
+        )
     df = pd.DataFrame(parsed_flows)
-    if "url" in df.columns:
-        df = df[~df["url"].isin(IGNORE_URLS)]
-    if df.empty:
-        logger.warning(no_logs_found_msg)
-        return pd.DataFrame()
     if "response_text" in df.columns:
         df["response_text"] = df["response_text"].astype(str)
     df["status_code"] = df["status_code"].astype(int)
@@ -171,7 +311,9 @@ def process_flow(
     flow: http.HTTPFlow | tcp.TCPFlow,
     include_all: bool,
     pgdb: PostgresEngine,
-) -> dict:
+    spill: PayloadSpill | None = None,
+) -> dict | None:
+    """Extracts the data of one flow, None for flows to IGNORE_URLS."""
     if not isinstance(flow, (http.HTTPFlow, tcp.TCPFlow)):
         # These should be inspected and added
         msg = "Non HTTPFlow found in mitm log"
@@ -191,6 +333,8 @@ def process_flow(
                 + flow.request.headers.get("Host", flow.request.host)
                 + flow.request.path
             )
+        if url in IGNORE_URLS:
+            return None
         tld_url = get_tld(url)
         if flow.response:
             try:
@@ -228,6 +372,7 @@ def process_flow(
                 flow_data=flow_data,
                 tld_url=tld_url,
                 pgdb=pgdb,
+                spill=spill,
             )
     elif isinstance(flow, tcp.TCPFlow):
         flow_data = {
@@ -255,13 +400,14 @@ def append_additional_mitm_data(
     flow_data: dict,
     tld_url: str,
     pgdb: PostgresEngine,
+    spill: PayloadSpill | None = None,
 ) -> dict:
-    """Appends additional data from the mitm flow to the flow_data dictionary."""
+    """Appends additional data from the mitm flow to the flow_data dictionary.
+
+    Response bytes are passed through ``spill`` if given, only ad responses
+    are also decoded to text.
+    """
     flow_data["request_text"] = get_content_text(tld_url, flow.request, pgdb)
-    try:
-        flow_data["content"] = flow.request.content
-    except Exception:
-        flow_data["content"] = ""
     # Add response info if available
     flow_data["query_params"] = (dict(flow.request.query),)
     flow_data["post_params"] = (flow.request.urlencoded_form,)
@@ -274,12 +420,18 @@ def append_additional_mitm_data(
             flow_data["response_headers"] = dict(flow.response.headers)
         except Exception:
             flow_data["response_headers"] = {}
-        flow_data["response_text"] = get_content_text(tld_url, flow.response, pgdb)
+        mime_type = flow_data["response_mime_type"]
+        if not is_media_response(flow_data["url"], mime_type) and is_ad_response(
+            tld_url, mime_type, flow_data["response_size_bytes"]
+        ):
+            flow_data["response_text"] = get_content_text(tld_url, flow.response, pgdb)
         try:
-            flow_data["response_content"] = flow.response.content
+            response_content = flow.response.content
         except Exception:
-            flow_data["response_content"] = b""
-            pass
+            response_content = b""
+        if spill is not None and response_content:
+            response_content = spill.add(response_content)
+        flow_data["response_content"] = response_content
     return flow_data
 
 
@@ -288,7 +440,7 @@ def add_file_extension(df: pd.DataFrame) -> pd.DataFrame:
     df["url_file_extension"] = (
         df["url"]
         .fillna("")
-        .str.extract(r"\.([a-z0-9]{2,4})(?:\?|#|$)", flags=re.IGNORECASE)[0]
+        .str.extract(URL_FILE_EXTENSION_PATTERN, flags=re.IGNORECASE)[0]
         .str.lower()
     )
 
@@ -325,19 +477,10 @@ def add_is_creative_column(df: pd.DataFrame) -> pd.DataFrame:
     )
     # Lots of creatives of the publishing app icon
     # If this cuts out the advertisers icon as well that seems OK?
-    is_square = df.loc[df["is_creative_content"], "response_content"].apply(
-        lambda x: (
-            struct.unpack(">II", x[16:24])[0]
-            if x.startswith(b"\x89PNG\r\n\x1a\n")
-            else None
-        )
-    ) == df.loc[df["is_creative_content"], "response_content"].apply(
-        lambda x: (
-            struct.unpack(">II", x[16:24])[1]
-            if x.startswith(b"\x89PNG\r\n\x1a\n")
-            else None
-        )
+    png_sizes = df.loc[df["is_creative_content"], "response_content"].apply(
+        get_png_size
     )
+    is_square = png_sizes.apply(lambda size: size is not None and size[0] == size[1])
     is_png = df["file_extension"] == "png"
     is_googleusercontent = df["tld_url"] == "googleusercontent.com"
     df["is_creative"] = np.where(
@@ -346,3 +489,10 @@ def add_is_creative_column(df: pd.DataFrame) -> pd.DataFrame:
         False,
     )
     return df
+
+
+def get_png_size(content: bytes | memoryview) -> tuple[int, int] | None:
+    """Width and height from the header of a PNG, None for other content."""
+    if bytes(content[:8]) != b"\x89PNG\r\n\x1a\n":
+        return None
+    return struct.unpack(">II", content[16:24])
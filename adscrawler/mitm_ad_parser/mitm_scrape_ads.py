@@ -1,7 +1,11 @@
+import bisect
 import datetime
+import itertools
+import re
 import subprocess
 import time
 import urllib
+from collections.abc import Iterable
 from concurrent.futures import ProcessPoolExecutor
 from typing import Any
 
@@ -9,6 +13,7 @@ import numpy as np
 import pandas as pd
 
 from adscrawler.config import CREATIVE_THUMBS_DIR, get_logger
+from adscrawler.dbcon.cache import invalidate_tables
 from adscrawler.dbcon.connection import PostgresEngine, get_db_connection
 from adscrawler.dbcon.queries import (
     get_failed_mitm_logs,
@@ -21,9 +26,10 @@ from adscrawler.dbcon.queries import (
 )
 from adscrawler.mitm_ad_parser.creative_processor import (
     get_phash,
+    get_phash_index,
     store_creative_and_thumb_to_local,
 )
-from adscrawler.mitm_ad_parser.mitm_logs import get_mitm_df
+from adscrawler.mitm_ad_parser.mitm_logs import BODY_COLUMNS, get_mitm_df
 from adscrawler.mitm_ad_parser.network_parsers import (
     parse_creative_request,
     parse_sent_video_df,
@@ -48,18 +54,100 @@ class _WorkerContext:
     db_connection = None
 
 
+def _trie_regex(words: Iterable[str]) -> str:
+    """Regex matching the longest of ``words`` that starts at a position.
+
+    Alternatives share their common prefixes, so the engine checks one
+    character per step instead of every word at every position.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def node_regex(node: dict) -> str:
+        branches = [
+            re.escape(char) + node_regex(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not branches:
+            return ""
+        group = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # Optional and greedy: a longer word wins over its prefix
+        return f"(?:{group})?" if "" in node else group
+
+    return node_regex(trie)
+
+
+class SentVideoIndex:
+    """Rows of a log whose response_text contains each of a set of video ids.
+
+    Built once per log with a single pass over the ad responses parse_log
+    decoded instead of one scan of every body per creative, rows without a
+    response_text are skipped. The ids are compiled into a prefix trie regex,
+    which finds the longest id starting at each position. Shorter ids
+    matching there are its prefixes, so every occurrence of every id is
+    found, the same rows a substring search per id would return.
+    """
+
+    def __init__(self, df: pd.DataFrame, video_ids: Iterable[str]) -> None:
+        video_ids = {video_id for video_id in video_ids if video_id}
+        self.positions: dict[str, list[int]] = {video_id: [] for video_id in video_ids}
+        if not video_ids:
+            return
+        alphabet = set().union(*video_ids)
+        lengths = sorted({len(video_id) for video_id in video_ids})
+        # No id contains the separator, so matches never span two bodies
+        separator = next(chr(i) for i in itertools.count() if chr(i) not in alphabet)
+        positions, texts = [], []
+        for position, text in enumerate(df["response_text"].astype(str)):
+            # Missing values stay missing in pandas' str dtype
+            if isinstance(text, str):
+                positions.append(position)
+                texts.append(text)
+        text_starts = list(
+            itertools.accumulate((len(text) + 1 for text in texts[:-1]), initial=0)
+        )
+        id_pattern = re.compile(_trie_regex(video_ids))
+        all_text = separator.join(texts)
+        found: dict[str, set[int]] = {video_id: set() for video_id in video_ids}
+        match = id_pattern.search(all_text)
+        while match is not None:
+            longest = match.group()
+            position = positions[bisect.bisect_right(text_starts, match.start()) - 1]
+            for length in lengths:
+                if length > len(longest):
+                    break
+                if longest[:length] in found:
+                    found[longest[:length]].add(position)
+            # Ids can overlap, resume right after the start of this one
+            match = id_pattern.search(all_text, match.start() + 1)
+        self.positions = {video_id: sorted(rows) for video_id, rows in found.items()}
+
+
 def find_sent_video_df(
-    df: pd.DataFrame, row: pd.Series, video_id: str
+    df: pd.DataFrame,
+    row: pd.Series,
+    video_id: str,
+    sent_video_index: SentVideoIndex | None = None,
 ) -> pd.DataFrame | None:
-    """Retrieves DataFrame rows containing the specified video ID from the given DataFrame."""
-    sent_video_df = df[
-        (df["response_text"].astype(str).str.contains(video_id, regex=False))
-        & (df["called_at"] <= row.called_at)
-    ].copy()
+    """Retrieves DataFrame rows containing the specified video ID from the given DataFrame.
+
+    Only the ad responses parse_log decoded to text are searched. Responses
+    sent before the creative was requested are preferred. Pass a
+    ``SentVideoIndex`` of ``df`` built with ``video_id`` to skip the scan.
+    """
+    if sent_video_index is None:
+        contains = df["response_text"].astype(str).str.contains(video_id, regex=False)
+        containing_df = df[contains]
+    else:
+        containing_df = df.iloc[sent_video_index.positions[video_id]]
+    sent_video_df = containing_df[containing_df["called_at"] <= row.called_at].copy()
     if sent_video_df.empty:
-        sent_video_df = df[
-            (df["response_text"].astype(str).str.contains(video_id, regex=False))
-        ].copy()
+        sent_video_df = containing_df.copy()
     if sent_video_df.empty:
         return None
     if sent_video_df.shape[0] > 1:
@@ -119,6 +207,14 @@ def attribute_creatives(
     creatives["video_id"] = creatives.apply(get_video_id, axis=1)
     creatives = creatives.drop_duplicates(subset=["video_id", "response_size_bytes"])
     row_count = creatives.shape[0]
+    sent_video_index = SentVideoIndex(
+        df,
+        [
+            video_id
+            for video_id in creatives["video_id"].unique()
+            if len(video_id) >= 5 and video_id not in IGNORE_CREATIVE_IDS
+        ],
+    )
     sent_video_cache = {}
     parse_results_cache = {}
     i = 0
@@ -157,7 +253,7 @@ def attribute_creatives(
                 logger.info(
                     f"{log_info} Processing {i}/{row_count} {host_ad_network_tld} {video_id=}"
                 )
-                sent_video_df = find_sent_video_df(df, row, video_id)
+                sent_video_df = find_sent_video_df(df, row, video_id, sent_video_index)
             if sent_video_df is None or sent_video_df.empty:
                 error_msg = (
                     f"No requests found as source for {row['tld_url']} {video_id=}"
@@ -357,6 +453,12 @@ def attribute_creatives(
             f"No matched for creatives {pub_store_id}, {len(error_messages)} unmatched"
         )
         logger.warning(f"{log_info} {msg}")
+    # Error rows are only logged, and spilled bodies are memoryviews which
+    # cannot be pickled back from scan_all_apps worker processes
+    error_messages = [
+        x.drop(BODY_COLUMNS, errors="ignore") if isinstance(x, pd.Series) else x
+        for x in error_messages
+    ]
     return adv_creatives_df, error_messages
 
 
@@ -404,6 +506,7 @@ def get_domains(
                 pgdb=pgdb,
                 return_rows=True,
             )
+            invalidate_tables("domains")
             domains_df = pd.concat(
                 [
                     new_ad_domains[["id", "domain_name"]].rename(
@@ -588,6 +691,8 @@ def parse_store_id_mitm_log(
         insert_columns=["md5_hash", "file_extension", "phash"],
         return_rows=True,
     )
+    invalidate_tables("creative_assets")
+    get_phash_index(pgdb).update(assets_df)
     assets_df = assets_df.rename(columns={"id": "creative_asset_id"})
     # Future feature
     adv_creatives_df["advertiser_domain_id"] = None
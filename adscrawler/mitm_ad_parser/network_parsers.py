@@ -4,8 +4,11 @@ import hashlib
 import html
 import json
 import re
+import threading
 import urllib
 import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 import numpy as np
@@ -16,11 +19,13 @@ from bs4 import BeautifulSoup
 from protod import Renderer
 
 from adscrawler.config import get_logger
+from adscrawler.dbcon.cache import invalidate_tables
 from adscrawler.dbcon.connection import PostgresEngine
 from adscrawler.dbcon.queries import (
     clear_url_query_caches,
     get_all_mmp_tlds_set,
     get_click_url_redirect_chains,
+    get_redirect_chains_by_url_hashes,
     query_all_domains,
     query_api_call_id_for_uuid,
     query_domains_set,
@@ -58,6 +63,14 @@ ANDROID_USER_AGENT = "Mozilla/5.0 (Linux; Android 13; Pixel 7 Pro) AppleWebKit/5
 
 IGNORE_STORE_IDS = ["com.android.vending"]
 
+# Redirects stop at store pages, following them only costs requests
+STORE_URL_PREFIXES = ("play.google.com/store", "apps.apple.com/", "itunes.apple.com/")
+STORE_URL_SCHEMES = {"market", "intent"}
+
+MAX_REDIRECT_WORKERS = 16
+MAX_REQUESTS_PER_HOST = 4
+REDIRECT_CACHE_SIZE = 100_000
+
 
 IGNORE_PRIVACY_URLS = [
     "/policy.html",
@@ -327,9 +340,8 @@ def check_click_urls(
     pgdb: PostgresEngine,
 ) -> list[str]:
     """Checks URLs for click tracking and follows redirects to find final destination URLs."""
-    click_urls = []
+    redirect_urls = []
     for url in all_urls:
-        redirect_urls = []
         if (
             "/click" in url
             or "/clk" in url
@@ -338,12 +350,11 @@ def check_click_urls(
         ):
             if "tpbid.com" in url:
                 url = url.replace("fybernativebrowser://navigate?url=", "")
-            redirect_urls = follow_url_redirects(url, run_id, api_call_id, pgdb)
+            redirect_urls.append(url)
         elif "fybernativebrowser://navigate?url=" in url:
             url = url.replace("fybernativebrowser://navigate?url=", "")
-            redirect_urls = follow_url_redirects(url, run_id, api_call_id, pgdb)
-        if len(redirect_urls) > 0:
-            click_urls += redirect_urls
+            redirect_urls.append(url)
+    click_urls = follow_click_url_redirects(redirect_urls, run_id, api_call_id, pgdb)
     click_urls = list(set(click_urls))
     return click_urls
 
@@ -380,6 +391,7 @@ def check_and_upsert_new_domains(
             pgdb=pgdb,
             return_rows=True,
         )
+        invalidate_tables("domains")
         domains_df = pd.concat([new_domains, domains_df])
     domains_df["id"] = domains_df["id"].astype(int)
     domains_df = domains_df.rename(columns={"id": "domain_id"})
@@ -472,8 +484,14 @@ def upsert_urls(urls: list[str], pgdb: PostgresEngine) -> pd.DataFrame:
 def upsert_click_url_redirect_chains(
     chain_df: pd.DataFrame, pgdb: PostgresEngine
 ) -> None:
-    """Upserts the redirect chain into the database."""
-    urls = list(set(chain_df["url"].to_list() + chain_df["next_url"].to_list()))
+    """Upserts the redirect chain into the database.
+
+    A hop without a next_url marks a start url that was resolved to no
+    redirects.
+    """
+    urls = list(
+        set(chain_df["url"].to_list() + chain_df["next_url"].dropna().to_list())
+    )
     urls_df = upsert_urls(urls=urls, pgdb=pgdb)
     chain_df = chain_df.merge(
         urls_df[["url", "url_id"]],
@@ -489,6 +507,14 @@ def upsert_click_url_redirect_chains(
         how="left",
         validate="m:1",
     )
+    chain_df["next_url_id"] = pd.Series(
+        [
+            None if pd.isna(url_id) else int(url_id)
+            for url_id in chain_df["next_url_id"]
+        ],
+        index=chain_df.index,
+        dtype=object,
+    )
     upsert_df(
         df=chain_df[["run_id", "api_call_id", "url_id", "next_url_id", "hop_index"]],
         pgdb=pgdb,
@@ -499,54 +525,159 @@ def upsert_click_url_redirect_chains(
     )
 
 
+class HostLimiter:
+    """Caps the requests in flight to each host, shared between threads."""
+
+    def __init__(self, per_host: int = MAX_REQUESTS_PER_HOST) -> None:
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.BoundedSemaphore] = {}
+
+    def __call__(self, url: str) -> threading.BoundedSemaphore:
+        host = urllib.parse.urlparse(url).netloc.lower()
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+
+# Redirect hops by start url hash, empty chains included, shared by the
+# threads and calls of a process. The database backs them, an empty chain as
+# a single hop without a next_url.
+_REDIRECT_CHAINS: OrderedDict[str, list[dict]] = OrderedDict()
+_REDIRECT_CHAINS_LOCK = threading.Lock()
+
+
+def _cache_redirect_chain(url_hash: str, chain: list[dict]) -> None:
+    with _REDIRECT_CHAINS_LOCK:
+        _REDIRECT_CHAINS[url_hash] = chain
+        while len(_REDIRECT_CHAINS) > REDIRECT_CACHE_SIZE:
+            _REDIRECT_CHAINS.popitem(last=False)
+
+
+def _chain_from_rows(url: str, url_chain_df: pd.DataFrame) -> list[dict]:
+    """Hops of one stored chain, empty for a url without redirects."""
+    return [
+        {"hop_index": hop_index, "url": url, "next_url": next_url}
+        for hop_index, next_url in zip(
+            url_chain_df["hop_index"], url_chain_df["redirect_url"], strict=True
+        )
+        if pd.notna(next_url)
+    ]
+
+
 def follow_url_redirects(
     url: str, run_id: int, api_call_id: int, pgdb: PostgresEngine
 ) -> list[str]:
     """Follows URL redirects and returns the final destination URL chain."""
-    """
-    Follows redirects and returns the final URL.
+    return follow_click_url_redirects([url], run_id, api_call_id, pgdb)
 
-    Cache the results in the database to avoid repeated requests.
+
+def follow_click_url_redirects(
+    urls: list[str], run_id: int, api_call_id: int, pgdb: PostgresEngine
+) -> list[str]:
+    """
+    Follows the redirects of click URLs and returns the URLs of all chains.
+
+    Chains already stored for this api call are used as is. Any other url
+    hash is resolved at most once: from this process's cache, else from a
+    chain stored by an earlier run, else over the network, all URLs at once
+    with bounded concurrency per host. New chains are written to
+    url_redirect_chains for this api call, empty ones as a terminal hop
+    without a next_url.
     """
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return []
+    chains: dict[str, list[dict]] = {}
     existing_chain_df = get_click_url_redirect_chains(run_id, pgdb)
-    if not existing_chain_df.empty and url in existing_chain_df["url"].to_list():
+    if not existing_chain_df.empty:
         existing_chain_df = existing_chain_df[
-            (existing_chain_df["url"] == url)
+            existing_chain_df["url"].isin(urls)
             & (existing_chain_df["api_call_id"] == api_call_id)
         ]
-        if not existing_chain_df.empty:
-            redirect_chain: list[str] = existing_chain_df["redirect_url"].to_list()
-            return redirect_chain
-    # New chain, insert after getting the chain
-    redirect_chain_dict = get_redirect_chain(url)
-    if len(redirect_chain_dict) > 0:
-        logger.info(f"Found new click redirects: {len(redirect_chain_dict)}")
-        chain_df = pd.DataFrame(redirect_chain_dict)
+        for url, url_chain_df in existing_chain_df.groupby("url"):
+            chains[url] = _chain_from_rows(url, url_chain_df)
+    url_hashes = {url: hashlib.md5(url.encode()).hexdigest() for url in urls}
+    new_chains: dict[str, list[dict]] = {}
+    with _REDIRECT_CHAINS_LOCK:
+        for url in urls:
+            if url not in chains and url_hashes[url] in _REDIRECT_CHAINS:
+                new_chains[url] = _REDIRECT_CHAINS[url_hashes[url]]
+    to_lookup = [url for url in urls if url not in chains and url not in new_chains]
+    if to_lookup:
+        stored_df = get_redirect_chains_by_url_hashes(
+            [url_hashes[url] for url in to_lookup], pgdb
+        )
+        for url, url_chain_df in stored_df.groupby("url"):
+            new_chains[url] = _chain_from_rows(url, url_chain_df)
+            _cache_redirect_chain(url_hashes[url], new_chains[url])
+    to_resolve = [url for url in to_lookup if url not in new_chains]
+    if to_resolve:
+        host_limiter = HostLimiter()
+        with ThreadPoolExecutor(
+            max_workers=min(MAX_REDIRECT_WORKERS, len(to_resolve))
+        ) as executor:
+            resolved = executor.map(
+                lambda url: get_redirect_chain(url, host_limiter), to_resolve
+            )
+            for url, chain in zip(to_resolve, resolved, strict=True):
+                # Hops are stored against the url the chain starts from
+                chain = [{**hop, "url": url} for hop in chain]
+                new_chains[url] = chain
+                _cache_redirect_chain(url_hashes[url], chain)
+    # A terminal hop records urls without redirects so they are not requested
+    # again by later runs
+    new_chain_rows = [
+        hop
+        for url, chain in new_chains.items()
+        for hop in chain or [{"hop_index": 0, "url": url, "next_url": None}]
+    ]
+    if new_chain_rows:
+        logger.info(f"Found new click redirects: {len(new_chain_rows)}")
+        chain_df = pd.DataFrame(new_chain_rows)
         chain_df["run_id"] = run_id
         chain_df["api_call_id"] = api_call_id
-        chain_df["url"] = url
         upsert_click_url_redirect_chains(chain_df, pgdb)
-        redirect_chain = list(
-            set(chain_df["next_url"].to_list() + chain_df["url"].to_list())
-        )
-    else:
-        redirect_chain = []
+    chains.update(new_chains)
+    redirect_chain = list(
+        {
+            redirect_url
+            for url, chain in chains.items()
+            if chain
+            for redirect_url in [url, *(hop["next_url"] for hop in chain)]
+        }
+    )
     return redirect_chain
 
 
-def get_redirect_chain(url: str) -> list[dict]:
-    """Follows HTTP redirects for a given URL and returns the complete redirect chain."""
+def is_store_url(url: str) -> bool:
+    """Whether a URL opens an app store page, where redirects end."""
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme.lower() in STORE_URL_SCHEMES:
+        return True
+    return f"{parsed.netloc.lower()}{parsed.path}".startswith(STORE_URL_PREFIXES)
+
+
+def get_redirect_chain(url: str, host_limiter: HostLimiter | None = None) -> list[dict]:
+    """Follows HTTP redirects for a given URL and returns the complete redirect chain.
+
+    Stops early at a store URL or at a URL already seen in the chain.
+    """
+    host_limiter = host_limiter or HostLimiter()
     max_redirects = 5
     chain = []
     cur_url = url
+    seen_urls = {url}
     hop_index = 0
     while cur_url and hop_index < max_redirects:
         try:
             headers = {"User-Agent": ANDROID_USER_AGENT}
             # Do NOT allow requests to auto-follow
-            response = requests.get(
-                cur_url, headers=headers, allow_redirects=False, timeout=(5, 5)
-            )
+            with host_limiter(cur_url):
+                response = requests.get(
+                    cur_url, headers=headers, allow_redirects=False, timeout=(5, 5)
+                )
             next_url = response.headers.get("Location")
         except Exception:
             next_url = None
@@ -554,8 +685,14 @@ def get_redirect_chain(url: str) -> list[dict]:
         if next_url:
             chain.append({"hop_index": hop_index, "url": cur_url, "next_url": next_url})
             hop_index += 1
-        if not next_url or not next_url.startswith("http"):
+        if (
+            not next_url
+            or not next_url.startswith("http")
+            or is_store_url(next_url)
+            or next_url in seen_urls
+        ):
             break
+        seen_urls.add(next_url)
         cur_url = next_url
     return chain
 
@@ -811,6 +948,14 @@ def base64decode(s: str) -> bytes:
     return base64.urlsafe_b64decode(s)
 
 
+def get_response_bytes(sent_video_dict: dict[str, Any]) -> bytes:
+    """Response body as bytes, large bodies are memoryviews of a spill file."""
+    content = sent_video_dict["response_content"]
+    if isinstance(content, str):
+        content = ast.literal_eval(content)
+    return bytes(content)
+
+
 def parse_bidmachine_ad(
     sent_video_dict: dict[str, Any], pgdb: PostgresEngine
 ) -> AdInfo:
@@ -820,12 +965,8 @@ def parse_bidmachine_ad(
     ad_info = AdInfo(
         adv_store_id=adv_store_id,
     )
-    if isinstance(sent_video_dict["response_content"], str):
-        sent_video_dict["response_content"] = ast.literal_eval(
-            sent_video_dict["response_content"]
-        )
     ret = protod.dump(
-        sent_video_dict["response_content"],
+        get_response_bytes(sent_video_dict),
         renderer=JsonRenderer(),
         str_decoder=decode_utf8,
     )
@@ -871,12 +1012,8 @@ def parse_bidmachine_ad(
 
 def parse_everestop_ad(sent_video_dict: dict[str, Any]) -> AdInfo:
     """Parses Everestop ad response using protobuf decoding to extract advertiser information."""
-    if isinstance(sent_video_dict["response_content"], str):
-        sent_video_dict["response_content"] = ast.literal_eval(
-            sent_video_dict["response_content"]
-        )
     ret = protod.dump(
-        sent_video_dict["response_content"],
+        get_response_bytes(sent_video_dict),
         renderer=JsonRenderer(),
         str_decoder=decode_utf8,
     )
@@ -16,6 +16,7 @@ from adscrawler.config import (
     XAPKS_TMP_UNZIP_DIR,
     get_logger,
 )
+from adscrawler.dbcon.cache import invalidate_tables
 from adscrawler.dbcon.connection import PostgresEngine
 from adscrawler.dbcon.queries import (
     get_version_code_dbid,
@@ -285,6 +286,7 @@ def insert_missing_ad_domains(
                 key_columns=["domain_name"],
                 pgdb=pgdb,
             )
+            invalidate_tables("domains")
 
     return
 
@@ -41,8 +41,8 @@ logger = get_logger(__name__, "process_sdks")
 def _scan_single_app(row: dict, store: int) -> dict:
     """Worker entrypoint that decodes one app and persists its scan results.
 
-    A fresh Postgres connection is created inside the worker process (never
-    forked/shared across processes) and disposed when the app is done. Temp
+    The worker process's own pooled Postgres connection is used (never
+    forked/shared across processes) and reused for the next app. Temp
     files are also cleaned up here, in the worker's own workspace.
     """
     store_id = row["store_id"]
@@ -118,9 +118,6 @@ def _scan_single_app(row: dict, store: int) -> dict:
             remove_tmp_files(store_id=store_id)
         except Exception:
             logger.exception(f"{log_info} failed to clean tmp files")
-        if pgdb and hasattr(pgdb, "engine"):
-            pgdb.engine.dispose()
-            logger.debug(f"{log_info} database connection disposed")
 
 
 def manual_download_app(
@@ -23,6 +23,8 @@ AGG_MATCHED_SDK_STRINGS = "agg-data/matched-sdk-strings"
 AGG_MATCHED_SDK_STRINGS_LATEST = "agg-data/matched-sdk-strings-latest"
 TMP_MATCHED_SDK_STRINGS = "tmp/matched-sdk-strings"
 TMP_MATCHED_SDK_STRINGS_LATEST = "tmp/matched-sdk-strings-latest"
+# Watermarks of the last version details update, see update_version_details_aggregates
+STATE_VERSION_DETAILS = "agg-data/_state/version-details.json"
 
 
 LOOKUP_VERSION_STRINGS = "lookups/version-strings/version-strings.parquet"
@@ -1,13 +1,14 @@
 """App metrics history — raw → hashed daily → weekly → interpolated → DB."""
 
 import datetime
+import pathlib
 
 import duckdb
 import numpy as np
 import pandas as pd
 
 from adscrawler.config import CONFIG, get_logger
-from adscrawler.dbcon.connection import PostgresEngine
+from adscrawler.dbcon.connection import PostgresEngine, get_db_connection
 from adscrawler.dbcon.queries import (
     clean_app_metrics_history_table,
     delete_app_metrics_by_date_and_apps,
@@ -25,11 +26,18 @@ from adscrawler.process import (
     AGG_APP_HASH_BUCKETS_WEEKLY,
     RAW_DATA_APP_DETAILS,
 )
+from adscrawler.process.bucket_scheduler import (
+    CHECKPOINT_DIR,
+    BucketCheckpoint,
+    run_hash_buckets,
+)
 from adscrawler.process.storage import (
     delete_s3_objects_by_date_range,
+    delete_s3_objects_by_keys,
     delete_s3_objects_by_prefix,
     get_duckdb_connection,
     get_parquet_paths_by_prefix,
+    list_hive_partitioned_parquets,
 )
 
 logger = get_logger(__name__, "scrape_stores")
@@ -139,10 +147,29 @@ def clean_history_tables(pgdb: PostgresEngine) -> None:
     clean_app_metrics_history_table(pgdb=pgdb, table_name="app_country_metrics_history")
 
 
+APP_METRICS_BUCKET_STAGES = ["weekly", "interpolate", "db"]
+# Checkpoint key for the steps that run once for all buckets
+ALL_BUCKETS = "all"
+
+
 def delete_and_aggregate_s3_agg(
     store: int,
     pgdb: PostgresEngine,
+    workers: int = 1,
+    memory_budget_gb: float | None = None,
+    max_retries: int = 2,
+    resume: bool = True,
+    single_pass_weekly: bool = True,
 ) -> None:
+    """Rebuild the S3 metrics aggregates for recent days and load them to the DB.
+
+    Raw → daily runs once per day for all buckets. With single_pass_weekly the
+    daily → weekly step also runs once for all buckets and weeks, otherwise
+    per bucket and week. The remaining stages then run per hash bucket on
+    ``workers`` processes, see ``run_hash_buckets``. Finished steps are
+    checkpointed per store and day, so a rerun after a crash or failed
+    buckets only redoes the unfinished ones.
+    """
     end_date = datetime.date.today()
     raw_data_lookback_days = 3
     raw_weekly_lookback_days = 8
@@ -150,20 +177,81 @@ def delete_and_aggregate_s3_agg(
     interpolate_delete_lookback_days = 90
     db_delete_lookback_days = 30
 
+    checkpoint = BucketCheckpoint(
+        path=pathlib.Path(
+            CHECKPOINT_DIR, f"app_metrics_history_store={store}_{end_date}.json"
+        ),
+        resume=resume,
+    )
+
     # Raw data → agg by DAY
-    raw_start = end_date - datetime.timedelta(days=raw_data_lookback_days)
-    for snapshot_date in pd.date_range(raw_start, end_date, freq="D"):
-        log_info = f"{store=} {snapshot_date.date()} S3 raw app details agg"
-        logger.info(f"{log_info} start")
-        make_s3_app_hash_metrics_history_daily(store=store, snapshot_date=snapshot_date)
+    if checkpoint.remaining_stages(ALL_BUCKETS, ["daily"]):
+        raw_start = end_date - datetime.timedelta(days=raw_data_lookback_days)
+        for snapshot_date in pd.date_range(raw_start, end_date, freq="D"):
+            log_info = f"{store=} {snapshot_date.date()} S3 raw app details agg"
+            logger.info(f"{log_info} start")
+            make_s3_app_hash_metrics_history_daily(
+                store=store, snapshot_date=snapshot_date
+            )
+        checkpoint.mark_done(ALL_BUCKETS, ["daily"])
 
-    # Agg DAY → WEEK
     raw_weekly_start = end_date - pd.Timedelta(days=raw_weekly_lookback_days)
-    start_date_mon = raw_weekly_start - pd.Timedelta(days=raw_weekly_start.weekday())
-    for hash_bucket in [f"{i:02x}" for i in range(256)]:
-        for week_start in pd.date_range(start_date_mon, end_date, freq="W-MON"):
-            log_info = f"{store=} hash={hash_bucket} {week_start.date()} S3 weekly agg"
-            logger.info(f"{log_info} start")
+    weekly_start_mon = raw_weekly_start - pd.Timedelta(days=raw_weekly_start.weekday())
+    bucket_stages = APP_METRICS_BUCKET_STAGES
+    if single_pass_weekly:
+        # Agg DAY → WEEK for all buckets in one job
+        if checkpoint.remaining_stages(ALL_BUCKETS, ["weekly"]):
+            make_s3_app_hash_metrics_history_weekly_all(
+                store=store, range_start_mon=weekly_start_mon, range_end=end_date
+            )
+            checkpoint.mark_done(ALL_BUCKETS, ["weekly"])
+        bucket_stages = [x for x in bucket_stages if x != "weekly"]
+    query_start = end_date - datetime.timedelta(days=interpolate_query_lookback_days)
+    delete_start = end_date - datetime.timedelta(days=interpolate_delete_lookback_days)
+    failed = run_hash_buckets(
+        task=process_app_hash_bucket_stage,
+        stages=bucket_stages,
+        checkpoint=checkpoint,
+        task_kwargs={
+            "store": store,
+            "config_key": pgdb.config_key,
+            "end_date": end_date,
+            "weekly_start_mon": weekly_start_mon,
+            "query_start_mon": query_start
+            - datetime.timedelta(days=query_start.weekday()),
+            "delete_start_mon": delete_start
+            - datetime.timedelta(days=delete_start.weekday()),
+            "db_delete_start": end_date
+            - datetime.timedelta(days=db_delete_lookback_days),
+        },
+        workers=workers,
+        memory_budget_gb=memory_budget_gb,
+        max_retries=max_retries,
+    )
+    if failed:
+        raise RuntimeError(
+            f"{store=} app metrics failed for hash buckets {sorted(failed)}, "
+            f"rerun to resume from {checkpoint.path}"
+        )
+
+
+def process_app_hash_bucket_stage(
+    hash_bucket: str,
+    stage: str,
+    store: int,
+    config_key: str,
+    end_date: datetime.date,
+    weekly_start_mon: datetime.date,
+    query_start_mon: datetime.date,
+    delete_start_mon: datetime.date,
+    db_delete_start: datetime.date,
+) -> None:
+    """One stage of delete_and_aggregate_s3_agg for one hash bucket."""
+    log_info = f"{store=} hash={hash_bucket} {stage=}"
+    logger.info(f"{log_info} start")
+    if stage == "weekly":
+        # Agg DAY → WEEK
+        for week_start in pd.date_range(weekly_start_mon, end_date, freq="W-MON"):
             make_s3_app_hash_metrics_history_weekly(
                 store=store,
                 range_start=week_start.date(),
@@ -171,21 +259,8 @@ def delete_and_aggregate_s3_agg(
                 hash_bucket=hash_bucket,
                 clear_bucket_by_week=True,
             )
-
-    # WEEK → interpolated (filled) weekly
-    for hash_bucket in [f"{i:02x}" for i in range(256)]:
-        query_start = end_date - datetime.timedelta(
-            days=interpolate_query_lookback_days
-        )
-        query_start_mon = query_start - datetime.timedelta(days=query_start.weekday())
-        delete_start = end_date - datetime.timedelta(
-            days=interpolate_delete_lookback_days
-        )
-        delete_start_mon = delete_start - datetime.timedelta(
-            days=delete_start.weekday()
-        )
-        log_info = f"{store=} hash={hash_bucket} {query_start_mon} S3 interpolate"
-        logger.info(f"{log_info} start")
+    elif stage == "interpolate":
+        # WEEK → interpolated (filled) weekly
         write_app_hash_buckets_interpolated_to_s3(
             store=store,
             query_start_mon=query_start_mon,
@@ -193,20 +268,22 @@ def delete_and_aggregate_s3_agg(
             hash_bucket=hash_bucket,
             end_date=end_date,
         )
-        db_delete_start = end_date - datetime.timedelta(days=db_delete_lookback_days)
+    elif stage == "db":
         process_app_metrics_to_db(
             hash_bucket=hash_bucket,
-            pgdb=pgdb,
+            pgdb=get_db_connection(config_key),
             store=store,
             db_delete_start=db_delete_start,
         )
+    else:
+        raise ValueError(f"Unknown app metrics bucket {stage=}")
 
 
-def copy_daily_to_weekly_hash_buckets(
+def select_daily_to_weekly_hash_buckets(
     store: int,
     daily_parquet_paths: list[str],
 ) -> str:
-    bucket = CONFIG["s3"]["bucket"]
+    """Latest crawl per store_id, country and week from daily hash bucket files."""
     if store == 1:
         sel_metrics = "installs, rating, rating_count, review_count, histogram, store_last_updated"
         fin_metrics = "installs, rating, rating_count, review_count, histogram, store_last_updated"
@@ -256,7 +333,7 @@ def copy_daily_to_weekly_hash_buckets(
               ) parsed
         """
         extra_sort_column = "rating_count DESC"
-    query = f"""COPY (
+    query = f"""
               WITH raw_data AS (
                   SELECT
                       store_id,
@@ -283,13 +360,33 @@ def copy_daily_to_weekly_hash_buckets(
                   ) = 1
               )
               {post_deduped_select}
-          ) TO 's3://{bucket}/{AGG_APP_HASH_BUCKETS_WEEKLY}/store={store}/'
+    """
+    return query
+
+
+def copy_daily_to_weekly_hash_buckets(
+    store: int,
+    daily_parquet_paths: list[str],
+    return_stats: bool = False,
+    source: str | None = None,
+) -> str:
+    """COPY weekly rows to S3 partitioned by hash_bucket and week_start.
+
+    source is a table or subquery to copy instead of selecting from the
+    daily files, return_stats makes the COPY return one row per written file.
+    """
+    bucket = CONFIG["s3"]["bucket"]
+    if source is None:
+        source = f"({select_daily_to_weekly_hash_buckets(store, daily_parquet_paths)})"
+    stats_option = ",\n              RETURN_STATS true" if return_stats else ""
+    query = f"""COPY {source}
+          TO 's3://{bucket}/{AGG_APP_HASH_BUCKETS_WEEKLY}/store={store}/'
           (
               FORMAT PARQUET,
               PARTITION_BY (hash_bucket, week_start),
               ROW_GROUP_SIZE 100000,
               COMPRESSION 'zstd',
-              OVERWRITE_OR_IGNORE true
+              OVERWRITE_OR_IGNORE true{stats_option}
           );
     """
     return query
@@ -336,6 +433,98 @@ def make_s3_app_hash_metrics_history_weekly(
         duckdb_con.execute(query)
 
 
+def make_s3_app_hash_metrics_history_weekly_all(
+    store: int,
+    range_start_mon: datetime.date,
+    range_end: datetime.date,
+) -> dict[tuple[str, str], int]:
+    """Rebuild every hash bucket's weeks in [range_start_mon, range_end] at once.
+
+    One listing each of the daily and weekly store prefixes, one bulk delete
+    of the old week partitions and one DuckDB job. The rows written to each
+    (hash_bucket, week_start) partition are checked against the rows
+    aggregated for it, a mismatch raises.
+
+    Returns:
+        Rows written per (hash_bucket, week_start).
+    """
+    s3_config_key = "s3"
+    bucket = CONFIG[s3_config_key]["bucket"]
+    week_starts = [
+        ws.strftime("%Y-%m-%d")
+        for ws in pd.date_range(range_start_mon, range_end, freq="W-MON")
+    ]
+    log_info = f"{store=} weeks={week_starts} S3 weekly agg all buckets"
+    logger.info(f"{log_info} start")
+
+    daily_df = list_hive_partitioned_parquets(
+        bucket, f"{AGG_APP_HASH_BUCKETS_DAILY}/store={store}/"
+    )
+    daily_paths = []
+    if not daily_df.empty:
+        daily_weeks = pd.to_datetime(daily_df["snapshot_date"]).dt.to_period("W-SUN")
+        in_range = daily_weeks.dt.start_time.dt.strftime("%Y-%m-%d").isin(week_starts)
+        daily_paths = daily_df.loc[in_range, "path"].tolist()
+
+    weekly_df = list_hive_partitioned_parquets(
+        bucket, f"{AGG_APP_HASH_BUCKETS_WEEKLY}/store={store}/"
+    )
+    if not weekly_df.empty:
+        stale_paths = weekly_df.loc[
+            weekly_df["week_start"].isin(week_starts), "path"
+        ].tolist()
+        if stale_paths:
+            delete_s3_objects_by_keys(
+                bucket=bucket, s3_paths=stale_paths, key_name=s3_config_key
+            )
+
+    if len(daily_paths) == 0:
+        logger.error(f"{log_info} no daily parquet files found")
+        return {}
+    logger.info(f"{log_info} daily files={len(daily_paths)}")
+
+    select_query = select_daily_to_weekly_hash_buckets(
+        store=store, daily_parquet_paths=daily_paths
+    )
+    with get_duckdb_connection(s3_config_key) as duckdb_con:
+        duckdb_con.execute(f"CREATE TEMP TABLE weekly_rows AS {select_query}")
+        expected_df = duckdb_con.execute("""
+            SELECT hash_bucket, strftime(week_start, '%Y-%m-%d') AS week_start,
+                COUNT(*) AS row_count
+            FROM weekly_rows
+            GROUP BY ALL
+            """).df()
+        stats_df = duckdb_con.execute(
+            copy_daily_to_weekly_hash_buckets(
+                store=store,
+                daily_parquet_paths=daily_paths,
+                return_stats=True,
+                source="weekly_rows",
+            )
+        ).df()
+    expected = {
+        (row.hash_bucket, row.week_start): int(row.row_count)
+        for row in expected_df.itertuples()
+    }
+    written: dict[tuple[str, str], int] = {}
+    for row in stats_df.itertuples():
+        key = (row.partition_keys["hash_bucket"], row.partition_keys["week_start"])
+        written[key] = written.get(key, 0) + int(row.count)
+    mismatched = {
+        key: (expected.get(key), written.get(key))
+        for key in expected.keys() | written.keys()
+        if expected.get(key) != written.get(key)
+    }
+    if mismatched:
+        raise ValueError(
+            f"{log_info} row counts differ (expected, written): {mismatched}"
+        )
+    logger.info(
+        f"{log_info} finished partitions={len(written)} rows={sum(written.values()):,}"
+    )
+    return written
+
+
 def make_s3_app_hash_metrics_history_daily(
     store: int, snapshot_date: pd.DatetimeIndex
 ) -> None:
@@ -647,7 +836,7 @@ def _build_interpolated_metrics_sql(metrics: list[str]) -> str:
     interpolated_lines = []
     for metric in metrics:
         interpolated_lines.append(
-            f"MIN_BY({metric}, observed_at) OVER w_future AS {metric}_y2,"
+            f"FIRST_VALUE({metric} IGNORE NULLS) OVER w_future AS {metric}_y2,"
         )
     return "\n" + "\n".join(interpolated_lines)
 
@@ -693,32 +882,19 @@ def _get_store_metrics_config(store: int) -> dict:
     }
 
 
-def write_app_hash_buckets_interpolated_to_s3(
+def select_app_hash_buckets_interpolated(
+    store: int,
+    weekly_parquet_paths: list[str],
     query_start_mon: datetime.date,
     delete_start_mon: datetime.date,
     end_date: datetime.date,
-    store: int,
-    hash_bucket: str,
-) -> None:
-    s3_config_key = "s3"
-    bucket = CONFIG[s3_config_key]["bucket"]
-    delete_s3_objects_by_date_range(
-        bucket=bucket,
-        start_date_mon=delete_start_mon,
-        end_date=end_date,
-        prefix=f"{AGG_APP_HASH_BUCKETS_FILLED}/store={store}/hash_bucket={hash_bucket}",
-        key_name=s3_config_key,
-    )
-    all_parquet_paths = []
-    for ddt in pd.date_range(query_start_mon, end_date, freq="W-MON"):
-        ddt_str = ddt.strftime("%Y-%m-%d")
-        prefix = f"{AGG_APP_HASH_BUCKETS_WEEKLY}/store={store}/hash_bucket={hash_bucket}/week_start={ddt_str}/"
-        all_parquet_paths += get_parquet_paths_by_prefix(bucket, prefix)
-    if len(all_parquet_paths) == 0:
-        logger.warning(
-            f"No parquet paths found for agg app hash buckets {store=} {query_start_mon=} {end_date=}"
-        )
-        return
+) -> str:
+    """One row per store_id, country and Monday, interpolated between crawls.
+
+    Each Monday takes the crawl observed that day, otherwise the metrics are
+    interpolated linearly between the last crawl before it and the crawl
+    after that. Mondays after an app's last crawl are dropped.
+    """
     config = _get_store_metrics_config(store)
     metrics = config["metrics"]
     interpolated_metrics = config["interpolated_metrics"]
@@ -726,7 +902,7 @@ def write_app_hash_buckets_interpolated_to_s3(
     query_start_mon_str = query_start_mon.strftime("%Y-%m-%d")
     delete_start_mon_str = delete_start_mon.strftime("%Y-%m-%d")
     end_date_str = end_date.strftime("%Y-%m-%d")
-    msv_query = f"""COPY (
+    query = f"""
     WITH 
         weekly_data AS (
             SELECT
@@ -737,7 +913,7 @@ def write_app_hash_buckets_interpolated_to_s3(
                 CAST(week_start + days_since_monday AS DATE) AS observed_at,
                 {",".join(metrics)},
                 store_last_updated
-            FROM read_parquet({all_parquet_paths}, union_by_name=true)
+            FROM read_parquet({weekly_parquet_paths}, union_by_name=true)
         ),
         target_mondays AS (
             SELECT CAST(range AS DATE) AS week_start
@@ -757,10 +933,11 @@ def write_app_hash_buckets_interpolated_to_s3(
                 {",".join(metrics)},
                 store_last_updated,
                {interpolated_metrics} 
-                MIN(observed_at) OVER w_future AS x2,
-                MAX_BY(store_last_updated, observed_at) OVER w_past_inclusive AS store_last_updated_carry
+                LEAD(observed_at) OVER w_next AS x2,
+                LAST_VALUE(store_last_updated IGNORE NULLS) OVER w_past_inclusive AS store_last_updated_carry
             FROM weekly_data
             WINDOW
+                w_next AS (PARTITION BY store_id, country ORDER BY observed_at),
                 w_future AS (PARTITION BY store_id, country
                              ORDER BY observed_at
                              ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING),
@@ -768,36 +945,74 @@ def write_app_hash_buckets_interpolated_to_s3(
                                      ORDER BY observed_at
                                      ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
         ),
+        targets AS (
+            SELECT dims.store_id, dims.country, m.week_start
+            FROM (SELECT DISTINCT store_id, country FROM weekly_data) dims
+            CROSS JOIN target_mondays m
+        ),
        interpolated AS (
         SELECT
-            dims.store_id,
-            left(md5(dims.store_id), 2) AS hash_bucket,
-            dims.country,
+            m.store_id,
+            left(md5(m.store_id), 2) AS hash_bucket,
+            m.country,
             m.week_start,
             {coalesce_metrics} 
             COALESCE(a_exact.store_last_updated, a_prev.store_last_updated_carry) AS store_last_updated
-        FROM (SELECT DISTINCT store_id, country FROM weekly_data) dims
-        CROSS JOIN target_mondays m
+        FROM targets m
         LEFT JOIN anchors a_exact
-                ON a_exact.store_id      = dims.store_id
-                AND a_exact.country       = dims.country
+                ON a_exact.store_id      = m.store_id
+                AND a_exact.country       = m.country
                 AND a_exact.observed_at = m.week_start
-        LEFT JOIN anchors a_prev
-                ON a_prev.store_id      = dims.store_id
-                AND a_prev.country       = dims.country
-                AND a_prev.observed_at = (
-                        SELECT MAX(observed_at)
-                        FROM weekly_data
-                        WHERE store_id      = dims.store_id
-                        AND country       = dims.country
-                        AND observed_at < m.week_start
-                    )
+        -- Last crawl strictly before the Monday, a sorted merge per
+        -- store_id and country instead of a MAX() lookup per target row
+        ASOF LEFT JOIN anchors a_prev
+                ON a_prev.store_id      = m.store_id
+                AND a_prev.country       = m.country
+                AND m.week_start > a_prev.observed_at
         WHERE a_exact.{metrics[0]} IS NOT NULL
             OR (a_prev.observed_at IS NOT NULL AND a_prev.x2 IS NOT NULL)
         )
         SELECT * FROM interpolated
         WHERE week_start >= DATE '{delete_start_mon_str}'
         ORDER BY store_id, country, week_start
+    """
+    return query
+
+
+def write_app_hash_buckets_interpolated_to_s3(
+    query_start_mon: datetime.date,
+    delete_start_mon: datetime.date,
+    end_date: datetime.date,
+    store: int,
+    hash_bucket: str,
+) -> None:
+    s3_config_key = "s3"
+    bucket = CONFIG[s3_config_key]["bucket"]
+    delete_s3_objects_by_date_range(
+        bucket=bucket,
+        start_date_mon=delete_start_mon,
+        end_date=end_date,
+        prefix=f"{AGG_APP_HASH_BUCKETS_FILLED}/store={store}/hash_bucket={hash_bucket}",
+        key_name=s3_config_key,
+    )
+    all_parquet_paths = []
+    for ddt in pd.date_range(query_start_mon, end_date, freq="W-MON"):
+        ddt_str = ddt.strftime("%Y-%m-%d")
+        prefix = f"{AGG_APP_HASH_BUCKETS_WEEKLY}/store={store}/hash_bucket={hash_bucket}/week_start={ddt_str}/"
+        all_parquet_paths += get_parquet_paths_by_prefix(bucket, prefix)
+    if len(all_parquet_paths) == 0:
+        logger.warning(
+            f"No parquet paths found for agg app hash buckets {store=} {query_start_mon=} {end_date=}"
+        )
+        return
+    select_query = select_app_hash_buckets_interpolated(
+        store=store,
+        weekly_parquet_paths=all_parquet_paths,
+        query_start_mon=query_start_mon,
+        delete_start_mon=delete_start_mon,
+        end_date=end_date,
+    )
+    msv_query = f"""COPY ({select_query}
     ) TO 's3://{bucket}/{AGG_APP_HASH_BUCKETS_FILLED}/store={store}/'
     (
         FORMAT PARQUET,
@@ -1175,6 +1390,83 @@ def copy_raw_details_to_hash_buckets(
 # ---------------------------------------------------------------------------
 
 
+WAU_MULT = 2.0
+MAU_MULT = 3.5
+# Apps per dense installs matrix in cohort_active_users
+COHORT_APP_CHUNK = 20_000
+
+
+def retention_kernel(d7: float, k: float, mult: float, n_weeks: int) -> np.ndarray:
+    """Share of a week's installs still active 0..n_weeks-1 weeks later.
+
+    1 in the install week, then d7 * mult * weeks**k capped at 1. Without a
+    retention benchmark (NaN d7 or k) only the install week counts.
+    """
+    weeks = np.arange(n_weeks, dtype=float)
+    weeks[0] = 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        kernel = np.minimum(d7 * mult * weeks**k, 1.0)
+    kernel = np.nan_to_num(kernel, nan=0.0)
+    kernel[0] = 1.0
+    return kernel
+
+
+def cohort_active_users(cohorts: pd.DataFrame) -> pd.DataFrame:
+    """WAU and MAU per row from each app's earlier weekly installs.
+
+    For every app and week t, sums installs_diff of each week h <= t times the
+    retention kernel at t - h weeks, a discrete convolution. Apps sharing
+    d7 and k are laid out as an apps x weeks matrix and multiplied by the
+    upper triangular Toeplitz matrix of the kernel, so memory stays
+    O(apps x weeks) instead of the O(weeks²) rows per app of a self merge.
+
+    Args:
+        cohorts: store_app, week_start, installs_diff, d7 and k columns, one
+            row per store_app and week_start.
+
+    Returns:
+        wau and mau columns on the index of cohorts.
+    """
+    # Rows are placed by app and week, a duplicate would silently overwrite
+    if cohorts.duplicated(subset=["store_app", "week_start"]).any():
+        raise ValueError("Duplicate store_app and week_start in cohorts")
+    week_idx = (
+        (cohorts["week_start"] - cohorts["week_start"].min()).dt.days // 7
+    ).to_numpy()
+    installs = cohorts["installs_diff"].to_numpy(dtype=float)
+    app_codes, _apps = pd.factorize(cohorts["store_app"])
+    app_params = (
+        pd.DataFrame({"app": app_codes, "d7": cohorts["d7"], "k": cohorts["k"]})
+        .groupby("app")[["d7", "k"]]
+        .first()
+    )
+    row_order = np.argsort(app_codes, kind="stable")
+    row_starts = np.searchsorted(app_codes[row_order], np.arange(len(app_params) + 1))
+    active = np.zeros((len(cohorts), 2))
+    for (d7, k), param_apps in app_params.groupby(["d7", "k"], dropna=False):
+        group_apps = param_apps.index.to_numpy()
+        for i in range(0, len(group_apps), COHORT_APP_CHUNK):
+            chunk_apps = group_apps[i : i + COHORT_APP_CHUNK]
+            rows = np.concatenate(
+                [row_order[row_starts[app] : row_starts[app + 1]] for app in chunk_apps]
+            )
+            local_app = np.repeat(
+                np.arange(len(chunk_apps)),
+                row_starts[chunk_apps + 1] - row_starts[chunk_apps],
+            )
+            first_week = week_idx[rows].min()
+            n_weeks = week_idx[rows].max() - first_week + 1
+            local_week = week_idx[rows] - first_week
+            dense = np.zeros((len(chunk_apps), n_weeks))
+            dense[local_app, local_week] = installs[rows]
+            lags = np.subtract.outer(np.arange(n_weeks), np.arange(n_weeks)).T
+            for col, mult in enumerate([WAU_MULT, MAU_MULT]):
+                kernel = retention_kernel(d7, k, mult, n_weeks)
+                toeplitz = np.where(lags >= 0, kernel[np.maximum(lags, 0)], 0.0)
+                active[rows, col] = (dense @ toeplitz)[local_app, local_week]
+    return pd.DataFrame(active, columns=["wau", "mau"], index=cohorts.index)
+
+
 def calculate_derived_metrics(
     pgdb: PostgresEngine, global_df: pd.DataFrame, store: int
 ) -> pd.DataFrame:
@@ -1222,50 +1514,7 @@ def calculate_derived_metrics(
         cohorts["d30"].replace(0, np.nan) / cohorts["d7"].replace(0, np.nan)
     ) / np.log(30.0 / 7.0)
     cohorts = cohorts[["store_app", "week_start", "installs_diff", "d1", "d7", "k"]]
-    logger.info("Historical merge, memory intensive step")
-    cohorts = cohorts.merge(
-        cohorts[["store_app", "week_start", "installs_diff"]],
-        on="store_app",
-        suffixes=("", "_historical"),
-    )
-    cohorts = cohorts[cohorts["week_start"] >= cohorts["week_start_historical"]]
-    cohorts["weeks_passed"] = (
-        (cohorts["week_start"] - cohorts["week_start_historical"]).dt.days / 7
-    ).astype(int)
-    wau_mult = 2.0
-    cohorts["retention_rate"] = np.where(
-        cohorts["weeks_passed"] == 0,
-        1.0,
-        (
-            cohorts["d7"]
-            * wau_mult
-            * (cohorts["weeks_passed"].replace(0, 1) ** cohorts["k"])
-        ).clip(upper=1.0),
-    )
-    cohorts["surviving_users"] = (
-        cohorts["installs_diff_historical"] * cohorts["retention_rate"]
-    )
-    mau_mult = 3.5
-    cohorts["retention_rate_mau"] = np.where(
-        cohorts["weeks_passed"] == 0,
-        1.0,
-        (
-            cohorts["d7"]
-            * mau_mult
-            * (cohorts["weeks_passed"].replace(0, 1) ** cohorts["k"])
-        ).clip(upper=1.0),
-    )
-    cohorts["surviving_mau"] = (
-        cohorts["installs_diff_historical"] * cohorts["retention_rate_mau"]
-    )
-    cohorts = (
-        cohorts.groupby(["store_app", "week_start"])[
-            ["surviving_users", "surviving_mau"]
-        ]
-        .sum()
-        .reset_index()
-    )
-    cohorts = cohorts.rename(columns={"surviving_users": "wau", "surviving_mau": "mau"})
+    active_users = cohort_active_users(cohorts)
     dfcols = [
         "store_app",
         "in_app_purchases",
@@ -1274,13 +1523,9 @@ def calculate_derived_metrics(
         "installs_diff",
         "weekly_ratings",
     ] + metrics
-    global_df = pd.merge(
-        global_df[dfcols],
-        cohorts,
-        on=["store_app", "week_start"],
-        how="left",
-        validate="1:1",
-    )
+    global_df = global_df[dfcols].reset_index(drop=True)
+    # cohorts is a m:1 left merge of global_df, so its rows line up with these
+    global_df[["wau", "mau"]] = active_users.to_numpy()
     rename_map = {
         "installs_diff": "weekly_installs",
         "wau": "weekly_active_users",
@@ -0,0 +1,214 @@
+"""Parallel, resumable runner for per hash-bucket pipeline stages.
+
+Aggregates under ``agg-data/app-hash-*`` are partitioned by the first two hex
+characters of ``md5(store_id)``, so the 256 buckets are independent units of
+work. ``run_hash_buckets`` runs each bucket's stages in order on a pool of
+worker processes, records every finished ``(bucket, stage)`` in a JSON
+checkpoint, and retries a failed bucket from the stage that failed. A run that
+dies part way can be started again with the same checkpoint and only the
+unfinished work is redone.
+"""
+
+import json
+import os
+import pathlib
+import time
+import traceback
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, TypedDict
+
+from adscrawler.config import TMP_DIR, get_logger
+from adscrawler.process.storage import configure_duckdb
+
+logger = get_logger(__name__)
+
+HASH_BUCKETS = [f"{i:02x}" for i in range(256)]
+
+CHECKPOINT_DIR = pathlib.Path(TMP_DIR, "checkpoints")
+
+# Share of a worker's memory budget given to DuckDB, the rest is headroom for
+# the pandas frames built from its results
+DUCKDB_MEMORY_SHARE = 0.6
+
+
+class BucketResult(TypedDict):
+    hash_bucket: str
+    done_stages: list[str]
+    error: str | None
+    seconds: float
+
+
+class BucketCheckpoint:
+    """Finished (hash_bucket, stage) pairs of one run, persisted as JSON."""
+
+    def __init__(self, path: pathlib.Path, resume: bool = True) -> None:
+        self.path = path
+        self.done: dict[str, list[str]] = {}
+        if resume and path.exists():
+            self.done = json.loads(path.read_text())
+            logger.info(f"checkpoint {path} resuming {len(self.done)} buckets")
+
+    def remaining_stages(self, hash_bucket: str, stages: list[str]) -> list[str]:
+        done = self.done.get(hash_bucket, [])
+        return [stage for stage in stages if stage not in done]
+
+    def mark_done(self, hash_bucket: str, stages: list[str]) -> None:
+        if not stages:
+            return
+        done = self.done.setdefault(hash_bucket, [])
+        done.extend(stage for stage in stages if stage not in done)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.done))
+        os.replace(tmp_path, self.path)
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def _run_bucket(
+    task: Callable[..., None],
+    hash_bucket: str,
+    stages: list[str],
+    task_kwargs: dict[str, Any],
+) -> BucketResult:
+    """Run the stages of one bucket in order, stopping at the first failure."""
+    start = time.perf_counter()
+    done_stages: list[str] = []
+    error = None
+    for stage in stages:
+        try:
+            task(hash_bucket=hash_bucket, stage=stage, **task_kwargs)
+        except Exception:
+            error = traceback.format_exc()
+            break
+        done_stages.append(stage)
+    return {
+        "hash_bucket": hash_bucket,
+        "done_stages": done_stages,
+        "error": error,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def _init_worker(threads: int, memory_limit: str | None) -> None:
+    configure_duckdb(threads=threads, memory_limit=memory_limit)
+
+
+def workers_for_memory(workers: int, memory_budget_gb: float | None) -> int:
+    """Cap workers so that workers * memory_budget_gb fits in physical RAM."""
+    if not memory_budget_gb:
+        return workers
+    try:
+        total_gb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024**3
+    except (AttributeError, ValueError, OSError):
+        return workers
+    fits = max(1, int(total_gb // memory_budget_gb))
+    if fits < workers:
+        logger.warning(
+            f"{workers=} x {memory_budget_gb=} exceeds {total_gb:.0f}GB RAM, using {fits}"
+        )
+    return min(workers, fits)
+
+
+def run_hash_buckets(
+    task: Callable[..., None],
+    stages: list[str],
+    checkpoint: BucketCheckpoint,
+    task_kwargs: dict[str, Any],
+    workers: int = 1,
+    memory_budget_gb: float | None = None,
+    max_retries: int = 2,
+    hash_buckets: list[str] | None = None,
+) -> dict[str, str]:
+    """Run task(hash_bucket=, stage=, **task_kwargs) for every bucket and stage.
+
+    Args:
+        task: Picklable module level function doing one stage of one bucket
+        stages: Stage names, run in this order for each bucket
+        checkpoint: Records finished stages, already finished ones are skipped
+        task_kwargs: Extra keyword arguments passed to task
+        workers: Worker processes, 1 runs every bucket in this process
+        memory_budget_gb: Memory per worker, sets the DuckDB memory_limit and
+            caps workers to what fits in RAM
+        max_retries: Times a failed bucket is retried from its failed stage
+        hash_buckets: Buckets to run, defaults to all 256
+
+    Returns:
+        Error message per bucket that still failed after all retries.
+    """
+    hash_buckets = hash_buckets or HASH_BUCKETS
+    workers = workers_for_memory(workers, memory_budget_gb)
+    pending = [b for b in hash_buckets if checkpoint.remaining_stages(b, stages)]
+    log_info = f"run_hash_buckets {task.__name__} {workers=}"
+    logger.info(f"{log_info} start buckets={len(pending)}/{len(hash_buckets)}")
+    attempts = dict.fromkeys(pending, 0)
+    failed: dict[str, str] = {}
+
+    def record(result: BucketResult) -> bool:
+        """Store the result, returning True when the bucket needs a retry."""
+        hash_bucket = result["hash_bucket"]
+        checkpoint.mark_done(hash_bucket, result["done_stages"])
+        if result["error"] is None:
+            logger.info(
+                f"{log_info} {hash_bucket=} finished in {result['seconds']:.1f}s"
+            )
+            return False
+        attempts[hash_bucket] += 1
+        if attempts[hash_bucket] <= max_retries:
+            logger.warning(
+                f"{log_info} {hash_bucket=} failed, retry {attempts[hash_bucket]}/{max_retries}: {result['error']}"
+            )
+            return True
+        logger.error(f"{log_info} {hash_bucket=} gave up: {result['error']}")
+        failed[hash_bucket] = result["error"]
+        return False
+
+    if workers <= 1:
+        for hash_bucket in pending:
+            needs_retry = True
+            while needs_retry:
+                remaining = checkpoint.remaining_stages(hash_bucket, stages)
+                result = _run_bucket(task, hash_bucket, remaining, task_kwargs)
+                needs_retry = record(result)
+    else:
+        threads = max(1, (os.cpu_count() or workers) // workers)
+        memory_limit = None
+        if memory_budget_gb:
+            memory_limit = f"{memory_budget_gb * DUCKDB_MEMORY_SHARE:.1f}GB"
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(threads, memory_limit),
+        ) as executor:
+
+            def submit(hash_bucket: str) -> Future:
+                remaining = checkpoint.remaining_stages(hash_bucket, stages)
+                return executor.submit(
+                    _run_bucket, task, hash_bucket, remaining, task_kwargs
+                )
+
+            futures = {submit(b): b for b in pending}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    hash_bucket = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception:
+                        # ie the worker process died, nothing is known to be done
+                        result = {
+                            "hash_bucket": hash_bucket,
+                            "done_stages": [],
+                            "error": traceback.format_exc(),
+                            "seconds": 0.0,
+                        }
+                    if record(result):
+                        futures[submit(hash_bucket)] = hash_bucket
+    if not failed:
+        checkpoint.remove()
+    logger.info(
+        f"{log_info} finished buckets={len(pending) - len(failed)} failed={len(failed)}"
+    )
+    return failed
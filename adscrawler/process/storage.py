@@ -1,11 +1,15 @@
 import datetime
 import io
+import json
 import os
 import pathlib
 import shutil
 import subprocess
+import threading
 import time
-from collections.abc import Iterable
+import uuid
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 import duckdb
@@ -653,8 +657,10 @@ def get_s3_dirs_by_prefix(bucket: str, prefix: str) -> list[str]:
     return all_dirs
 
 
-def get_parquet_paths_by_prefix(bucket: str, prefix: str) -> list[str]:
-
+def get_parquet_paths_by_prefix(
+    bucket: str, prefix: str, start_after: str | None = None
+) -> list[str]:
+    """Parquet files under prefix, only keys sorting after start_after if given."""
     s3 = get_s3_client()
     continuation_token = None
     all_parquet_paths = []
@@ -664,6 +670,8 @@ def get_parquet_paths_by_prefix(bucket: str, prefix: str) -> list[str]:
             "Prefix": prefix,
             "MaxKeys": 1000,
         }
+        if start_after:
+            params["StartAfter"] = start_after
         if continuation_token:
             params["ContinuationToken"] = continuation_token
         response = s3.list_objects_v2(**params)
@@ -682,6 +690,194 @@ def get_parquet_paths_by_prefix(bucket: str, prefix: str) -> list[str]:
     return all_parquet_paths
 
 
+def list_hive_partitioned_parquets(bucket: str, prefix: str) -> pd.DataFrame:
+    """List parquet files under prefix once, one column per key=value path part.
+
+    ie ``.../hash_bucket=0a/snapshot_date=2026-01-01/data_0.parquet`` gives
+    path, hash_bucket and snapshot_date columns, all strings.
+    """
+    paths = get_parquet_paths_by_prefix(bucket, prefix)
+    rows = [
+        {
+            "path": path,
+            **dict(part.split("=", 1) for part in path.split("/")[:-1] if "=" in part),
+        }
+        for path in paths
+    ]
+    return pd.DataFrame(rows, columns=None if rows else ["path"])
+
+
+S3_MANIFEST_NAME = "_manifest.json"
+
+# Objects above this size are copied server side in parts of the same size
+_COPY_TRANSFER_CONFIG = boto3.s3.transfer.TransferConfig(
+    multipart_threshold=64 * 1024 * 1024,
+    multipart_chunksize=64 * 1024 * 1024,
+    max_concurrency=4,
+)
+
+
+def _list_s3_keys(s3: boto3.client, bucket: str, prefix: str) -> list[str]:
+    paginator = s3.get_paginator("list_objects_v2")
+    return [
+        obj["Key"]
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+        for obj in page.get("Contents", [])
+    ]
+
+
+def read_s3_manifest(bucket: str, prefix: str, key_name: str = "s3") -> dict | None:
+    """Return the manifest published under ``prefix``, None if there is none."""
+    s3 = get_s3_client(key_name)
+    key = f"{prefix.rstrip('/')}/{S3_MANIFEST_NAME}"
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return None
+        raise
+    return json.loads(response["Body"].read())
+
+
+def _write_s3_manifest(
+    bucket: str,
+    prefix: str,
+    files: list[str],
+    previous_files: list[str],
+    key_name: str,
+) -> None:
+    """Replace the manifest of ``prefix``, a single PUT that readers see whole."""
+    manifest = {
+        "published_at": datetime.datetime.now(datetime.UTC).isoformat(),
+        "files": files,
+        "previous_files": previous_files,
+    }
+    get_s3_client(key_name).put_object(
+        Bucket=bucket,
+        Key=f"{prefix.rstrip('/')}/{S3_MANIFEST_NAME}",
+        Body=json.dumps(manifest).encode(),
+        ContentType="application/json",
+    )
+
+
+def get_published_parquet_paths(
+    bucket: str, prefix: str, key_name: str = "s3"
+) -> list[str]:
+    """Return the ``s3://`` parquet paths currently published under ``prefix``.
+
+    Readers resolve the manifest once and read exactly those files, so a
+    ``publish_s3_prefix`` running at the same time never shows them a half
+    copied prefix. Prefixes without a manifest yet are listed instead.
+    """
+    manifest = read_s3_manifest(bucket, prefix, key_name)
+    if manifest is None:
+        return get_parquet_paths_by_prefix(bucket, f"{prefix.rstrip('/')}/")
+    return manifest["files"]
+
+
+def _delete_unpublished_s3_keys(
+    bucket: str, prefix: str, keep_paths: set[str], key_name: str
+) -> None:
+    """Delete objects under ``prefix`` that are not in ``keep_paths``."""
+    s3 = get_s3_client(key_name)
+    manifest_key = f"{prefix.rstrip('/')}/{S3_MANIFEST_NAME}"
+    stale_paths = [
+        f"s3://{bucket}/{key}"
+        for key in _list_s3_keys(s3, bucket, f"{prefix.rstrip('/')}/")
+        if key != manifest_key and f"s3://{bucket}/{key}" not in keep_paths
+    ]
+    if stale_paths:
+        logger.info(f"Deleting {len(stale_paths)} superseded objects under {prefix}")
+        delete_s3_objects_by_keys(bucket, stale_paths, key_name)
+
+
+def publish_s3_prefix(
+    bucket: str,
+    src_prefix: str,
+    dst_prefix: str,
+    max_workers: int = 16,
+    key_name: str = "s3",
+) -> list[str]:
+    """Publish the parquet files under ``src_prefix`` as the contents of ``dst_prefix``.
+
+    1. Copy src concurrently, server side, into a new ``gen_<epoch_ms>_<id>/``
+       directory under dst. Large files are copied in parts.
+    2. Replace the manifest of dst with the new files. This single PUT is the
+       commit, readers of ``get_published_parquet_paths`` switch over at once.
+    3. Delete files that neither the new nor the previous manifest lists, the
+       previous files are kept for readers that resolved it just before.
+    4. Delete src.
+
+    A failed copy leaves the published files untouched. Returns the new paths.
+    """
+    s3 = get_s3_client(key_name)
+    src_prefix = src_prefix.rstrip("/") + "/"
+    dst_prefix = dst_prefix.rstrip("/") + "/"
+
+    src_keys = [
+        key for key in _list_s3_keys(s3, bucket, src_prefix) if key.endswith(".parquet")
+    ]
+    if not src_keys:
+        logger.error(f"No files to publish under {src_prefix}")
+        return []
+
+    generation = f"gen_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
+    dst_keys = [
+        f"{dst_prefix}{generation}/{key[len(src_prefix) :]}" for key in src_keys
+    ]
+
+    def copy(src_key: str, dst_key: str) -> None:
+        s3.copy(
+            CopySource={"Bucket": bucket, "Key": src_key},
+            Bucket=bucket,
+            Key=dst_key,
+            Config=_COPY_TRANSFER_CONFIG,
+        )
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(copy, src_keys, dst_keys))
+    logger.info(
+        f"Copied {len(src_keys)} files to {dst_prefix}{generation}/ "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+    files = [f"s3://{bucket}/{key}" for key in dst_keys]
+    previous_files = get_published_parquet_paths(bucket, dst_prefix, key_name)
+    _write_s3_manifest(bucket, dst_prefix, files, previous_files, key_name)
+    _delete_unpublished_s3_keys(
+        bucket, dst_prefix, set(files) | set(previous_files), key_name
+    )
+    delete_s3_objects_by_prefix(bucket, src_prefix, key_name)
+    return files
+
+
+def update_s3_manifest(
+    bucket: str,
+    prefix: str,
+    add_paths: list[str] | None = None,
+    remove_under: str | None = None,
+    key_name: str = "s3",
+) -> list[str]:
+    """Add already written files to, or drop them from, the manifest of ``prefix``.
+
+    ``remove_under`` drops every published path under that prefix, eg files
+    an earlier incremental update added. Returns the published paths.
+    """
+    manifest = read_s3_manifest(bucket, prefix, key_name)
+    if manifest is None:
+        files = get_parquet_paths_by_prefix(bucket, f"{prefix.rstrip('/')}/")
+        previous_files = []
+    else:
+        files, previous_files = manifest["files"], manifest["previous_files"]
+    if remove_under is not None:
+        removed = f"s3://{bucket}/{remove_under.rstrip('/')}/"
+        files = [path for path in files if not path.startswith(removed)]
+    files = files + [path for path in add_paths or [] if path not in files]
+    _write_s3_manifest(bucket, prefix, files, previous_files, key_name)
+    return files
+
+
 def get_s3_objects_metadata(
     bucket: str, s3_paths: list[str], key_name: str = "s3"
 ) -> dict[str, dict]:
@@ -896,33 +1092,109 @@ def creative_exists_in_s3(md5_hash: str, extension: str) -> bool:
         raise
 
 
-def get_duckdb_connection(s3_config_key: str) -> duckdb.DuckDBPyConnection:
-    s3_region = CONFIG[s3_config_key]["region_name"]
-    # DuckDB uses S3 endpoint url
+# Per process DuckDB resources, lowered by parallel jobs so workers fit in RAM
+DUCKDB_SETTINGS = {"threads": 4, "memory_limit": "9GB"}
+
+_DUCKDB_LOCK = threading.Lock()
+# This process's DuckDB database and the s3 config keys with a secret in it
+_DUCKDB: dict = {"database": None, "secrets": set()}
+
+
+def _sql_str(value: object) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _apply_duckdb_settings(con: duckdb.DuckDBPyConnection) -> None:
+    con.execute(f"SET GLOBAL threads = {int(DUCKDB_SETTINGS['threads'])};")
+    con.execute(
+        f"SET GLOBAL memory_limit = {_sql_str(DUCKDB_SETTINGS['memory_limit'])};"
+    )
+
+
+def configure_duckdb(
+    threads: int | None = None, memory_limit: str | None = None
+) -> None:
+    """Set threads / memory_limit for this process's DuckDB database.
+
+    Applies to the already open database too, so a job can resize DuckDB
+    before it starts. The settings are shared by every cursor in the process.
+    """
+    if threads is not None:
+        DUCKDB_SETTINGS["threads"] = threads
+    if memory_limit is not None:
+        DUCKDB_SETTINGS["memory_limit"] = memory_limit
+    with _DUCKDB_LOCK:
+        if _DUCKDB["database"] is not None:
+            _apply_duckdb_settings(_DUCKDB["database"])
+
+
+def _create_duckdb_secret(con: duckdb.DuckDBPyConnection, s3_config_key: str) -> None:
+    """Add an S3 secret for s3_config_key, scoped to its bucket."""
+    s3_config = CONFIG[s3_config_key]
+    # DuckDB uses S3 endpoint url, the tunnel is shared with boto3 clients
     endpoint = get_s3_endpoint(s3_config_key)
-    duckdb_con = duckdb.connect()
-    if "http://" in endpoint:
-        duckdb_con.execute("SET s3_use_ssl=false;")
-        endpoint = endpoint.replace("http://", "")
-    elif "https://" in endpoint:
-        endpoint = endpoint.replace("https://", "")
-    duckdb_con.execute("INSTALL httpfs; LOAD httpfs;")
-    duckdb_con.execute(f"SET s3_region='{s3_region}';")
-    duckdb_con.execute(f"SET s3_endpoint='{endpoint}';")
-    duckdb_con.execute("SET s3_url_style='path';")
+    use_ssl = not endpoint.startswith("http://")
+    endpoint = endpoint.replace("http://", "").replace("https://", "")
+    options = [
+        "TYPE s3",
+        f"KEY_ID {_sql_str(s3_config['access_key_id'])}",
+        f"SECRET {_sql_str(s3_config['secret_key'])}",
+        f"REGION {_sql_str(s3_config['region_name'])}",
+        f"ENDPOINT {_sql_str(endpoint)}",
+        "URL_STYLE 'path'",
+        f"USE_SSL {str(use_ssl).lower()}",
+    ]
+    if s3_config.get("bucket"):
+        options.append(f"SCOPE {_sql_str('s3://' + s3_config['bucket'])}")
+    con.execute(f"CREATE OR REPLACE SECRET {s3_config_key} ({', '.join(options)});")
+
+
+def _create_duckdb_database() -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect()
+    con.execute("INSTALL httpfs; LOAD httpfs;")
     # S3 curl compatibility mode controls the glob expansions
-    duckdb_con.execute("SET s3_url_compatibility_mode=false;")
-    duckdb_con.execute("SET threads = 4;")
-    duckdb_con.execute("SET memory_limit='9GB'")
-    duckdb_con.execute(
-        f"SET s3_access_key_id='{CONFIG[s3_config_key]['access_key_id']}';"
-    )
-    duckdb_con.execute(
-        f"SET s3_secret_access_key='{CONFIG[s3_config_key]['secret_key']}';"
-    )
-    duckdb_con.execute(f"SET temp_directory = '{TMP_DIR}';")
-    duckdb_con.execute("SET preserve_insertion_order = false;")
-    return duckdb_con
+    con.execute("SET GLOBAL s3_url_compatibility_mode = false;")
+    con.execute(f"SET GLOBAL temp_directory = {_sql_str(TMP_DIR)};")
+    con.execute("SET GLOBAL preserve_insertion_order = false;")
+    _apply_duckdb_settings(con)
+    return con
+
+
+def get_duckdb_connection(s3_config_key: str) -> duckdb.DuckDBPyConnection:
+    """Return a new cursor on this process's configured DuckDB database.
+
+    The database, its httpfs extension, settings and S3 secret (and any SSH
+    tunnel to S3) are set up once per process and reused. Each call returns
+    its own cursor, so threads can run queries in parallel by taking one
+    cursor per task. Closing the cursor, ie leaving a ``with`` block, leaves
+    the database open for the next caller.
+    """
+    with _DUCKDB_LOCK:
+        if _DUCKDB["database"] is None:
+            _DUCKDB["database"] = _create_duckdb_database()
+            _DUCKDB["secrets"] = set()
+        database = _DUCKDB["database"]
+        if s3_config_key not in _DUCKDB["secrets"]:
+            _create_duckdb_secret(database, s3_config_key)
+            _DUCKDB["secrets"].add(s3_config_key)
+        return database.cursor()
+
+
+def _reset_duckdb_after_fork() -> None:
+    """Forget the parent's DuckDB database, its threads do not survive fork.
+
+    The inherited object is kept referenced so it is never closed in the child.
+    """
+    global _DUCKDB_LOCK  # noqa: PLW0603
+    # Another thread of the parent may have held the lock at fork time
+    _DUCKDB_LOCK = threading.Lock()
+    _DUCKDB_FORKED.append(_DUCKDB["database"])
+    _DUCKDB["database"] = None
+    _DUCKDB["secrets"] = set()
+
+
+_DUCKDB_FORKED: list = []
+os.register_at_fork(after_in_child=_reset_duckdb_after_fork)
 
 
 def pg_db_uri():
@@ -935,35 +1207,35 @@ def pg_db_uri():
     return f"dbname={database} host={host} user={user} password={password}"
 
 
-def stream_duckdb_tsv(query: str) -> Iterable[str]:
-    """Executes a DuckDB query and streams TSV string chunks for Postgres COPY."""
+def stream_duckdb_csv(query: str, batch_size: int = 100_000) -> Iterator[bytes]:
+    """Stream a DuckDB query as CSV chunks for Postgres ``COPY ... (FORMAT csv)``.
+
+    Arrow batches go through pyarrow's CSV writer with every string quoted, so
+    an unquoted empty field is NULL and ``""`` stays an empty string, which is
+    how Postgres reads CSV by default. The COPY pulls chunks from this
+    generator, so DuckDB only makes the next batch once the COPY took the last.
+    """
     import pyarrow.csv as pa_csv
 
+    write_options = pa_csv.WriteOptions(include_header=False, quoting_style="needed")
+    rows = 0
+    size = 0
+    start = time.perf_counter()
     with get_duckdb_connection("s3") as duckdb_con:
         relation = duckdb_con.sql(query)
-        record_batch_reader = relation.fetch_arrow_reader(batch_size=100_000)
-
-        write_options = pa_csv.WriteOptions(
-            include_header=False,
-            delimiter="\t",
-        )
-
+        record_batch_reader = relation.fetch_arrow_reader(batch_size=batch_size)
         for batch in record_batch_reader:
             out_stream = io.BytesIO()
             pa_csv.write_csv(batch, out_stream, write_options=write_options)
-
-            chunk_str = out_stream.getvalue().decode("utf-8")
-
-            lines = chunk_str.split("\n")
-            fixed_lines = []
-            for line in lines:
-                if not line:
-                    continue
-                fields = line.split("\t")
-                fields = [f if f != "" else "\\N" for f in fields]
-                fixed_lines.append("\t".join(fields))
-            chunk_str = "\n".join(fixed_lines) + ("\n" if fixed_lines else "")
-            yield chunk_str
+            chunk = out_stream.getvalue()
+            rows += batch.num_rows
+            size += len(chunk)
+            yield chunk
+    seconds = time.perf_counter() - start
+    logger.info(
+        f"stream_duckdb_csv {rows=:,} {size / 1024**2:,.0f}MB in {seconds:.1f}s "
+        f"{rows / max(seconds, 1e-9):,.0f} rows/s"
+    )
 
 
 S3_CLIENTS: dict = {}
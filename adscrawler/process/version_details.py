@@ -1,11 +1,15 @@
 """Process version details to matched store_app + sdk_id"""
 
 import datetime
+import hashlib
 import io
+import json
+import re
 import time
 import uuid
 
 import pandas as pd
+from botocore.exceptions import ClientError
 
 from adscrawler.config import CONFIG, get_logger
 from adscrawler.dbcon.atomic_swap import atomic_swap_partition_stream
@@ -22,6 +26,7 @@ from adscrawler.process import (
     RAW_DATA_VERSION_DETAILS,
     RAW_DATA_VERSION_DETAILS_INCOMING,
     RAW_DATA_VERSION_DETAILS_INITIAL,
+    STATE_VERSION_DETAILS,
     TMP_MATCHED_SDK_STRINGS,
     TMP_MATCHED_SDK_STRINGS_LATEST,
     TMP_PATTERN_MATCHES,
@@ -32,9 +37,13 @@ from adscrawler.process.storage import (
     delete_s3_objects_by_prefix,
     get_duckdb_connection,
     get_parquet_paths_by_prefix,
+    get_published_parquet_paths,
     get_s3_client,
+    get_s3_dirs_by_prefix,
     pg_db_uri,
-    stream_duckdb_tsv,
+    publish_s3_prefix,
+    stream_duckdb_csv,
+    update_s3_manifest,
 )
 
 logger = get_logger(__name__, "version_details")
@@ -43,6 +52,18 @@ logger = get_logger(__name__, "version_details")
 _ROW_GROUP_SIZE = 100_000
 _LARGE_ROW_GROUP_SIZE = 1_000_000
 
+# Incremental runs merge delta files into agg-data, a full rebuild after this
+# many runs compacts them again
+_MAX_INCREMENTAL_RUNS = 30
+
+_RAW_COMPACTED_FILE = re.compile(r"/compacted_(\d+)_\d+\.parquet$")
+# Compaction only writes the last days before it runs (see main.py), so
+# raw files newer than the watermark are in date partitions at most this
+# many days older than it. A full rebuild reads all of them regardless.
+_RAW_LATE_DAYS = 7
+# Newer raw files may belong to a compaction that is still writing
+_RAW_SETTLE_MS = 60 * 60 * 1000
+
 # Groups every 5 Mio string_id values into labels like ``000M-005M``, ``005M-100M``, etc.
 # Manual boundaries reflecting real density: narrow near the dense low end,
 # progressively wider as ids get sparse. Adjust freely.
@@ -161,8 +182,11 @@ def write_version_details_to_s3(
     )
 
 
-def build_aggregated_version_details() -> None:
-    """Rebuild the deduplicated, globally sorted master query files in agg-data."""
+def build_aggregated_version_details() -> bool:
+    """Rebuild the deduplicated, globally sorted master query files in agg-data.
+
+    Returns True if the rebuilt files were published.
+    """
     bucket = CONFIG["s3"]["bucket"]
 
     # Wipe any stale remnants from a prior failed run before writing new data.
@@ -173,7 +197,7 @@ def build_aggregated_version_details() -> None:
     raw_paths = get_parquet_paths_by_prefix(bucket, f"{RAW_DATA_VERSION_DETAILS}/")
     if not raw_paths:
         logger.warning("No parquet files found under raw-data; nothing to aggregate.")
-        return
+        return False
 
     raw_vd_glob = f"s3://{bucket}/{RAW_DATA_VERSION_DETAILS}/*/*/*.parquet"
 
@@ -204,11 +228,11 @@ def build_aggregated_version_details() -> None:
     # Validation: refuse to publish an empty or trivially-small dataset.
     if row_count == 0:
         logger.error("Refusing to publish: aggregated master dataset is empty.")
-        return
+        return False
     # Compare against existing agg-data row count if available.
     try:
         with get_duckdb_connection("s3") as duckdb_con:
-            agg_parqs = get_parquet_paths_by_prefix(bucket, AGG_VERSION_DETAILS)
+            agg_parqs = get_published_parquet_paths(bucket, AGG_VERSION_DETAILS)
             existing_count = duckdb_con.execute(f"""
                 SELECT count(*)
                 FROM read_parquet({agg_parqs})
@@ -218,71 +242,23 @@ def build_aggregated_version_details() -> None:
                 f"New dataset ({row_count:,} rows) is <50%% of existing "
                 f"({existing_count:,} rows) — likely incomplete, refusing publish."
             )
-            return
+            return False
     except Exception:
         logger.info("No existing agg-data to compare against; proceeding.")
 
-    # Swap tmp directory to final query location
-    replace_s3_prefix(
+    # Publish tmp files as the new contents of the final query location
+    publish_s3_prefix(
         bucket, src_prefix=TMP_VERSION_DETAILS, dst_prefix=AGG_VERSION_DETAILS
     )
     logger.info("Master aggregation successfully updated in agg-data.")
+    return True
 
 
-def replace_s3_prefix(bucket: str, src_prefix: str, dst_prefix: str) -> None:
-    """Safely replace dst_prefix with contents of src_prefix using boto3.
+def _pattern_matches_sql(after_string_id: int | None = None) -> str:
+    """SELECT of ``(string_bucket, string_id, sdk_id)`` pattern matches.
 
-    Order of operations for atomic-like swap safety:
-    1. Copy src -> dst (creates/overwrites all incoming files).
-    2. Identify and delete any stale keys in dst that were NOT part of the new copy.
-    3. Delete src prefix.
+    Matches every version string, or only those with ``id > after_string_id``.
     """
-    s3 = get_s3_client()
-
-    src_prefix = src_prefix.rstrip("/") + "/"
-    dst_prefix = dst_prefix.rstrip("/") + "/"
-
-    # Step 1: Copy src -> dst & track all newly written dst keys
-    new_dst_keys: set[str] = set()
-
-    src = f"s3://{bucket}/{src_prefix}"
-    src_len = len(src)
-
-    src_keys = get_parquet_paths_by_prefix(bucket, src_prefix)
-
-    if len(src_keys) == 0:
-        logger.error("no tmp files found!")
-        return
-
-    for src_key in src_keys:
-        relative_path = src_key[src_len:]
-        src_key = src_key.replace("s3://", "")
-        dst_key = dst_prefix + relative_path
-        # Track destination key so we don't accidently delete it in Step 2
-        new_dst_keys.add(f"s3://{bucket}/{dst_key}")
-        # encoded_src_key = urllib.parse.quote(src_key)
-        s3.copy_object(
-            Bucket=bucket,
-            CopySource=src_key,
-            Key=dst_key,
-        )
-
-    # Step 2: Delete stale leftovers in dst (keys not in new_dst_keys)
-    stale_keys = [
-        {"Key": k}
-        for k in get_parquet_paths_by_prefix(bucket, dst_prefix)
-        if k not in new_dst_keys
-    ]
-    for i in range(0, len(stale_keys), 1000):
-        s3.delete_objects(Bucket=bucket, Delete={"Objects": stale_keys[i : i + 1000]})
-
-    # Step 3: Delete all src keys now that both copy and dst cleanup are verified
-    delete_s3_objects_by_prefix(bucket, src_prefix)
-
-
-def build_aggregated_pattern_matches() -> None:
-    """Run pattern matching over lookups and save bucketed results to S3."""
-
     bucket = CONFIG["s3"]["bucket"]
 
     strings_path = f"s3://{bucket}/{LOOKUP_VERSION_STRINGS}"
@@ -290,23 +266,19 @@ def build_aggregated_pattern_matches() -> None:
     paths_path = f"s3://{bucket}/{LOOKUP_SDK_PATH_PATTERNS}"
     med_path = f"s3://{bucket}/{LOOKUP_SDK_MEDIATION_PATTERNS}"
 
-    agg_tmp_output = f"s3://{bucket}/{TMP_PATTERN_MATCHES}/"
-
-    logger.info("Starting aggregated pattern matching build...")
+    new_strings_filter = ""
+    if after_string_id is not None:
+        new_strings_filter = f"AND id > {after_string_id}"
 
-    # Wipe any stale remnants from a prior failed run before writing new data.
-    delete_s3_objects_by_prefix(bucket, f"{TMP_PATTERN_MATCHES}/")
-
-    with get_duckdb_connection("s3") as duckdb_con:
-        duckdb_con.execute(f"""
-            COPY (
+    return f"""
                 WITH strings AS ( 
                     SELECT 
                         id AS string_id, 
                         lower(value_name) AS val, 
                         lower(xml_path) AS path 
                     FROM read_parquet('{strings_path}')
-                    WHERE value_name IS NOT NULL OR xml_path IS NOT NULL
+                    WHERE (value_name IS NOT NULL OR xml_path IS NOT NULL)
+                    {new_strings_filter}
                 ),
                 raw_matches AS (
                     -- 1. Package patterns
@@ -352,6 +324,27 @@ def build_aggregated_pattern_matches() -> None:
                     sdk_id
                 FROM deduped
                 ORDER BY string_id ASC, sdk_id ASC
+    """
+
+
+def build_aggregated_pattern_matches() -> bool:
+    """Run pattern matching over lookups and save bucketed results to S3.
+
+    Returns True if the rebuilt files were published.
+    """
+
+    bucket = CONFIG["s3"]["bucket"]
+
+    agg_tmp_output = f"s3://{bucket}/{TMP_PATTERN_MATCHES}/"
+
+    logger.info("Starting aggregated pattern matching build...")
+
+    # Wipe any stale remnants from a prior failed run before writing new data.
+    delete_s3_objects_by_prefix(bucket, f"{TMP_PATTERN_MATCHES}/")
+
+    with get_duckdb_connection("s3") as duckdb_con:
+        duckdb_con.execute(f"""
+            COPY ({_pattern_matches_sql()}
             ) TO '{agg_tmp_output}' (
                 FORMAT PARQUET,
                 PARTITION_BY (string_bucket),
@@ -375,41 +368,51 @@ def build_aggregated_pattern_matches() -> None:
     # Validation: refuse to publish an empty dataset.
     if match_count == 0:
         logger.error("Refusing to publish: pattern matches dataset is empty.")
-        return
+        return False
 
     # Atomic swap to final query zone
-    replace_s3_prefix(bucket, TMP_PATTERN_MATCHES, AGG_PATTERN_MATCHES)
+    publish_s3_prefix(bucket, TMP_PATTERN_MATCHES, AGG_PATTERN_MATCHES)
     logger.info("Successfully updated agg-data/pattern-matches in S3.")
+    return True
 
 
-def build_matched_app_sdk_strings() -> None:
-    """Build matched SDKs artifact by joining version-details-map with pattern-matches."""
+def _matched_app_sdk_strings_sql(vdm_paths: list[str], pm_paths: list[str]) -> str:
+    """SELECT joining version details to apps and pattern matches."""
     bucket = CONFIG["s3"]["bucket"]
     vc_path = f"s3://{bucket}/{LOOKUP_VERSION_CODES}"
-
-    # Build S3 glob paths directly instead of fetching file lists via S3 API
-    vdm_glob = f"s3://{bucket}/{AGG_VERSION_DETAILS}/*/*.parquet"
-    pm_glob = f"s3://{bucket}/{AGG_PATTERN_MATCHES}/*/*.parquet"
-
-    tmp_output_glob = f"s3://{bucket}/{TMP_MATCHED_SDK_STRINGS}/*.parquet"
-    agg_tmp_output = f"s3://{bucket}/{TMP_MATCHED_SDK_STRINGS}"
-
-    # Wipe any stale remnants from a prior failed run.
-    delete_s3_objects_by_prefix(bucket, f"{TMP_MATCHED_SDK_STRINGS}/")
-
-    logger.info("Building aggregated matched SDK strings...")
-    query = f"""COPY (
+    return f"""
                  SELECT 
                      vc.store_app,
                      vdm.version_code_id,
                      vdm.string_id,
                      pm.sdk_id,
                      vc.created_at as version_code_created_at
-                 FROM read_parquet('{vdm_glob}') vdm
+                 FROM read_parquet({vdm_paths}) vdm
                  JOIN read_parquet('{vc_path}') vc
                    ON vdm.version_code_id = vc.id
-                 LEFT JOIN read_parquet('{pm_glob}') pm
+                 LEFT JOIN read_parquet({pm_paths}) pm
                    ON vdm.string_id = pm.string_id
+    """
+
+
+def build_matched_app_sdk_strings() -> bool:
+    """Build matched SDKs artifact by joining version-details-map with pattern-matches.
+
+    Returns True if the rebuilt files were published.
+    """
+    bucket = CONFIG["s3"]["bucket"]
+
+    vdm_paths = get_published_parquet_paths(bucket, AGG_VERSION_DETAILS)
+    pm_paths = get_published_parquet_paths(bucket, AGG_PATTERN_MATCHES)
+
+    tmp_output_glob = f"s3://{bucket}/{TMP_MATCHED_SDK_STRINGS}/*.parquet"
+    agg_tmp_output = f"s3://{bucket}/{TMP_MATCHED_SDK_STRINGS}"
+
+    # Wipe any stale remnants from a prior failed run.
+    delete_s3_objects_by_prefix(bucket, f"{TMP_MATCHED_SDK_STRINGS}/")
+
+    logger.info("Building aggregated matched SDK strings...")
+    query = f"""COPY ({_matched_app_sdk_strings_sql(vdm_paths, pm_paths)}
          ) TO '{agg_tmp_output}' (
              FORMAT PARQUET,
              FILE_SIZE_BYTES '128MB',
@@ -430,46 +433,62 @@ def build_matched_app_sdk_strings() -> None:
 
     if matched_count == 0:
         logger.error("Refusing to publish: matched SDK strings dataset is empty.")
-        return
+        return False
 
     # Swap tmp to final
-    replace_s3_prefix(
+    publish_s3_prefix(
         bucket, f"{TMP_MATCHED_SDK_STRINGS}/", f"{AGG_MATCHED_SDK_STRINGS}/"
     )
     logger.info("Successfully updated agg-data/matched-sdk-strings in S3.")
+    return True
 
 
-def build_matched_app_sdk_strings_latest() -> None:
-    """Build latest matched SDKs artifact by picking the newest version_code per store_app."""
-    bucket = CONFIG["s3"]["bucket"]
+def _latest_version_codes_sql(max_version_code_id: int | None = None) -> str:
+    """SELECT of the newest ``version_code_id`` of every store_app.
 
-    # S3 Glob locations
-    input_glob = f"s3://{bucket}/{AGG_MATCHED_SDK_STRINGS}/*.parquet"
-    agg_tmp_output = f"s3://{bucket}/{TMP_MATCHED_SDK_STRINGS_LATEST}"
-    tmp_output_glob = f"s3://{bucket}/{TMP_MATCHED_SDK_STRINGS_LATEST}/*.parquet"
+    With ``max_version_code_id`` only version codes up to that id are ranked,
+    ie the latest as of an earlier lookup export.
+    """
+    bucket = CONFIG["s3"]["bucket"]
     vc_path = f"s3://{bucket}/{LOOKUP_VERSION_CODES}"
-
-    delete_s3_objects_by_prefix(bucket, f"{TMP_MATCHED_SDK_STRINGS_LATEST}/")
-
-    logger.info("Building latest matched SDK strings...")
-
-    query = f"""
-        COPY (
-            WITH latest_vc AS (
+    id_filter = ""
+    if max_version_code_id is not None:
+        id_filter = f"WHERE id <= {max_version_code_id}"
+    return f"""
                 SELECT 
                     store_app, 
                     id AS version_code_id
                 FROM read_parquet('{vc_path}')
+                {id_filter}
                 QUALIFY DENSE_RANK() OVER (
                     PARTITION BY store_app 
                     ORDER BY created_at DESC, id DESC
                 ) = 1
-            )
+    """
+
+
+def build_matched_app_sdk_strings_latest() -> bool:
+    """Build latest matched SDKs artifact by picking the newest version_code per store_app.
+
+    Returns True if the rebuilt files were published.
+    """
+    bucket = CONFIG["s3"]["bucket"]
+
+    input_paths = get_published_parquet_paths(bucket, AGG_MATCHED_SDK_STRINGS)
+    agg_tmp_output = f"s3://{bucket}/{TMP_MATCHED_SDK_STRINGS_LATEST}"
+
+    delete_s3_objects_by_prefix(bucket, f"{TMP_MATCHED_SDK_STRINGS_LATEST}/")
+
+    logger.info("Building latest matched SDK strings...")
+
+    query = f"""
+        COPY (
+            WITH latest_vc AS ({_latest_version_codes_sql()})
             SELECT 
                 ap.store_app,
                 ap.string_id,
                 ap.sdk_id
-            FROM read_parquet('{input_glob}') ap
+            FROM read_parquet({input_paths}) ap
             JOIN latest_vc lvc
               ON ap.store_app = lvc.store_app
              AND ap.version_code_id = lvc.version_code_id
@@ -479,8 +498,15 @@ def build_matched_app_sdk_strings_latest() -> None:
             COMPRESSION 'zstd'
         )
     """
+    return _publish_matched_app_sdk_strings_latest(query)
+
+
+def _publish_matched_app_sdk_strings_latest(copy_query: str) -> bool:
+    """Run ``copy_query`` into the latest tmp prefix and swap it into agg-data."""
+    bucket = CONFIG["s3"]["bucket"]
+    tmp_output_glob = f"s3://{bucket}/{TMP_MATCHED_SDK_STRINGS_LATEST}/*.parquet"
     with get_duckdb_connection("s3") as duckdb_con:
-        duckdb_con.execute(query)
+        duckdb_con.execute(copy_query)
 
         # Validate output has rows using S3 glob instead of fetching Python lists
         matched_count = duckdb_con.execute(f"""
@@ -494,15 +520,379 @@ def build_matched_app_sdk_strings_latest() -> None:
         logger.error(
             "Refusing to publish: matched SDK strings latest dataset is empty."
         )
-        return
+        return False
 
     # Swap tmp to final
-    replace_s3_prefix(
+    publish_s3_prefix(
         bucket,
         f"{TMP_MATCHED_SDK_STRINGS_LATEST}/",
         f"{AGG_MATCHED_SDK_STRINGS_LATEST}/",
     )
     logger.info(f"Successfully updated {AGG_MATCHED_SDK_STRINGS_LATEST} in S3.")
+    return True
+
+
+def _read_version_details_state() -> dict | None:
+    """Load the watermarks of the last aggregates update, None if there is none."""
+    try:
+        response = get_s3_client().get_object(
+            Bucket=CONFIG["s3"]["bucket"], Key=STATE_VERSION_DETAILS
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return None
+        raise
+    return json.loads(response["Body"].read())
+
+
+def _write_version_details_state(state: dict) -> None:
+    get_s3_client().put_object(
+        Bucket=CONFIG["s3"]["bucket"],
+        Key=STATE_VERSION_DETAILS,
+        Body=json.dumps(state).encode(),
+        ContentType="application/json",
+    )
+
+
+def _lookup_watermarks() -> dict:
+    """Highest exported string and version code ids and a hash of the SDK patterns."""
+    bucket = CONFIG["s3"]["bucket"]
+    patterns_hash = hashlib.md5()
+    with get_duckdb_connection("s3") as duckdb_con:
+        max_string_id = duckdb_con.execute(f"""
+            SELECT coalesce(max(id), 0)
+            FROM read_parquet('s3://{bucket}/{LOOKUP_VERSION_STRINGS}')
+        """).fetchone()[0]
+        max_version_code_id = duckdb_con.execute(f"""
+            SELECT coalesce(max(id), 0)
+            FROM read_parquet('s3://{bucket}/{LOOKUP_VERSION_CODES}')
+        """).fetchone()[0]
+        for key in [
+            LOOKUP_SDK_PACKAGE_PATTERNS,
+            LOOKUP_SDK_PATH_PATTERNS,
+            LOOKUP_SDK_MEDIATION_PATTERNS,
+        ]:
+            content_md5 = duckdb_con.execute(f"""
+                SELECT md5(string_agg(CAST(t AS VARCHAR), chr(10) ORDER BY CAST(t AS VARCHAR)))
+                FROM read_parquet('s3://{bucket}/{key}') t
+            """).fetchone()[0]
+            patterns_hash.update(f"{key}={content_md5}\n".encode())
+    return {
+        "max_string_id": int(max_string_id),
+        "max_version_code_id": int(max_version_code_id),
+        "patterns_hash": patterns_hash.hexdigest(),
+    }
+
+
+def _delete_delta_files(delta_label: str) -> None:
+    """Unpublish and remove what a failed incremental run left under ``delta_label``."""
+    bucket = CONFIG["s3"]["bucket"]
+    for prefix in [AGG_VERSION_DETAILS, AGG_PATTERN_MATCHES, AGG_MATCHED_SDK_STRINGS]:
+        delta_prefix = f"{prefix}/{delta_label}/"
+        published = get_published_parquet_paths(bucket, prefix)
+        if any(path.startswith(f"s3://{bucket}/{delta_prefix}") for path in published):
+            logger.warning(f"Unpublishing leftover {delta_prefix}")
+            update_s3_manifest(bucket, prefix, remove_under=delta_prefix)
+        delete_s3_objects_by_prefix(bucket, delta_prefix)
+
+
+def _compacted_ms(path: str) -> int | None:
+    """The epoch ms in the name of a compacted raw file, None for other files."""
+    match = _RAW_COMPACTED_FILE.search(path)
+    return int(match.group(1)) if match else None
+
+
+def list_new_raw_version_details(after_ms: int, until_ms: int) -> list[str]:
+    """Raw files compacted after the ``after_ms`` watermark, up to ``until_ms``.
+
+    Only lists the date partitions of each ``string_bucket`` from
+    ``_RAW_LATE_DAYS`` before the watermark on, so the listing tracks new
+    data rather than the whole raw history.
+    """
+    bucket = CONFIG["s3"]["bucket"]
+    first_date = (
+        datetime.datetime.fromtimestamp(after_ms / 1000, datetime.UTC)
+        - datetime.timedelta(days=_RAW_LATE_DAYS)
+    ).strftime("%Y-%m-%d")
+    raw_paths = []
+    for bucket_dir in get_s3_dirs_by_prefix(bucket, f"{RAW_DATA_VERSION_DETAILS}/"):
+        raw_paths += get_parquet_paths_by_prefix(
+            bucket, bucket_dir, start_after=f"{bucket_dir}date={first_date}"
+        )
+    return [
+        path
+        for path in raw_paths
+        if (ms := _compacted_ms(path)) is not None and after_ms < ms <= until_ms
+    ]
+
+
+def merge_new_version_details(raw_paths: list[str], delta_label: str) -> int:
+    """Write the pairs of new raw files that are not yet in the master.
+
+    Only the master files of the ``string_bucket`` partitions the new raw
+    files fall into are read. New pairs are written, unpublished, under
+    ``agg-data/version-details-map/{delta_label}/``. Returns their count.
+    """
+    bucket = CONFIG["s3"]["bucket"]
+    string_buckets = sorted(
+        {
+            match.group(1)
+            for path in raw_paths
+            if (match := re.search(r"/string_bucket=([^/]+)/", path))
+        }
+    )
+    master_paths = [
+        path
+        for path in get_published_parquet_paths(bucket, AGG_VERSION_DETAILS)
+        if re.search(r"/string_bucket=([^/]+)/", path).group(1) in string_buckets
+    ]
+    if master_paths:
+        master_sql = (
+            f"SELECT string_id, version_code_id FROM read_parquet({master_paths})"
+        )
+    else:
+        master_sql = (
+            "SELECT NULL::BIGINT AS string_id, NULL::BIGINT AS version_code_id LIMIT 0"
+        )
+
+    logger.info(
+        f"Merging {len(raw_paths)} new raw files into {len(string_buckets)} "
+        f"string buckets ({len(master_paths)} master files)"
+    )
+    with get_duckdb_connection("s3") as duckdb_con:
+        row_count = duckdb_con.execute(f"""
+            COPY (
+                SELECT DISTINCT
+                    n.string_bucket,
+                    n.string_id,
+                    n.version_code_id
+                FROM read_parquet({raw_paths}, hive_partitioning=true) n
+                ANTI JOIN ({master_sql}) m
+                  ON n.string_id = m.string_id
+                 AND n.version_code_id = m.version_code_id
+            ) TO 's3://{bucket}/{AGG_VERSION_DETAILS}/{delta_label}/' (
+                FORMAT PARQUET,
+                PARTITION_BY (string_bucket),
+                COMPRESSION 'zstd',
+                ROW_GROUP_SIZE {_LARGE_ROW_GROUP_SIZE},
+                OVERWRITE_OR_IGNORE true
+            )
+        """).fetchone()[0]
+    logger.info(f"Merged {row_count:,} new version detail rows as {delta_label}")
+    return row_count
+
+
+def match_new_version_strings(after_string_id: int, delta_label: str) -> int:
+    """Pattern match version strings with ``id > after_string_id``.
+
+    Matches are written, unpublished, under
+    ``agg-data/pattern-matches/{delta_label}/``. Returns their count.
+    """
+    bucket = CONFIG["s3"]["bucket"]
+    with get_duckdb_connection("s3") as duckdb_con:
+        match_count = duckdb_con.execute(f"""
+            COPY ({_pattern_matches_sql(after_string_id)}
+            ) TO 's3://{bucket}/{AGG_PATTERN_MATCHES}/{delta_label}/' (
+                FORMAT PARQUET,
+                PARTITION_BY (string_bucket),
+                COMPRESSION 'zstd',
+                ROW_GROUP_SIZE {_ROW_GROUP_SIZE},
+                OVERWRITE_OR_IGNORE true
+            )
+        """).fetchone()[0]
+    logger.info(f"Matched {match_count:,} new strings after {after_string_id=}")
+    return match_count
+
+
+def match_new_app_sdk_strings(delta_label: str) -> int:
+    """Join the version details merged as ``delta_label`` to apps and matches.
+
+    Rows are written, unpublished, under
+    ``agg-data/matched-sdk-strings/{delta_label}/``. Returns their count.
+    """
+    bucket = CONFIG["s3"]["bucket"]
+    vdm_paths = get_parquet_paths_by_prefix(
+        bucket, f"{AGG_VERSION_DETAILS}/{delta_label}/"
+    )
+    pm_paths = get_published_parquet_paths(
+        bucket, AGG_PATTERN_MATCHES
+    ) + get_parquet_paths_by_prefix(bucket, f"{AGG_PATTERN_MATCHES}/{delta_label}/")
+    with get_duckdb_connection("s3") as duckdb_con:
+        matched_count = duckdb_con.execute(f"""
+            COPY ({_matched_app_sdk_strings_sql(vdm_paths, pm_paths)}
+            ) TO 's3://{bucket}/{AGG_MATCHED_SDK_STRINGS}/{delta_label}' (
+                FORMAT PARQUET,
+                FILE_SIZE_BYTES '128MB',
+                COMPRESSION 'zstd',
+                ROW_GROUP_SIZE {_LARGE_ROW_GROUP_SIZE},
+                OVERWRITE_OR_IGNORE true
+            )
+        """).fetchone()[0]
+    logger.info(f"Added {matched_count:,} matched SDK string rows as {delta_label}")
+    return matched_count
+
+
+def update_matched_app_sdk_strings_latest(
+    delta_label: str | None, after_version_code_id: int
+) -> bool:
+    """Rewrite the latest matched SDK strings of store_apps that changed.
+
+    Store_apps whose newest version code is the same as among version codes
+    up to ``after_version_code_id`` keep their current rows. Rows matched as
+    ``delta_label`` are added for every store_app at its newest version code,
+    which covers both new latest version codes and late details of an
+    unchanged one. The full matched dataset is not read, and running it again
+    with the same arguments gives the same rows.
+
+    Returns True if the updated files were published.
+    """
+    bucket = CONFIG["s3"]["bucket"]
+    latest_paths = get_published_parquet_paths(bucket, AGG_MATCHED_SDK_STRINGS_LATEST)
+    agg_tmp_output = f"s3://{bucket}/{TMP_MATCHED_SDK_STRINGS_LATEST}"
+
+    delete_s3_objects_by_prefix(bucket, f"{TMP_MATCHED_SDK_STRINGS_LATEST}/")
+
+    new_rows_sql = ""
+    if delta_label is not None:
+        delta_paths = get_parquet_paths_by_prefix(
+            bucket, f"{AGG_MATCHED_SDK_STRINGS}/{delta_label}/"
+        )
+        new_rows_sql = f"""
+                UNION
+                SELECT 
+                    ap.store_app,
+                    ap.string_id,
+                    ap.sdk_id
+                FROM read_parquet({delta_paths}) ap
+                JOIN latest_new n
+                  ON ap.store_app = n.store_app
+                 AND ap.version_code_id = n.version_code_id
+        """
+
+    logger.info("Updating latest matched SDK strings...")
+    query = f"""
+        COPY (
+            WITH latest_new AS ({_latest_version_codes_sql()}),
+            latest_old AS ({_latest_version_codes_sql(after_version_code_id)}),
+            unchanged AS (
+                SELECT n.store_app
+                FROM latest_new n
+                JOIN latest_old o
+                  ON n.store_app = o.store_app
+                 AND n.version_code_id = o.version_code_id
+            )
+            SELECT 
+                l.store_app,
+                l.string_id,
+                l.sdk_id
+            FROM read_parquet({latest_paths}) l
+            SEMI JOIN unchanged u
+              ON l.store_app = u.store_app
+            {new_rows_sql}
+        ) TO '{agg_tmp_output}' (
+            FORMAT PARQUET,
+            FILE_SIZE_BYTES '128MB',
+            COMPRESSION 'zstd'
+        )
+    """
+    return _publish_matched_app_sdk_strings_latest(query)
+
+
+def update_version_details_aggregates(full_rebuild: bool = False) -> None:
+    """Bring the agg-data version details outputs up to date with raw-data.
+
+    An incremental run only reads raw files compacted since the last run,
+    pattern matches only version strings exported since the last run and
+    rewrites the latest rows only of store_apps with new version codes or
+    details. New rows are written under ``delta_<seq>/`` in each agg-data
+    prefix and added to its manifest once all of them are written. This
+    relies on strings and version codes reaching Postgres before the version
+    details that use them, so old details never gain new matches.
+
+    Raw files are tracked by the ``raw_compacted_ms`` watermark, the newest
+    compaction merged, see ``list_new_raw_version_details``. Compactions of
+    the last ``_RAW_SETTLE_MS`` wait for the next run, they may be partly
+    written.
+
+    A missing state, changed SDK patterns or ``_MAX_INCREMENTAL_RUNS`` runs
+    since the last rebuild fall back to the full rebuild, which also compacts
+    the delta files. Expects ``copy_lookups`` to have exported the lookups.
+    """
+    state = _read_version_details_state()
+    until_ms = int(time.time() * 1000) - _RAW_SETTLE_MS
+    watermarks = _lookup_watermarks()
+
+    rebuild_reason = None
+    if full_rebuild:
+        rebuild_reason = "requested"
+    elif state is None:
+        rebuild_reason = "no previous state"
+    elif state["patterns_hash"] != watermarks["patterns_hash"]:
+        rebuild_reason = "SDK patterns changed"
+    elif state["seq"] - state["rebuilt_seq"] >= _MAX_INCREMENTAL_RUNS:
+        rebuild_reason = f"{_MAX_INCREMENTAL_RUNS} incremental runs since rebuild"
+    seq = 0 if state is None else state["seq"] + 1
+
+    if rebuild_reason:
+        logger.info(f"Full rebuild of version details aggregates: {rebuild_reason}")
+        published = [
+            build_aggregated_version_details(),
+            build_aggregated_pattern_matches(),
+            build_matched_app_sdk_strings(),
+            build_matched_app_sdk_strings_latest(),
+        ]
+        if not all(published):
+            logger.error("Full rebuild not fully published, keeping previous state")
+            return
+        # The rebuild read every raw file, all settled ones are complete
+        _write_version_details_state(
+            {"seq": seq, "rebuilt_seq": seq, "raw_compacted_ms": until_ms, **watermarks}
+        )
+        return
+
+    delta_label = f"delta_{seq:06d}"
+    _delete_delta_files(delta_label)
+    # States written before the watermark listed every merged raw file
+    raw_files = state.pop("raw_files", [])
+    after_ms = state.get(
+        "raw_compacted_ms",
+        max([0] + [ms for path in raw_files if (ms := _compacted_ms(path))]),
+    )
+    new_raw_paths = list_new_raw_version_details(after_ms, until_ms)
+    logger.info(
+        f"Incremental version details update {delta_label} "
+        f"new_raw_files={len(new_raw_paths)}"
+    )
+
+    new_details = 0
+    if new_raw_paths:
+        new_details = merge_new_version_details(new_raw_paths, delta_label)
+    if watermarks["max_string_id"] > state["max_string_id"]:
+        match_new_version_strings(state["max_string_id"], delta_label)
+    new_matched = 0
+    if new_details:
+        new_matched = match_new_app_sdk_strings(delta_label)
+    bucket = CONFIG["s3"]["bucket"]
+    for prefix in [AGG_VERSION_DETAILS, AGG_PATTERN_MATCHES, AGG_MATCHED_SDK_STRINGS]:
+        delta_paths = get_parquet_paths_by_prefix(bucket, f"{prefix}/{delta_label}/")
+        if delta_paths:
+            update_s3_manifest(bucket, prefix, add_paths=delta_paths)
+    if new_matched or watermarks["max_version_code_id"] > state["max_version_code_id"]:
+        published = update_matched_app_sdk_strings_latest(
+            delta_label if new_matched else None, state["max_version_code_id"]
+        )
+        if not published:
+            logger.error(f"{delta_label} latest not published, keeping previous state")
+            return
+
+    _write_version_details_state(
+        {
+            **state,
+            "seq": seq,
+            "raw_compacted_ms": max(after_ms, until_ms),
+            **watermarks,
+        }
+    )
 
 
 def initial_backfill_version_details_map() -> None:
@@ -511,7 +901,7 @@ def initial_backfill_version_details_map() -> None:
     pg_conn_str = pg_db_uri()
     con = get_duckdb_connection("s3")
     con.execute("INSTALL postgres; LOAD postgres;")
-    con.execute(f"ATTACH '{pg_conn_str}' AS pg (TYPE POSTGRES);")
+    con.execute(f"ATTACH IF NOT EXISTS '{pg_conn_str}' AS pg (TYPE POSTGRES);")
     logger.info(f"Streaming public.version_details_map directly to {s3_path}")
     con.execute(f"""
         COPY (
@@ -575,7 +965,7 @@ def _pg_table_to_s3(sql_query: str, s3_key: str, description: str) -> None:
 
     con = get_duckdb_connection("s3")
     con.execute("INSTALL postgres; LOAD postgres;")
-    con.execute(f"ATTACH '{pg_conn_str}' AS pg (TYPE POSTGRES);")
+    con.execute(f"ATTACH IF NOT EXISTS '{pg_conn_str}' AS pg (TYPE POSTGRES);")
 
     logger.info("Streaming %s directly to %s", description, s3_path)
     con.execute(f"""
@@ -622,7 +1012,9 @@ def copy_lookups() -> None:
 
 def swap_matched_app_strings_latest_todb(pgdb):
     bucket = CONFIG["s3"]["bucket"]
-    app_sdk_latest_glob = f"s3://{bucket}/{AGG_MATCHED_SDK_STRINGS_LATEST}/*.parquet"
+    app_sdk_latest_paths = get_published_parquet_paths(
+        bucket, AGG_MATCHED_SDK_STRINGS_LATEST
+    )
     batch_date = datetime.date.today()
     batch_date_str = batch_date.strftime("%Y-%m-%d")
     # Inject batch_date directly into DuckDB projection
@@ -632,11 +1024,11 @@ def swap_matched_app_strings_latest_todb(pgdb):
             string_id,
             sdk_id,
             '{batch_date_str}'::DATE AS batch_date
-        FROM read_parquet('{app_sdk_latest_glob}')
+        FROM read_parquet({app_sdk_latest_paths})
     """
     columns = ["store_app", "string_id", "sdk_id", "batch_date"]
     atomic_swap_partition_stream(
-        stream=stream_duckdb_tsv(query),
+        stream=stream_duckdb_csv(query),
         columns=columns,
         batch_date=batch_date,
         pgdb=pgdb,
@@ -649,7 +1041,7 @@ def swap_matched_app_sdks_todb(pgdb):
     bucket = CONFIG["s3"]["bucket"]
     batch_date = datetime.date.today()
     batch_date_str = batch_date.strftime("%Y-%m-%d")
-    app_sdks_glob = f"s3://{bucket}/{AGG_MATCHED_SDK_STRINGS}/*.parquet"
+    app_sdks_paths = get_published_parquet_paths(bucket, AGG_MATCHED_SDK_STRINGS)
     query = f"""
         SELECT DISTINCT
             store_app,
@@ -657,7 +1049,7 @@ def swap_matched_app_sdks_todb(pgdb):
             version_code_created_at,
             sdk_id,
             '{batch_date_str}'::DATE AS batch_date
-        FROM read_parquet('{app_sdks_glob}')
+        FROM read_parquet({app_sdks_paths})
         WHERE sdk_id IS NOT NULL and version_code_id IS NOT NULL
     """
 
@@ -670,7 +1062,7 @@ def swap_matched_app_sdks_todb(pgdb):
     ]
 
     atomic_swap_partition_stream(
-        stream=stream_duckdb_tsv(query),
+        stream=stream_duckdb_csv(query),
         columns=columns,
         batch_date=batch_date,
         pgdb=pgdb,
@@ -679,24 +1071,23 @@ def swap_matched_app_sdks_todb(pgdb):
     )
 
 
-def map_version_details(pgdb) -> None:
+def map_version_details(pgdb, full_rebuild: bool = False) -> None:
     """Orchestrate the entire version details processing pipeline.
 
     Args:
-        date_str: Logical partition date for incoming compaction (YYYY-MM-DD).
+        pgdb: Database connection the matched SDKs are synced to.
+        full_rebuild: Rebuild the S3 aggregates from all raw data instead of
+            merging only what is new since the last run.
     """
 
     start_time = time.time()
     logger.info("Starting map_version_details entrypoint run for past days")
 
-    logger.info("--- Stage 2: Rebuilding aggregated master version details ---")
-    build_aggregated_version_details()
-
-    logger.info("--- Stage 3: Rebuilding aggregated pattern matches ---")
+    logger.info("--- Stage 2: Exporting lookups ---")
     copy_lookups()
-    build_aggregated_pattern_matches()
-    build_matched_app_sdk_strings()
-    build_matched_app_sdk_strings_latest()
+
+    logger.info("--- Stage 3: Updating aggregated version details and matches ---")
+    update_version_details_aggregates(full_rebuild=full_rebuild)
 
     logger.info("--- Stage 5: Syncing SDK agg to Postgres ---")
     swap_matched_app_sdks_todb(pgdb)
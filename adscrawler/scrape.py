@@ -1,15 +1,21 @@
-import csv
 import datetime
-import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import TypedDict
+from urllib.parse import urlparse
 
 import pandas as pd
 import requests
 import tldextract
+from requests.adapters import HTTPAdapter
 
 from .config import DEVLEOPER_IGNORE_TLDS, get_logger
 from .dbcon.connection import PostgresEngine
-from .dbcon.queries import query_pub_domains_to_crawl_ads_txt, upsert_df
+from .dbcon.queries import (
+    query_pub_domains_to_crawl_ads_txt,
+    upsert_app_ads_batch,
+)
 from .metrics import ADS_TXT_RESULTS_COUNTER
 
 """
@@ -28,6 +34,58 @@ class AdsTxtEmptyError(Exception):
     pass
 
 
+REQUEST_TIMEOUT = 4
+RESPONSE_CHUNK_SIZE = 64 * 1024
+# Minimum seconds between two requests to the same host
+HOST_MIN_INTERVAL = 0.5
+
+_thread_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    """Keep-alive session for the current crawl thread.
+
+    requests.Session is not thread safe, so each worker thread keeps its own
+    session and reuses its pooled connections across domains.
+    """
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=4, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _thread_local.session = session
+    return session
+
+
+class HostThrottle:
+    """Space out requests to the same host across all crawl threads."""
+
+    def __init__(self, min_interval: float) -> None:
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_allowed: dict[str, float] = {}
+
+    def wait(self, url: str) -> None:
+        host = urlparse(url).hostname or url
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_allowed.get(host, now))
+            self._next_allowed[host] = start_at + self.min_interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+
+HOST_THROTTLE = HostThrottle(min_interval=HOST_MIN_INTERVAL)
+
+
+def get_ads_url(ads_url: str, headers: dict | None = None) -> requests.Response:
+    HOST_THROTTLE.wait(ads_url)
+    return get_session().get(
+        ads_url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT
+    )
+
+
 def get_text_from_response(response: requests.Response) -> str:
     max_bytes = 1000000
     # Check the content length
@@ -35,23 +93,19 @@ def get_text_from_response(response: requests.Response) -> str:
     if content_length and int(content_length) > max_bytes:
         err = f"content exceeds maximum allowed size of {max_bytes} bytes"
         raise NoAdsTxtError(err)
-    # Maximum amount we want to read
-    content_bytes = response.headers.get("Content-Length")
-    if content_bytes and int(content_bytes) < max_bytes:
+    if content_length:
         # Expected body is smaller than our maximum, read the whole thing
         text = response.text
     else:
         # Alternatively, stream until we hit our limit
-        amount_read = 0
-        mybytes = b""
-        for chunk in response.iter_content():
-            amount_read += len(chunk)
-            # Save chunk
-            mybytes += chunk
-            if amount_read > max_bytes:
+        buffer = bytearray()
+        for chunk in response.iter_content(chunk_size=RESPONSE_CHUNK_SIZE):
+            buffer.extend(chunk)
+            if len(buffer) > max_bytes:
+                response.close()
                 logger.warning("Encountered large file, quitting")
                 raise NoAdsTxtError("File too large")
-        text = mybytes.decode("utf-8")
+        text = buffer.decode("utf-8")
     return text
 
 
@@ -61,14 +115,12 @@ def try_http_request(ads_url: str, headers: dict | None = None) -> requests.Resp
     if ads_url.startswith("https://"):
         ads_url = ads_url.replace("https://", "http://", 1)
     try:
-        if headers:
-            response = requests.get(ads_url, headers=headers, stream=True, timeout=4)
-        else:
-            response = requests.get(ads_url, stream=True, timeout=4)
+        response = get_ads_url(ads_url, headers=headers)
     except requests.exceptions.ConnectionError:
         err = f"{ads_url} type: requests ConnectionError"
         raise NoAdsTxtError(err) from ConnectionError
     if response.status_code != 200:
+        response.close()
         err = f"{ads_url} status_code: {response.status_code}"
         raise NoAdsTxtError(err)
     return response
@@ -79,14 +131,13 @@ def try_https_request(ads_url: str, headers: dict | None = None) -> requests.Res
         ads_url = "http://" + ads_url
     ads_url = ads_url.replace("http://", "https://", 1)
     try:
-        if headers:
-            response = requests.get(ads_url, headers=headers, stream=True, timeout=4)
-        else:
-            response = requests.get(ads_url, stream=True, timeout=4)
+        response = get_ads_url(ads_url, headers=headers)
     except Exception:
         err = f"{ads_url} type: requests Exception"
         raise NoAdsTxtError(err) from Exception
     if response.status_code != 200:
+        # Callers only check the status, hand the connection back to the pool
+        response.close()
         err = f"{ads_url} status_code: {response.status_code}"
         logger.error(err)
     return response
@@ -106,6 +157,7 @@ def request_app_ads(ads_url: str) -> str:
         headers = {
             "User-Agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:131.0) Gecko/20100101 Firefox/131.0",
         }
+        response.close()
         try:
             response = try_http_request(ads_url, headers=headers)
         except Exception:
@@ -117,18 +169,26 @@ def request_app_ads(ads_url: str) -> str:
     # If still not successful, raise an error for non-200 status codes
     if response.status_code != 200:
         err = f"{response.status_code}"
+        response.close()
         try:
             response = try_https_request(ads_url)
         except Exception:
             err = f"{ads_url} status_code: {response.status_code}"
             raise NoAdsTxtError(err) from Exception
+        if response.status_code != 200:
+            err = f"{ads_url} status_code: {response.status_code}"
+            raise NoAdsTxtError(err)
     text = get_text_from_response(response)
     if "<head>" in text:
         err = f"{ads_url} HTML in adstxt"
         if ads_url.startswith("http://"):
             ads_url = ads_url.replace("http://", "https://", 1)
-            response = requests.get(ads_url, stream=True, timeout=4)
-            text = get_text_from_response(response)
+            response.close()
+            response = get_ads_url(ads_url)
+            try:
+                text = get_text_from_response(response)
+            finally:
+                response.close()
         raise NoAdsTxtError(err)
     if not any(term in text.upper() for term in ["DIRECT", "RESELLER"]):
         err = "DIRECT, RESELLER not in ads.txt"
@@ -163,70 +223,75 @@ def get_app_ads_text(url: str) -> str:
     return text
 
 
-def parse_ads_txt(txt: str) -> pd.DataFrame:
-    txt = txt.replace(" ", "")
-    csv_header = [
-        "domain",
-        "publisher_id",
-        "relationship",
-        "certification_auth",
-        "notes",
-    ]
-    rows = []
-    input_stream_lines = txt.split("\n")
-    output_stream = ""
-    for line in input_stream_lines:
+ADS_TXT_COLUMNS = [
+    "domain",
+    "publisher_id",
+    "relationship",
+    "certification_auth",
+    "notes",
+]
+
+
+class AdsTxtParser:
+    """Single pass ads.txt parser that accepts text in chunks.
+
+    Records are split straight into per-column lists. Spaces are removed,
+    blank and ``#`` comment lines are skipped, missing fields are None and
+    anything after the fourth field is joined into ``notes``.
+    """
+
+    def __init__(self) -> None:
+        self.columns: dict[str, list[str | None]] = {x: [] for x in ADS_TXT_COLUMNS}
+        self.has_notes = False
+        self._tail = ""
+
+    def feed(self, text: str) -> None:
+        lines = (self._tail + text).split("\n")
+        # Last piece may be a partial line, keep it for the next chunk
+        self._tail = lines.pop()
+        for line in lines:
+            self._add_line(line)
+
+    def _add_line(self, line: str) -> None:
+        line = line.replace(" ", "").rstrip("\r")
         if not line or line[0] == "#":
-            continue
+            return
+        fields = line.split(",")
+        num_fields = len(fields)
+        self.columns["domain"].append(fields[0])
+        self.columns["publisher_id"].append(fields[1] if num_fields > 1 else None)
+        self.columns["relationship"].append(fields[2] if num_fields > 2 else None)
+        self.columns["certification_auth"].append(fields[3] if num_fields > 3 else None)
+        if num_fields > 4:
+            self.columns["notes"].append(",".join(fields[4:]))
+            self.has_notes = True
         else:
-            output_stream = output_stream + line + "\n"
-    for row in csv.DictReader(
-        io.StringIO(output_stream),
-        delimiter=",",
-        fieldnames=csv_header[:-1],
-        restkey=csv_header[-1],
-        quoting=csv.QUOTE_NONE,
-    ):
-        try:
-            if len(row) == 4:
-                rows.append(
-                    [
-                        row["domain"],
-                        row["publisher_id"],
-                        row["relationship"],
-                        row["certification_auth"],
-                    ],
-                )
-            elif len(row) > 4:
-                rows.append(
-                    [
-                        row["domain"],
-                        row["publisher_id"],
-                        row["relationship"],
-                        row["certification_auth"],
-                        ",".join(row["notes"]),
-                    ],
-                )
-            else:
-                rows.append([row["domain"], row["publisher_id"], row["relationship"]])
-        except Exception as err:
-            logger.error(f"Parser skipping row: {row}, error: {err}")
-            continue
-    if pd.DataFrame(rows).shape[1] == len(csv_header) - 1:
-        df = pd.DataFrame(rows, columns=csv_header[:-1])
-    else:
-        df = pd.DataFrame(rows, columns=csv_header)
-    return df
+            self.columns["notes"].append(None)
+
+    def close(self) -> pd.DataFrame:
+        if self._tail:
+            self._add_line(self._tail)
+            self._tail = ""
+        if not self.columns["domain"]:
+            return pd.DataFrame([], columns=ADS_TXT_COLUMNS)
+        columns = ADS_TXT_COLUMNS if self.has_notes else ADS_TXT_COLUMNS[:-1]
+        return pd.DataFrame({x: self.columns[x] for x in columns})
+
+
+def parse_ads_txt(txt: str) -> pd.DataFrame:
+    parser = AdsTxtParser()
+    parser.feed(txt)
+    return parser.close()
 
 
 def clean_raw_txt_df(txt_df: pd.DataFrame) -> pd.DataFrame:
-    # Domain
+    # Domain, files repeat the same ad domains so extract each one only once
     txt_df["domain"] = txt_df["domain"].str.lower()
-    txt_df["domain"] = txt_df["domain"].apply(
-        lambda x: ".".join(
-            [tldextract.extract(x).domain, tldextract.extract(x).suffix],
-        ),
-    )
+    root_domains = {}
+    for domain in txt_df["domain"].unique():
+        ext = tldextract.extract(domain)
+        root_domains[domain] = ".".join([ext.domain, ext.suffix])
+    txt_df["domain"] = txt_df["domain"].map(root_domains)
     standard_str_cols = ["domain", "publisher_id", "relationship", "certification_auth"]
     txt_df[standard_str_cols] = txt_df[standard_str_cols].replace(
         "[^a-zA-Z0-9_\\-\\.]",
@@ -261,32 +326,33 @@ def clean_raw_txt_df(txt_df: pd.DataFrame) -> pd.DataFrame:
     return txt_df
 
 
-def crawl_app_ads(pgdb: PostgresEngine, limit: int | None = 5000) -> None:
-    df = query_pub_domains_to_crawl_ads_txt(
-        pgdb=pgdb, limit=limit, exclude_recent_days=7
-    )
-    logger.info(f"Start crawl app-ads from pub domains: {df.shape[0]:,}")
-    for _i, row in df.iterrows():
-        url = row.url
-        domain_id = row.id
-        scrape_app_ads_url(url=url, domain_id=domain_id, pgdb=pgdb)
-    logger.info("Crawl app-ads from pub domains finished")
-
-
 class ResultDict(TypedDict):
     crawl_result: int
     url: str
 
 
-def scrape_app_ads_url(url: str, domain_id: int, pgdb: PostgresEngine) -> None:
+class AppAdsTxtResult(TypedDict):
+    domain_id: int
+    crawl_result: int
+    crawled_at: datetime.datetime
+    txt_df: pd.DataFrame | None
+
+
+def fetch_app_ads(url: str, domain_id: int) -> AppAdsTxtResult:
+    """Download and parse the app-ads.txt for a single pub domain.
+
+    Never raises, failures are reported with the crawl_result code:
+    1 success, 2 empty after parsing, 3 not found, 4 unknown error.
+    """
     info = f"{url=} scrape app-ads.txt"
     logger.info(f"{info} start")
     result_dict = ResultDict(url=url, crawl_result=4)
+    txt_df = None
     # Get App Ads.txt Text File
     try:
         raw_txt = get_app_ads_text(url)
         raw_txt_df = parse_ads_txt(txt=raw_txt)
-        txt_df = clean_raw_txt_df(txt_df=raw_txt_df.copy())
+        txt_df = clean_raw_txt_df(txt_df=raw_txt_df)
         result_dict["crawl_result"] = 1
     except NoAdsTxtError as error:
         logger.warning(f"{info} ads.txt not found {error}")
@@ -306,81 +372,110 @@ def scrape_app_ads_url(url: str, domain_id: int, pgdb: PostgresEngine) -> None:
             "crawl_result": str(result_dict["crawl_result"]),
         },
     )
-    insert_columns = ["domain_id", "crawl_result", "crawled_at"]
-    pub_domain_df = pd.DataFrame([result_dict])
-    pub_domain_df["domain_id"] = domain_id
-    pub_domain_df["crawl_result"] = pub_domain_df["crawl_result"].astype(int)
-    pub_domain_df["crawled_at"] = datetime.datetime.now(tz=datetime.UTC)
-    pub_domain_df = upsert_df(
-        table_name="adstxt_crawl_results",
-        df=pub_domain_df,
-        insert_columns=insert_columns,
-        key_columns=["domain_id"],
-        pgdb=pgdb,
-        return_rows=True,
+    return AppAdsTxtResult(
+        domain_id=domain_id,
+        crawl_result=result_dict["crawl_result"],
+        crawled_at=datetime.datetime.now(tz=datetime.UTC),
+        txt_df=txt_df,
+    )
+
+
+class AppAdsTxtWriter:
+    """Buffer crawled app-ads.txt results and write them to the db in batches.
+
+    Each flush is a single transaction, so the per-domain db cost is
+    amortized over ``batch_size`` domains.
+    """
+
+    def __init__(self, pgdb: PostgresEngine, batch_size: int = 500) -> None:
+        self.pgdb = pgdb
+        self.batch_size = batch_size
+        self._results: list[AppAdsTxtResult] = []
+
+    def add(self, result: AppAdsTxtResult) -> None:
+        self._results.append(result)
+        if len(self._results) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._results:
+            return
+        results, self._results = self._results, []
+        start = time.perf_counter()
+        map_rows = save_app_ads_results(results=results, pgdb=self.pgdb)
+        elapsed = time.perf_counter() - start
+        rows_per_sec = map_rows / elapsed if elapsed > 0 else 0.0
+        logger.info(
+            f"app-ads.txt flush domains={len(results)} rows={map_rows:,} "
+            f"seconds={elapsed:.2f} rows_per_sec={rows_per_sec:,.0f}"
+        )
+
+
+def crawl_app_ads(
+    pgdb: PostgresEngine,
+    limit: int | None = 5000,
+    workers: int = 1,
+    batch_size: int = 500,
+) -> None:
+    """Crawl app-ads.txt for pub domains with a bounded pool of threads.
+
+    HTTP requests run concurrently in ``workers`` threads while results are
+    written from the calling thread in batches of ``batch_size`` domains.
+    """
+    df = query_pub_domains_to_crawl_ads_txt(
+        pgdb=pgdb, limit=limit, exclude_recent_days=7
     )
-    if result_dict["crawl_result"] != 1:
-        return
-    insert_columns = ["domain_name"]
-    found_domains = txt_df[["domain_name"]].drop_duplicates()
-    domain_df = upsert_df(
-        table_name="domains",
-        df=found_domains,
-        insert_columns=insert_columns,
-        key_columns=["domain_name"],
-        pgdb=pgdb,
-        return_rows=True,
+    logger.info(f"Start crawl app-ads from pub domains: {df.shape[0]:,} {workers=}")
+    writer = AppAdsTxtWriter(pgdb=pgdb, batch_size=batch_size)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(fetch_app_ads, url=row.url, domain_id=row.id)
+            for row in df.itertuples()
+        ]
+        for future in as_completed(futures):
+            writer.add(future.result())
+    writer.flush()
+    logger.info("Crawl app-ads from pub domains finished")
+
+
+def scrape_app_ads_url(url: str, domain_id: int, pgdb: PostgresEngine) -> None:
+    result = fetch_app_ads(url=url, domain_id=domain_id)
+    save_app_ads_results(results=[result], pgdb=pgdb)
+
+
+def save_app_ads_results(results: list[AppAdsTxtResult], pgdb: PostgresEngine) -> int:
+    """Write crawl results and parsed app-ads.txt entries for many pub domains.
+
+    Returns the number of app_ads_map rows written.
+    """
+    crawl_df = pd.DataFrame(
+        [
+            {
+                "domain_id": r["domain_id"],
+                "crawl_result": r["crawl_result"],
+                "crawled_at": r["crawled_at"],
+            }
+            for r in results
+        ]
     )
-    app_df = pd.merge(
-        txt_df,
-        domain_df,
-        how="left",
-        on=["domain_name"],
-        validate="many_to_one",
-    ).rename(columns={"id": "ad_domain"})
-    app_df["pub_domain"] = domain_id
-    insert_columns = [
-        "ad_domain",
+    crawl_df["crawl_result"] = crawl_df["crawl_result"].astype(int)
+    txt_dfs = [
+        r["txt_df"].assign(pub_domain=r["domain_id"])
+        for r in results
+        if r["crawl_result"] == 1 and r["txt_df"] is not None
+    ]
+    entry_columns = [
+        "pub_domain",
+        "domain_name",
         "publisher_id",
         "relationship",
         "certification_auth",
+        "notes",
     ]
-    if "notes" in app_df.columns:
-        insert_columns = [
-            "ad_domain",
-            "publisher_id",
-            "relationship",
-            "certification_auth",
-            "notes",
-        ]
-    key_cols = ["ad_domain", "publisher_id", "relationship"]
-    app_df = app_df.drop_duplicates(subset=key_cols)
-    entrys_df = upsert_df(
-        table_name="app_ads_entrys",
-        df=app_df,
-        insert_columns=insert_columns,
-        key_columns=key_cols,
-        pgdb=pgdb,
-        return_rows=True,
-    )
-    if entrys_df is not None and not entrys_df.empty:
-        entrys_df = entrys_df.rename(columns={"id": "app_ads_entry"})
-        app_df_final = pd.merge(
-            app_df,
-            entrys_df,
-            how="left",
-            on=["ad_domain", "publisher_id", "relationship"],
-            validate="many_to_one",
+    if txt_dfs:
+        entries_df = pd.concat(txt_dfs, ignore_index=True).reindex(
+            columns=entry_columns
         )
-        insert_columns = ["pub_domain", "app_ads_entry"]
-        null_df = app_df_final[app_df_final.app_ads_entry.isna()]
-        if not null_df.empty:
-            logger.warning(f"{null_df=} NULLs in app_ads_entry")
-        upsert_df(
-            table_name="app_ads_map",
-            insert_columns=insert_columns,
-            df=app_df_final,
-            key_columns=insert_columns,
-            pgdb=pgdb,
-        )
-        logger.info(f"{info} finished")
+    else:
+        entries_df = pd.DataFrame(columns=entry_columns)
+    return upsert_app_ads_batch(crawl_df=crawl_df, entries_df=entries_df, pgdb=pgdb)
@@ -1,10 +1,13 @@
 """Get geo data for an ip address."""
 
+import functools
 import pathlib
 import tarfile
 import tempfile
+from collections.abc import Iterable
 
 import geoip2.database
+import pandas as pd
 import requests
 
 from adscrawler.config import GEO_DATA_DIR, get_logger
@@ -15,6 +18,10 @@ GITSQUARED_GEOLITE2_RAW_DATA = "https://raw.githubusercontent.com/GitSquared/nod
 
 MAXMIND_GEO_DBS = ["GeoLite2-City", "GeoLite2-ASN"]
 
+GEO_FIELDS = ["country_iso", "state_iso", "city_name", "org"]
+
+IP_CACHE_SIZE = 100_000
+
 
 def update_geo_dbs(redownload: bool = False) -> None:
     """Update the geo databases."""
@@ -45,11 +52,30 @@ def update_geo_dbs(redownload: bool = False) -> None:
                                 ) as w:
                                     w.write(r.read())
                                 break  # Stop once the target file is written
+    get_geo_readers.cache_clear()
+    lookup_ip.cache_clear()
+
+
+@functools.cache
+def get_geo_readers() -> tuple[geoip2.database.Reader, geoip2.database.Reader]:
+    """City and ASN readers, opened once per process and memory-mapped.
+
+    The maps are read-only, so forked workers share them with the parent.
+    """
+    return (
+        geoip2.database.Reader(
+            f"{GEO_DATA_DIR}/GeoLite2-City.mmdb", mode=geoip2.database.MODE_MMAP
+        ),
+        geoip2.database.Reader(
+            f"{GEO_DATA_DIR}/GeoLite2-ASN.mmdb", mode=geoip2.database.MODE_MMAP
+        ),
+    )
 
 
+@functools.lru_cache(maxsize=IP_CACHE_SIZE)
 def lookup_ip(ip: str) -> dict | None:
     """
-    Lookup ip address.
+    Lookup ip address, cached per ip. Do not modify the returned dict.
 
     Args:
         ip (str): The ip address to lookup.
@@ -58,23 +84,22 @@ def lookup_ip(ip: str) -> dict | None:
         dict: A dictionary containing the geo data for the ip address.
 
     """
+    city_reader, asn_reader = get_geo_readers()
     try:
-        with geoip2.database.Reader(f"{GEO_DATA_DIR}/GeoLite2-City.mmdb") as reader:
-            response = reader.city(ip)
-            country_code = response.country.iso_code
-            country_name = response.country.name
-            state_code = response.subdivisions.most_specific.iso_code
-            state_name = response.subdivisions.most_specific.name
-            city_name = response.city.name
-            zip_code = response.postal.code
-            latitude = response.location.latitude
-            longitude = response.location.longitude
-            cidr = response.traits.network
-
-        with geoip2.database.Reader(f"{GEO_DATA_DIR}/GeoLite2-ASN.mmdb") as reader2:
-            response2 = reader2.asn(ip)
-            asn = response2.autonomous_system_number
-            org = response2.autonomous_system_organization
+        response = city_reader.city(ip)
+        country_code = response.country.iso_code
+        country_name = response.country.name
+        state_code = response.subdivisions.most_specific.iso_code
+        state_name = response.subdivisions.most_specific.name
+        city_name = response.city.name
+        zip_code = response.postal.code
+        latitude = response.location.latitude
+        longitude = response.location.longitude
+        cidr = response.traits.network
+
+        response2 = asn_reader.asn(ip)
+        asn = response2.autonomous_system_number
+        org = response2.autonomous_system_organization
         msg = {
             "country_name": country_name,
             "country_iso": country_code,
@@ -127,3 +152,21 @@ def get_geo(ip: str) -> tuple[str, str, str, str]:
         logger.warning(f"failed to get geo info for {ip}")
         msg = {"country_iso": "", "state_iso": "", "city_name": "", "org": ""}
     return msg
+
+
+def lookup_ips(ips: Iterable[str]) -> pd.DataFrame:
+    """
+    Get geo data for many ip addresses, looking up each unique ip once.
+
+    Args:
+        ips (Iterable[str]): The ip addresses, with repeats and missing values.
+
+    Returns:
+        pd.DataFrame: One row per unique ip, ip_address and the get_geo fields.
+
+    """
+    unique_ips = pd.Series(list(ips), dtype=object).dropna().drop_duplicates()
+    return pd.DataFrame(
+        [{"ip_address": ip, **get_geo(ip)} for ip in unique_ips],
+        columns=["ip_address", *GEO_FIELDS],
+    )
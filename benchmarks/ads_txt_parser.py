@@ -0,0 +1,141 @@
+"""Benchmark the single pass ads.txt parser against the previous csv parser.
+
+Run from the repo root:
+
+    python -m benchmarks.ads_txt_parser --corpus ~/ads-txt-corpus
+
+``--corpus`` is a directory of saved ads.txt / app-ads.txt files. Without it a
+synthetic corpus of large files is generated. Every file is also checked to
+parse to an identical DataFrame with both parsers.
+"""
+
+import argparse
+import csv
+import io
+import pathlib
+import random
+import time
+
+import pandas as pd
+
+from adscrawler.scrape import parse_ads_txt
+
+
+def legacy_parse_ads_txt(txt: str) -> pd.DataFrame:
+    """Previous parser, kept as the reference implementation."""
+    txt = txt.replace(" ", "")
+    csv_header = [
+        "domain",
+        "publisher_id",
+        "relationship",
+        "certification_auth",
+        "notes",
+    ]
+    rows = []
+    input_stream_lines = txt.split("\n")
+    output_stream = ""
+    for line in input_stream_lines:
+        if not line or line[0] == "#":
+            continue
+        else:
+            output_stream = output_stream + line + "\n"
+    for row in csv.DictReader(
+        io.StringIO(output_stream),
+        delimiter=",",
+        fieldnames=csv_header[:-1],
+        restkey=csv_header[-1],
+        quoting=csv.QUOTE_NONE,
+    ):
+        if len(row) == 4:
+            rows.append(
+                [
+                    row["domain"],
+                    row["publisher_id"],
+                    row["relationship"],
+                    row["certification_auth"],
+                ],
+            )
+        elif len(row) > 4:
+            rows.append(
+                [
+                    row["domain"],
+                    row["publisher_id"],
+                    row["relationship"],
+                    row["certification_auth"],
+                    ",".join(row["notes"]),
+                ],
+            )
+        else:
+            rows.append([row["domain"], row["publisher_id"], row["relationship"]])
+    if pd.DataFrame(rows).shape[1] == len(csv_header) - 1:
+        df = pd.DataFrame(rows, columns=csv_header[:-1])
+    else:
+        df = pd.DataFrame(rows, columns=csv_header)
+    return df
+
+
+def make_synthetic_corpus(num_files: int, lines_per_file: int) -> list[str]:
+    rng = random.Random(42)
+    ad_domains = [f"adnetwork{i}.com" for i in range(300)]
+    corpus = []
+    for _ in range(num_files):
+        lines = ["# ads.txt generated for benchmarking", "OWNERDOMAIN=example.com"]
+        for i in range(lines_per_file):
+            domain = rng.choice(ad_domains)
+            relationship = rng.choice(["DIRECT", "RESELLER", "direct"])
+            fields = [domain, f"pub-{rng.randint(1, 10**9)}", relationship]
+            if rng.random() < 0.7:
+                fields.append(f"{rng.getrandbits(64):x}")
+            if rng.random() < 0.05:
+                fields.extend(["note", "extra"])
+            line = ", ".join(fields)
+            if rng.random() < 0.05:
+                line += " # inline comment"
+            lines.append(line)
+            if i % 500 == 0:
+                lines.extend(["", f"# section {i}"])
+        corpus.append("\r\n".join(lines) if rng.random() < 0.5 else "\n".join(lines))
+    return corpus
+
+
+def time_parser(parser, corpus: list[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for txt in corpus:
+            parser(txt)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", type=pathlib.Path, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--num-files", type=int, default=5)
+    parser.add_argument("--lines-per-file", type=int, default=40_000)
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = [
+            path.read_text(encoding="utf-8", errors="replace")
+            for path in sorted(args.corpus.iterdir())
+            if path.is_file()
+        ]
+    else:
+        corpus = make_synthetic_corpus(args.num_files, args.lines_per_file)
+
+    for txt in corpus:
+        pd.testing.assert_frame_equal(parse_ads_txt(txt), legacy_parse_ads_txt(txt))
+
+    total_mb = sum(len(txt.encode("utf-8")) for txt in corpus) / 1e6
+    legacy_s = time_parser(legacy_parse_ads_txt, corpus, args.repeat)
+    new_s = time_parser(parse_ads_txt, corpus, args.repeat)
+    print(f"files={len(corpus)} size={total_mb:.1f}MB outputs identical")
+    print(f"legacy  {legacy_s:8.3f}s {total_mb / legacy_s:8.1f} MB/s")
+    print(f"current {new_s:8.3f}s {total_mb / new_s:8.1f} MB/s")
+    print(f"speedup {legacy_s / new_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Benchmark cohort_active_users against the self merge it replaced.
+
+Run from the repo root:
+
+    python -m benchmarks.cohort_retention --apps 100000 --weeks 180
+
+Synthetic apps get ``--weeks`` weekly rows each, some weeks missing, spread
+over a handful of retention benchmarks. The self merge builds O(weeks²) rows
+per app, which does not fit in memory at 100k apps, so it only runs on the
+first ``--legacy-apps`` apps and is extrapolated linearly per app. Both paths
+must agree on those apps to a relative tolerance of 1e-9.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from adscrawler.process.app_metrics_history import (
+    MAU_MULT,
+    WAU_MULT,
+    cohort_active_users,
+)
+
+
+def make_cohorts(apps: int, weeks: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    week_starts = pd.date_range("2023-01-02", periods=weeks, freq="W-MON")
+    store_app = np.repeat(np.arange(apps), weeks)
+    df = pd.DataFrame(
+        {
+            "store_app": store_app,
+            "week_start": np.tile(week_starts, apps),
+            "installs_diff": rng.uniform(0, 1e5, apps * weeks),
+        }
+    )
+    # ~5% of weeks missing, like apps that were not crawled that week
+    df = df[rng.random(len(df)) > 0.05].reset_index(drop=True)
+    d7 = np.array([0.25, 0.2, 0.15, 0.1, 0.05, np.nan])
+    d30 = np.array([0.12, 0.1, 0.07, 0.04, 0.02, np.nan])
+    benchmark = df["store_app"].to_numpy() % len(d7)
+    df["d7"] = d7[benchmark]
+    df["k"] = np.log(d30[benchmark] / d7[benchmark]) / np.log(30.0 / 7.0)
+    return df
+
+
+def legacy_active_users(cohorts: pd.DataFrame) -> pd.DataFrame:
+    """The self merge previously in calculate_derived_metrics."""
+    cohorts = cohorts.merge(
+        cohorts[["store_app", "week_start", "installs_diff"]],
+        on="store_app",
+        suffixes=("", "_historical"),
+    )
+    cohorts = cohorts[cohorts["week_start"] >= cohorts["week_start_historical"]]
+    cohorts["weeks_passed"] = (
+        (cohorts["week_start"] - cohorts["week_start_historical"]).dt.days / 7
+    ).astype(int)
+    for col, mult in [("surviving_users", WAU_MULT), ("surviving_mau", MAU_MULT)]:
+        retention_rate = np.where(
+            cohorts["weeks_passed"] == 0,
+            1.0,
+            (
+                cohorts["d7"]
+                * mult
+                * (cohorts["weeks_passed"].replace(0, 1) ** cohorts["k"])
+            ).clip(upper=1.0),
+        )
+        cohorts[col] = cohorts["installs_diff_historical"] * retention_rate
+    return (
+        cohorts.groupby(["store_app", "week_start"])[
+            ["surviving_users", "surviving_mau"]
+        ]
+        .sum()
+        .reset_index()
+        .rename(columns={"surviving_users": "wau", "surviving_mau": "mau"})
+    )
+
+
+def measure(func, *args) -> tuple[pd.DataFrame, float, float]:  # noqa: ANN001
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / 1024**2
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apps", type=int, default=100_000)
+    parser.add_argument("--weeks", type=int, default=180)
+    parser.add_argument("--legacy-apps", type=int, default=500)
+    args = parser.parse_args()
+
+    cohorts = make_cohorts(args.apps, args.weeks)
+    current, current_s, current_mb = measure(cohort_active_users, cohorts)
+
+    subset = cohorts[cohorts["store_app"] < args.legacy_apps]
+    legacy, legacy_s, legacy_mb = measure(legacy_active_users, subset)
+    merged = subset.join(current).merge(
+        legacy, on=["store_app", "week_start"], suffixes=("", "_legacy")
+    )
+    assert len(merged) == len(subset)
+    for col in ["wau", "mau"]:
+        np.testing.assert_allclose(merged[col], merged[f"{col}_legacy"], rtol=1e-9)
+
+    scale = args.apps / args.legacy_apps
+    print(f"apps={args.apps:,} weeks={args.weeks} rows={len(cohorts):,}")
+    print(f"legacy on {args.legacy_apps:,} apps: {legacy_s:8.2f}s {legacy_mb:10.0f}MB")
+    print(
+        f"legacy extrapolated:      {legacy_s * scale:8.2f}s {legacy_mb * scale:10.0f}MB"
+    )
+    print(f"current:                  {current_s:8.2f}s {current_mb:10.0f}MB")
+    print(
+        f"speedup {legacy_s * scale / current_s:.1f}x "
+        f"memory {legacy_mb * scale / current_mb:.1f}x less, outputs match"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark CountryResolver against the per-address resolve_country_id.
+
+Run from the repo root:
+
+    python -m benchmarks.country_resolver --limit 100000
+
+By default countries and developer addresses are read from the database
+(``app_country_evidence.raw_address``). ``--countries-csv`` and
+``--addresses`` (one address per line) allow running from exported files.
+Every address must resolve to the same country id with both paths.
+"""
+
+import argparse
+import pathlib
+import time
+
+import pandas as pd
+
+from adscrawler.app_stores.utils import (
+    CountryResolver,
+    build_name_to_alpha2,
+    resolve_country_id,
+)
+from adscrawler.dbcon.connection import get_db_connection
+from adscrawler.dbcon.queries import query_countries
+
+
+def load_inputs(args: argparse.Namespace) -> tuple[pd.DataFrame, pd.Series]:
+    pgdb = None
+    if args.countries_csv is None or args.addresses is None:
+        pgdb = get_db_connection(config_key=args.config_key)
+    if args.countries_csv:
+        countries_df = pd.read_csv(args.countries_csv, keep_default_na=False)
+    else:
+        countries_df = query_countries(pgdb)
+    if args.addresses:
+        lines = args.addresses.read_text(encoding="utf-8").splitlines()
+        addresses = pd.Series(lines[: args.limit])
+    else:
+        addresses = pd.read_sql(
+            f"SELECT raw_address FROM app_country_evidence LIMIT {int(args.limit)}",
+            pgdb.engine,
+        )["raw_address"]
+    return countries_df, addresses
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config-key", default="madrone")
+    parser.add_argument("--countries-csv", type=pathlib.Path, default=None)
+    parser.add_argument("--addresses", type=pathlib.Path, default=None)
+    parser.add_argument("--limit", type=int, default=100_000)
+    args = parser.parse_args()
+
+    countries_df, addresses = load_inputs(args)
+
+    start = time.perf_counter()
+    resolver = CountryResolver(countries_df)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_ids = resolver.resolve_many(addresses)
+    new_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    # Same maps build_country_map makes from query_countries
+    country_id_map = {
+        str(row["alpha2"]).strip().upper(): int(row["id"])
+        for _, row in countries_df.iterrows()
+    }
+    name_to_alpha2 = build_name_to_alpha2(countries_df)
+    legacy_ids = pd.Series(
+        [
+            resolve_country_id(address, country_id_map, name_to_alpha2)
+            for address in addresses
+        ],
+        index=addresses.index,
+        dtype="Int64",
+    )
+    legacy_s = time.perf_counter() - start
+
+    mismatches = addresses[new_ids.fillna(-1) != legacy_ids.fillna(-1)]
+    assert mismatches.empty, f"{len(mismatches)} mismatches, ie {mismatches.head()}"
+    print(
+        f"addresses={len(addresses):,} unique={addresses.nunique():,} "
+        f"resolved={int(new_ids.notna().sum()):,} outputs identical"
+    )
+    print(f"build   {build_s:8.3f}s")
+    print(f"legacy  {legacy_s:8.3f}s {len(addresses) / legacy_s:10.0f} addr/s")
+    print(f"current {new_s:8.3f}s {len(addresses) / new_s:10.0f} addr/s")
+    print(f"speedup {legacy_s / new_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
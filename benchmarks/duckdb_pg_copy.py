@@ -0,0 +1,150 @@
+"""Benchmark streaming a DuckDB query into Postgres with COPY.
+
+Run from the repo root against a scratch database (a throwaway table named
+``bench_duckdb_pg_copy`` is created and dropped):
+
+    python -m benchmarks.duckdb_pg_copy --config-key madrone --rows 5000000
+
+A synthetic query shaped like ``swap_matched_app_sdks_todb`` plus a text
+column is copied once through the previous TSV stream, which rewrote every
+field in Python, and once through ``stream_duckdb_csv``. Each COPY runs in the
+transaction that creates its table, like the FREEZE COPY in
+``atomic_swap_partition_stream``. The numeric columns must match. The TSV
+stream wrote pyarrow's quoted strings into a text format COPY, so its text
+column arrives wrapped in quotes, ie an empty string as ``""``.
+"""
+
+import argparse
+import io
+import time
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+import duckdb
+import pyarrow.csv as pa_csv
+from psycopg import sql
+
+from adscrawler.dbcon.atomic_swap import _copy_stream_to_table_freeze
+from adscrawler.dbcon.connection import PostgresEngine, get_db_connection
+from adscrawler.process.storage import get_duckdb_connection, stream_duckdb_csv
+
+TABLE = "bench_duckdb_pg_copy"
+COLUMNS = ["store_app", "version_code_id", "version_code_created_at", "sdk_id", "note"]
+
+
+def make_query(rows: int) -> str:
+    return f"""
+        SELECT
+            (i % 500000)::BIGINT AS store_app,
+            i::BIGINT AS version_code_id,
+            TIMESTAMP '2026-01-01' + to_seconds(i % 10000000) AS version_code_created_at,
+            (i % 400)::INT AS sdk_id,
+            CASE i % 3 WHEN 0 THEN NULL WHEN 1 THEN '' ELSE 'sdk ' || (i % 97) END AS note
+        FROM range({rows}) t(i)
+    """
+
+
+def legacy_stream_duckdb_tsv(query: str) -> Iterator[str]:
+    """The stream_duckdb_tsv previously in process.storage."""
+    with get_duckdb_connection("s3") as duckdb_con:
+        record_batch_reader = duckdb_con.sql(query).fetch_arrow_reader(
+            batch_size=100_000
+        )
+        write_options = pa_csv.WriteOptions(include_header=False, delimiter="\t")
+        for batch in record_batch_reader:
+            out_stream = io.BytesIO()
+            pa_csv.write_csv(batch, out_stream, write_options=write_options)
+            chunk_str = out_stream.getvalue().decode("utf-8")
+            fixed_lines = []
+            for line in chunk_str.split("\n"):
+                if not line:
+                    continue
+                fields = line.split("\t")
+                fields = [f if f != "" else "\\N" for f in fields]
+                fixed_lines.append("\t".join(fields))
+            yield "\n".join(fixed_lines) + ("\n" if fixed_lines else "")
+
+
+def legacy_copy(
+    stream: Iterable[str], columns: list[str], id_table: sql.Identifier, cursor: Any
+) -> None:
+    col_list = sql.SQL(", ").join([sql.Identifier(c) for c in columns])
+    copy_query = sql.SQL(
+        "COPY {} ({}) FROM STDIN WITH (FREEZE, FORMAT text, NULL '\\N')"
+    ).format(id_table, col_list)
+    with cursor.copy(copy_query) as copy:
+        for chunk in stream:
+            copy.write(chunk)
+
+
+def run_copy(pgdb: PostgresEngine, query: str, legacy: bool) -> float:
+    id_table = sql.Identifier(TABLE)
+    with pgdb.get_driver_connection(autocommit=False) as (conn, cur):
+        with conn.transaction():
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(id_table))
+            cur.execute(
+                sql.SQL("""
+                    CREATE TABLE {} (
+                        store_app bigint,
+                        version_code_id bigint,
+                        version_code_created_at timestamp,
+                        sdk_id integer,
+                        note text
+                    )
+                """).format(id_table)
+            )
+            start = time.perf_counter()
+            if legacy:
+                legacy_copy(legacy_stream_duckdb_tsv(query), COLUMNS, id_table, cur)
+            else:
+                _copy_stream_to_table_freeze(
+                    stream_duckdb_csv(query), COLUMNS, id_table, cur
+                )
+            return time.perf_counter() - start
+
+
+def table_summary(pgdb: PostgresEngine) -> tuple:
+    with pgdb.get_cursor() as cur:
+        cur.execute(f"""
+            SELECT count(*), count(note), count(*) FILTER (WHERE note = ''),
+                sum(store_app), sum(sdk_id), max(version_code_created_at)
+            FROM {TABLE}
+        """)
+        return cur.fetchone()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config-key", default="madrone")
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    args = parser.parse_args()
+
+    pgdb = get_db_connection(config_key=args.config_key)
+    query = make_query(args.rows)
+    expected = duckdb.sql(f"""
+        SELECT count(*), count(note), count(*) FILTER (WHERE note = '')
+        FROM ({query})
+    """).fetchone()
+    try:
+        legacy_s = run_copy(pgdb, query, legacy=True)
+        legacy = table_summary(pgdb)
+        current_s = run_copy(pgdb, query, legacy=False)
+        current = table_summary(pgdb)
+    finally:
+        with pgdb.get_cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    assert current[:3] == expected, (current, expected)
+    assert legacy[:2] == expected[:2], (legacy, expected)
+    assert current[3:] == legacy[3:], (current, legacy)
+    print(f"rows={args.rows:,}")
+    print(f"tsv stream: {legacy_s:8.2f}s {args.rows / legacy_s:12,.0f} rows/s")
+    print(f"csv stream: {current_s:8.2f}s {args.rows / current_s:12,.0f} rows/s")
+    print(
+        f"empty strings: expected {expected[2]:,} tsv {legacy[2]:,} csv {current[2]:,}"
+    )
+    print(f"speedup {legacy_s / current_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
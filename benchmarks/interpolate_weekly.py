@@ -0,0 +1,205 @@
+"""Benchmark the interpolated weekly query against its correlated subquery form.
+
+Run from the repo root:
+
+    python -m benchmarks.interpolate_weekly --apps 5000 --countries 4 --weeks 26
+
+Writes synthetic weekly hash bucket parquet files to a temp directory, laid
+out like agg-data/app-hash-buckets-weekly, with some weeks missing and crawls
+on random weekdays. select_app_hash_buckets_interpolated is timed against the
+query it replaced, which found the previous crawl of every target Monday with
+a correlated ``SELECT MAX(observed_at)``. Both must return identical rows.
+"""
+
+import argparse
+import datetime
+import pathlib
+import tempfile
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from adscrawler.process.app_metrics_history import (
+    STAR_COLS,
+    _get_store_metrics_config,
+    select_app_hash_buckets_interpolated,
+)
+
+
+def legacy_select(
+    store: int,
+    weekly_parquet_paths: list[str],
+    query_start_mon: datetime.date,
+    delete_start_mon: datetime.date,
+    end_date: datetime.date,
+) -> str:
+    """The query previously in write_app_hash_buckets_interpolated_to_s3."""
+    config = _get_store_metrics_config(store)
+    metrics = config["metrics"]
+    interpolated_metrics = "\n".join(
+        f"MIN_BY({metric}, observed_at) OVER w_future AS {metric}_y2,"
+        for metric in metrics
+    )
+    return f"""
+    WITH
+        weekly_data AS (
+            SELECT
+                store_id,
+                country,
+                week_start,
+                days_since_monday,
+                CAST(week_start + days_since_monday AS DATE) AS observed_at,
+                {",".join(metrics)},
+                store_last_updated
+            FROM read_parquet({weekly_parquet_paths}, union_by_name=true)
+        ),
+        target_mondays AS (
+            SELECT CAST(range AS DATE) AS week_start
+            FROM range(
+                DATE '{query_start_mon}',
+                DATE '{end_date}' + INTERVAL 7 DAY,
+                INTERVAL 7 DAY
+            )
+        ),
+        anchors AS (
+            SELECT
+                store_id,
+                country,
+                week_start,
+                days_since_monday,
+                observed_at,
+                {",".join(metrics)},
+                store_last_updated,
+                {interpolated_metrics}
+                MIN(observed_at) OVER w_future AS x2,
+                MAX_BY(store_last_updated, observed_at) OVER w_past_inclusive AS store_last_updated_carry
+            FROM weekly_data
+            WINDOW
+                w_future AS (PARTITION BY store_id, country
+                             ORDER BY observed_at
+                             ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING),
+                w_past_inclusive AS (PARTITION BY store_id, country
+                                     ORDER BY observed_at
+                                     ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+        ),
+        interpolated AS (
+        SELECT
+            dims.store_id,
+            left(md5(dims.store_id), 2) AS hash_bucket,
+            dims.country,
+            m.week_start,
+            {config["coalesce_metrics"]}
+            COALESCE(a_exact.store_last_updated, a_prev.store_last_updated_carry) AS store_last_updated
+        FROM (SELECT DISTINCT store_id, country FROM weekly_data) dims
+        CROSS JOIN target_mondays m
+        LEFT JOIN anchors a_exact
+                ON a_exact.store_id      = dims.store_id
+                AND a_exact.country       = dims.country
+                AND a_exact.observed_at = m.week_start
+        LEFT JOIN anchors a_prev
+                ON a_prev.store_id      = dims.store_id
+                AND a_prev.country       = dims.country
+                AND a_prev.observed_at = (
+                        SELECT MAX(observed_at)
+                        FROM weekly_data
+                        WHERE store_id      = dims.store_id
+                        AND country       = dims.country
+                        AND observed_at < m.week_start
+                    )
+        WHERE a_exact.{metrics[0]} IS NOT NULL
+            OR (a_prev.observed_at IS NOT NULL AND a_prev.x2 IS NOT NULL)
+        )
+        SELECT * FROM interpolated
+        WHERE week_start >= DATE '{delete_start_mon}'
+        ORDER BY store_id, country, week_start
+    """
+
+
+def write_weekly_files(
+    root: pathlib.Path,
+    apps: int,
+    countries: int,
+    week_starts: pd.DatetimeIndex,
+    seed: int = 0,
+) -> list[str]:
+    rng = np.random.default_rng(seed)
+    store_ids = np.array([f"com.example.app{i}" for i in range(apps)])
+    country_codes = np.array(["US", "DE", "BR", "JP", "IN", "GB"][:countries])
+    paths = []
+    for week_start in week_starts:
+        df = pd.DataFrame(
+            {
+                "store_id": np.repeat(store_ids, countries),
+                "country": np.tile(country_codes, apps),
+            }
+        )
+        # Apps are not crawled every week
+        df = df[rng.random(len(df)) > 0.3].reset_index(drop=True)
+        n = len(df)
+        base = np.arange(n) * 1000 + (week_start - week_starts[0]).days * 10
+        df["installs"] = base + rng.integers(0, 100, n)
+        df["rating"] = rng.uniform(1, 5, n)
+        df["rating_count"] = base // 10 + rng.integers(0, 10, n)
+        df["review_count"] = base // 100
+        for col in STAR_COLS:
+            df[col] = rng.integers(0, 1000, n)
+        df.loc[rng.random(n) < 0.05, "installs"] = None
+        df["store_last_updated"] = rng.integers(0, 10**9, n)
+        df.loc[rng.random(n) < 0.2, "store_last_updated"] = None
+        df["days_since_monday"] = rng.integers(0, 7, n).astype("int32")
+        path = root / f"hash_bucket=00/week_start={week_start.date()}/data_0.parquet"
+        path.parent.mkdir(parents=True)
+        df.to_parquet(path)
+        paths.append(str(path))
+    return paths
+
+
+def timed(con: duckdb.DuckDBPyConnection, query: str) -> tuple[pd.DataFrame, float]:
+    start = time.perf_counter()
+    df = con.sql(query).df()
+    return df, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apps", type=int, default=5_000)
+    parser.add_argument("--countries", type=int, default=4)
+    parser.add_argument("--weeks", type=int, default=26)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    end_date = datetime.date(2026, 3, 15)
+    week_starts = pd.date_range(
+        end=pd.Timestamp(end_date), periods=args.weeks, freq="W-MON"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_weekly_files(
+            pathlib.Path(tmp), args.apps, args.countries, week_starts
+        )
+        kwargs = {
+            "store": 1,
+            "weekly_parquet_paths": paths,
+            "query_start_mon": week_starts[0].date(),
+            "delete_start_mon": week_starts[len(week_starts) // 2].date(),
+            "end_date": end_date,
+        }
+        query = select_app_hash_buckets_interpolated(**kwargs)
+        con = duckdb.connect()
+        con.execute(f"SET threads = {args.threads}")
+        legacy, legacy_s = timed(con, legacy_select(**kwargs))
+        current, current_s = timed(con, query)
+
+    pd.testing.assert_frame_equal(current, legacy)
+    print(
+        f"apps={args.apps:,} countries={args.countries} weeks={args.weeks} "
+        f"rows out={len(current):,}"
+    )
+    print(f"correlated subquery: {legacy_s:8.2f}s")
+    print(f"asof join:           {current_s:8.2f}s")
+    print(f"speedup {legacy_s / current_s:.1f}x, outputs match")
+
+
+if __name__ == "__main__":
+    main()
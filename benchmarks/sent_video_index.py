@@ -0,0 +1,97 @@
+"""Benchmark finding the source flows of creatives in a MITM log.
+
+Run from the repo root:
+
+    python -m benchmarks.sent_video_index --flows 3000 --creatives 300
+
+A synthetic log has ``--flows`` responses of a few KB each, JSON ad
+responses holding creative URLs mixed with unrelated API and tracking
+payloads. Every creative is looked up once with the scan of all response
+bodies ``find_sent_video_df`` does without an index, and once through a
+``SentVideoIndex`` built for the log, build time included. Both must return
+the same rows for every creative.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from adscrawler.mitm_ad_parser.mitm_scrape_ads import (
+    SentVideoIndex,
+    find_sent_video_df,
+)
+
+
+def make_log(flows: int, creatives: int, seed: int = 0) -> tuple[pd.DataFrame, list]:
+    rng = np.random.default_rng(seed)
+    video_ids = [
+        "".join(rng.choice(list("abcdef0123456789"), 24)) for _ in range(creatives)
+    ]
+    bodies = []
+    for i in range(flows):
+        if i % 5 == 0:
+            ads = rng.choice(video_ids, 3)
+            body = {
+                "ads": [
+                    {
+                        "creative": f"https://cdn.example.com/v/{video_id}.mp4",
+                        "click": f"https://track.example.com/c?id={i}&cid={video_id}",
+                        "html": "<div>" + "x" * 500 + "</div>",
+                    }
+                    for video_id in ads
+                ]
+            }
+        else:
+            body = {
+                "events": [
+                    {"name": f"event_{j}", "value": float(rng.random())}
+                    for j in range(60)
+                ],
+                "token": "".join(rng.choice(list("ABCDEFabcdef0123456789"), 400)),
+            }
+        bodies.append(json.dumps(body))
+    df = pd.DataFrame(
+        {
+            "response_text": bodies,
+            "called_at": pd.date_range("2026-01-01", periods=flows, freq="s"),
+        }
+    )
+    return df, video_ids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flows", type=int, default=3_000)
+    parser.add_argument("--creatives", type=int, default=300)
+    args = parser.parse_args()
+
+    df, video_ids = make_log(args.flows, args.creatives)
+    row = pd.Series({"called_at": df["called_at"].iloc[len(df) // 2]})
+
+    start = time.perf_counter()
+    scanned = [find_sent_video_df(df, row, video_id) for video_id in video_ids]
+    scan_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = SentVideoIndex(df, video_ids)
+    build_s = time.perf_counter() - start
+    indexed = [find_sent_video_df(df, row, video_id, index) for video_id in video_ids]
+    index_s = time.perf_counter() - start
+
+    for expected, result in zip(scanned, indexed, strict=True):
+        if expected is None:
+            assert result is None
+        else:
+            pd.testing.assert_frame_equal(result, expected)
+    body_mb = df["response_text"].str.len().sum() / 1024**2
+    print(f"flows={args.flows:,} creatives={args.creatives:,} bodies={body_mb:.1f}MB")
+    print(f"scan per creative: {scan_s:8.2f}s")
+    print(f"index:             {index_s:8.2f}s (build {build_s:.2f}s)")
+    print(f"speedup {scan_s / index_s:.1f}x, outputs match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Benchmark the COPY based bulk mode of upsert_df / update_from_df.
+
+Run from the repo root against a scratch database (a throwaway table named
+``bench_upsert_df`` is created and dropped):
+
+    python -m benchmarks.upsert_df --config-key madrone --sizes 1000 10000 100000
+
+For each size the table is seeded with half of the rows, then the full frame
+is upserted (half inserts, half updates) and finally updated, once with the
+current per-row path and once with ``bulk=True``. Both paths must leave the
+table in the same state, and the bulk path must return exactly one row per
+affected key.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from adscrawler.dbcon.connection import PostgresEngine, get_db_connection
+from adscrawler.dbcon.queries import update_from_df, upsert_df
+
+TABLE = "bench_upsert_df"
+KEY_COLUMNS = ["store", "store_id"]
+VALUE_COLUMNS = ["name", "rating", "installs"]
+
+
+def reset_table(pgdb: PostgresEngine) -> None:
+    with pgdb.get_cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cur.execute(f"""
+            CREATE TABLE {TABLE} (
+                id serial PRIMARY KEY,
+                store smallint NOT NULL,
+                store_id text NOT NULL,
+                name text,
+                rating double precision,
+                installs bigint,
+                UNIQUE (store, store_id)
+            )
+            """)
+
+
+def make_frame(size: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "store": np.arange(size) % 2 + 1,
+            "store_id": [f"com.example.app{i}" for i in range(size)],
+            "name": [f"App {i} v{seed}" for i in range(size)],
+            "rating": rng.uniform(1, 5, size).round(3),
+            "installs": rng.integers(0, 10**9, size),
+        }
+    )
+
+
+def table_state(pgdb: PostgresEngine) -> pd.DataFrame:
+    df = pd.read_sql(
+        f"SELECT store, store_id, name, rating, installs FROM {TABLE}", pgdb.engine
+    )
+    return df.sort_values(KEY_COLUMNS).reset_index(drop=True)
+
+
+def run_path(pgdb: PostgresEngine, size: int, bulk: bool) -> dict:
+    reset_table(pgdb)
+    upsert_df(
+        df=make_frame(size // 2, seed=0),
+        table_name=TABLE,
+        key_columns=KEY_COLUMNS,
+        insert_columns=KEY_COLUMNS + VALUE_COLUMNS,
+        pgdb=pgdb,
+        bulk=True,
+    )
+    timings = {}
+    start = time.perf_counter()
+    upserted = upsert_df(
+        df=make_frame(size, seed=1),
+        table_name=TABLE,
+        key_columns=KEY_COLUMNS,
+        insert_columns=KEY_COLUMNS + VALUE_COLUMNS,
+        return_rows=True,
+        pgdb=pgdb,
+        bulk=bulk,
+    )
+    timings["upsert"] = time.perf_counter() - start
+    start = time.perf_counter()
+    updated = update_from_df(
+        df=make_frame(size, seed=2),
+        table_name=TABLE,
+        key_columns=KEY_COLUMNS,
+        update_columns=VALUE_COLUMNS,
+        return_rows=True,
+        pgdb=pgdb,
+        bulk=bulk,
+    )
+    timings["update"] = time.perf_counter() - start
+    if bulk:
+        assert len(upserted) == size, f"{len(upserted)=} {size=}"
+        assert len(updated) == size, f"{len(updated)=} {size=}"
+    return {"timings": timings, "state": table_state(pgdb)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config-key", default="madrone")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    pgdb = get_db_connection(config_key=args.config_key)
+    try:
+        for size in args.sizes:
+            current = run_path(pgdb, size, bulk=False)
+            bulk = run_path(pgdb, size, bulk=True)
+            pd.testing.assert_frame_equal(current["state"], bulk["state"])
+            for step in ["upsert", "update"]:
+                current_s = current["timings"][step]
+                bulk_s = bulk["timings"][step]
+                print(
+                    f"{size=:>7} {step:<6} current={current_s:8.3f}s "
+                    f"bulk={bulk_s:8.3f}s speedup={current_s / bulk_s:6.1f}x"
+                )
+    finally:
+        with pgdb.get_cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        pgdb.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
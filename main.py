@@ -35,6 +35,7 @@ from adscrawler.process.app_metrics_history import (
     delete_and_aggregate_s3_agg,
 )
 from adscrawler.process.app_rankings import import_ranks_from_s3
+from adscrawler.process.storage import configure_duckdb
 from adscrawler.process.version_details import (
     compact_incoming_version_details,
     map_version_details,
@@ -132,7 +133,31 @@ class ProcessManager:
             "--workers",
             default="1",
             type=str,
-            help="Number of workers to use for updating app store details",
+            help="Number of workers to use for updating app store details or crawling app-ads.txt",
+        )
+        parser.add_argument(
+            "--memory-budget-gb",
+            type=float,
+            default=None,
+            help="Memory per worker for --daily-s3-imports hash bucket processing, also caps --workers to fit in RAM",
+        )
+        parser.add_argument(
+            "--duckdb-threads",
+            type=int,
+            default=None,
+            help="DuckDB threads for this process, defaults to storage DUCKDB_SETTINGS",
+        )
+        parser.add_argument(
+            "--duckdb-memory-limit",
+            type=str,
+            default=None,
+            help="DuckDB memory_limit for this process, ie 6GB",
+        )
+        parser.add_argument(
+            "--scrape-concurrency",
+            type=int,
+            default=None,
+            help="Apps each worker scrapes at once when updating app store details, defaults to crawl-settings scrape_concurrency",
         )
         parser.add_argument(
             "--country-priority-group",
@@ -216,6 +241,11 @@ class ProcessManager:
             type=str,
             default="week",
         )
+        parser.add_argument(
+            "--version-details-full-rebuild",
+            help="Rebuild the version details aggregates from all raw data instead of merging only new data",
+            action="store_true",
+        )
         parser.add_argument(
             "--refresh-metadata",
             help="Refresh company metadata (logos, LinkedIn, country, GitHub)",
@@ -381,6 +411,11 @@ class ProcessManager:
 
         store = STORES_MAP.get(platform) if platform else None
 
+        configure_duckdb(
+            threads=self.args.duckdb_threads,
+            memory_limit=self.args.duckdb_memory_limit,
+        )
+
         if self.args.new_apps_check:
             self.scrape_new_apps(store)
 
@@ -489,7 +524,12 @@ class ProcessManager:
 
         for store in [1, 2]:
             try:
-                delete_and_aggregate_s3_agg(store=store, pgdb=self.pgcon)
+                delete_and_aggregate_s3_agg(
+                    store=store,
+                    pgdb=self.pgcon,
+                    workers=int(self.args.workers),
+                    memory_budget_gb=self.args.memory_budget_gb,
+                )
             except Exception:
                 logger.exception(f"Importing {store=} app metrics from s3 for failed")
 
@@ -504,7 +544,10 @@ class ProcessManager:
             logger.exception("Exporting combined domain history to s3 failed")
 
         try:
-            map_version_details(pgdb=self.pgcon)
+            map_version_details(
+                pgdb=self.pgcon,
+                full_rebuild=self.args.version_details_full_rebuild,
+            )
         except Exception:
             logger.exception("Syncing version details to Postgres failed")
 
@@ -588,10 +631,15 @@ class ProcessManager:
             process_icon=self.args.process_icons,
             country_priority_group=self.args.country_priority_group,
             limit=self.args.limit_query_rows,
+            concurrency=self.args.scrape_concurrency,
         )
 
     def crawl_app_ads(self) -> None:
-        crawl_app_ads(self.pgcon, limit=self.args.limit_query_rows)
+        crawl_app_ads(
+            self.pgcon,
+            limit=self.args.limit_query_rows,
+            workers=int(self.args.workers),
+        )
 
     def download_apks(self, store: int) -> None:
         if self.args.store_id:
@@ -1814,7 +1814,7 @@ CREATE TABLE adtech.url_redirect_chains (
     run_id integer NOT NULL,
     api_call_id integer NOT NULL,
     url_id integer NOT NULL,
-    next_url_id integer NOT NULL,
+    next_url_id integer,
     hop_index integer NOT NULL,
     is_chain_start boolean DEFAULT false,
     is_chain_end boolean DEFAULT false,
@@ -6497,7 +6497,7 @@ CREATE INDEX sdk_paths_path_pattern_trgm_idx ON adtech.sdk_paths USING gin (lowe
 -- Name: url_redirect_chains_unique_idx; Type: INDEX; Schema: adtech; Owner: postgres
 --
 
-CREATE UNIQUE INDEX url_redirect_chains_unique_idx ON adtech.url_redirect_chains USING btree (run_id, api_call_id, url_id, next_url_id);
+CREATE UNIQUE INDEX url_redirect_chains_unique_idx ON adtech.url_redirect_chains USING btree (run_id, api_call_id, url_id, next_url_id) NULLS NOT DISTINCT;
 
 
 --
@@ -0,0 +1,146 @@
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+import fakeredis
+import redis
+
+from adscrawler.app_stores import rate_limit
+from adscrawler.app_stores.rate_limit import (
+    RECOVERY_SECONDS,
+    SEARCH_REQUEST_WEIGHT,
+    RedisTokenBucket,
+    StoreRateLimiter,
+)
+from adscrawler.config import CONFIG
+
+
+class TestStoreRateLimiter(unittest.TestCase):
+    @patch("adscrawler.app_stores.rate_limit.time.sleep")
+    @patch("adscrawler.app_stores.rate_limit.time.monotonic", return_value=0.0)
+    def test_wait_spaces_requests_per_storefront(
+        self, _mock_monotonic, mock_sleep
+    ) -> None:
+        limiter = StoreRateLimiter(min_interval={1: 0.2, 2: 0.5})
+
+        limiter.wait(1, "us")
+        limiter.wait(1, "US")
+        limiter.wait(1, "de")
+        limiter.wait(2, "us")
+
+        mock_sleep.assert_called_once_with(0.2)
+
+    @patch("adscrawler.app_stores.rate_limit.time.sleep")
+    @patch("adscrawler.app_stores.rate_limit.time.monotonic", return_value=0.0)
+    def test_penalize_holds_back_whole_storefront(
+        self, _mock_monotonic, mock_sleep
+    ) -> None:
+        limiter = StoreRateLimiter(min_interval={2: 0.5})
+
+        limiter.penalize(2, "us", 3.0)
+        slept = limiter.wait(2, "us")
+        limiter.wait(2, "gb")
+
+        self.assertEqual(slept, 3.0)
+        mock_sleep.assert_called_once_with(3.0)
+
+    @patch("adscrawler.app_stores.rate_limit.time.sleep")
+    @patch("adscrawler.app_stores.rate_limit.time.monotonic", return_value=0.0)
+    def test_weight_holds_storefront_for_several_intervals(
+        self, _mock_monotonic, mock_sleep
+    ) -> None:
+        limiter = StoreRateLimiter(min_interval={1: 0.2})
+
+        limiter.wait(1, "us", weight=SEARCH_REQUEST_WEIGHT)
+        limiter.wait(1, "us")
+
+        mock_sleep.assert_called_once_with(0.2 * SEARCH_REQUEST_WEIGHT)
+
+
+@patch("adscrawler.app_stores.rate_limit.time.sleep")
+class TestRedisTokenBucket(unittest.TestCase):
+    def setUp(self) -> None:
+        # Two workers with their own clients on one shared Redis server
+        self.server = fakeredis.FakeServer()
+        self.workers = [
+            RedisTokenBucket(
+                fakeredis.FakeRedis(server=self.server),
+                rates={1: 4.0, 2: 2.0},
+                fallback=StoreRateLimiter(min_interval={1: 0.25, 2: 0.5}),
+            )
+            for _ in range(2)
+        ]
+
+    def test_budget_is_shared_between_workers(self, mock_sleep) -> None:
+        one, two = self.workers
+
+        waits = [worker.wait(1, "us") for worker in [one, two, one, two, one]]
+
+        # Burst of one second at 4/s, then tokens are reserved 0.25s apart
+        self.assertEqual(waits[:4], [0, 0, 0, 0])
+        self.assertAlmostEqual(waits[4], 0.25, delta=0.05)
+        self.assertEqual(one.wait(1, "de"), 0)
+        self.assertEqual(mock_sleep.call_count, 1)
+
+    def test_block_shrinks_rate_for_whole_cluster(self, _mock_sleep) -> None:
+        one, two = self.workers
+
+        one.penalize(2, "us", seconds=3.0)
+        state = fakeredis.FakeRedis(server=self.server).hgetall("store_rate:2:us")
+
+        self.assertEqual(float(state[b"rate"]), 1.0)
+        self.assertGreaterEqual(two.wait(2, "us"), 3.0)
+        self.assertEqual(two.wait(2, "gb"), 0)
+
+    def test_rate_recovers_after_block(self, _mock_sleep) -> None:
+        one, _two = self.workers
+        client = fakeredis.FakeRedis(server=self.server)
+        one.penalize(1, "us", seconds=1.0)
+        one.penalize(1, "us", seconds=1.0)
+        self.assertEqual(float(client.hget("store_rate:1:us", "rate")), 1.0)
+
+        client.hset("store_rate:1:us", "ts", time.time() - RECOVERY_SECONDS)
+        one.wait(1, "us")
+
+        self.assertEqual(float(client.hget("store_rate:1:us", "rate")), 4.0)
+
+    def test_weighted_requests_use_more_budget(self, _mock_sleep) -> None:
+        one, two = self.workers
+
+        # A weight 4 search spends the whole one second burst at 4/s
+        self.assertEqual(one.wait(1, "us", weight=4), 0)
+        self.assertAlmostEqual(two.wait(1, "us"), 0.25, delta=0.05)
+        self.assertAlmostEqual(one.wait(1, "us", weight=2), 0.75, delta=0.05)
+
+    def test_falls_back_to_local_limiter(self, _mock_sleep) -> None:
+        client = Mock()
+        client.register_script.return_value = Mock(
+            side_effect=redis.ConnectionError("down")
+        )
+        fallback = Mock()
+        fallback.wait.return_value = 0.5
+        bucket = RedisTokenBucket(client, rates={1: 4.0}, fallback=fallback)
+
+        self.assertEqual(bucket.wait(1, "us"), 0.5)
+        bucket.penalize(1, "us", seconds=2.0)
+
+        fallback.wait.assert_called_once_with(1, "us", weight=1.0)
+        fallback.penalize.assert_called_once_with(1, "us", 2.0)
+
+
+class TestClusterRateLimiter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.addCleanup(setattr, rate_limit, "_cluster_limiter", None)
+        rate_limit._cluster_limiter = None
+
+    @patch("redis.from_url")
+    def test_redis_section_without_url(self, mock_from_url) -> None:
+        with patch.dict(CONFIG, {"redis": {}}):
+            limiter = rate_limit.get_cluster_rate_limiter()
+
+        self.assertIsInstance(limiter, RedisTokenBucket)
+        self.assertEqual(mock_from_url.call_args.args, ("redis://127.0.0.1:6379/0",))
+
+
+if __name__ == "__main__":
+    unittest.main()
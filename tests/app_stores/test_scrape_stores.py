@@ -1,10 +1,18 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import pandas as pd
+from appgoblin_itunes_scraper.exceptions import TemporaryBlockException
+from appgoblin_play_scraper.exceptions import ExtraHTTPError
 
 from adscrawler.app_stores.process_icons import build_icon_update_df
-from adscrawler.app_stores.scrape_stores import extract_domains_with_sub
+from adscrawler.app_stores.rate_limit import SEARCH_REQUEST_WEIGHT
+from adscrawler.app_stores.scrape_stores import (
+    _search_with_retries,
+    check_and_insert_domains,
+    extract_domains_with_sub,
+    process_scrape_apps_and_save,
+)
 
 
 class TestBuildIconUpdateDf(unittest.TestCase):
@@ -38,6 +46,79 @@ class TestBuildIconUpdateDf(unittest.TestCase):
         self.assertEqual(result.iloc[1]["id"], 2)
 
 
+class TestCheckAndInsertDomains(unittest.TestCase):
+    @patch("adscrawler.app_stores.scrape_stores.resolve_domain_ids")
+    def test_subdomains_link_to_resolved_root(self, mock_resolve):
+        def resolve(df, pgdb):
+            out = df[["domain_name"]].copy()
+            out["id"] = [10 + i for i in range(len(df))]
+            out["root_domain_id"] = df.get("root_domain_id")
+            out["created"] = True
+            return out
+
+        mock_resolve.side_effect = resolve
+        apps_df = pd.DataFrame(
+            {
+                "url": ["a.example.com", "example.com", "b.example.com"],
+                "root_url": ["example.com", "example.com", "example.com"],
+            }
+        )
+
+        result = check_and_insert_domains(apps_df=apps_df, pgdb=None)
+
+        roots_df, subs_df = (c.args[0] for c in mock_resolve.call_args_list)
+        self.assertEqual(roots_df["domain_name"].tolist(), ["example.com"])
+        self.assertEqual(
+            subs_df["domain_name"].tolist(), ["a.example.com", "b.example.com"]
+        )
+        self.assertEqual(subs_df["root_domain_id"].tolist(), [10, 10])
+        self.assertEqual(len(result), 3)
+
+
+class TestProcessScrapeAppsAndSave(unittest.TestCase):
+    @patch("adscrawler.app_stores.scrape_stores.log_crawl_results")
+    @patch("adscrawler.app_stores.scrape_stores.app_details_to_s3")
+    @patch("adscrawler.app_stores.scrape_stores.get_db_connection")
+    @patch("adscrawler.app_stores.scrape_stores.scrape_app")
+    def test_concurrent_matches_serial(
+        self, mock_scrape_app, _mock_db, mock_to_s3, _mock_log
+    ):
+        def scrape(store, store_id, country, language, **kwargs):
+            if store_id == "com.example.bad":
+                raise ValueError("boom")
+            return {
+                "crawl_result": 1,
+                "crawled_at": pd.Timestamp("2026-01-01", tz="UTC"),
+                "store_id": store_id,
+                "country": country.upper(),
+            }
+
+        mock_scrape_app.side_effect = scrape
+        df_chunk = pd.DataFrame(
+            {
+                "store_app": range(20),
+                "store_id": [f"com.example.app{i}" for i in range(19)]
+                + ["com.example.bad"],
+                "country_code": ["US", "DE"] * 10,
+                "language": ["EN"] * 20,
+            }
+        )
+
+        results = []
+        for concurrency in [1, 4]:
+            process_scrape_apps_and_save(
+                df_chunk=df_chunk, store=1, concurrency=concurrency
+            )
+            results.append(mock_to_s3.call_args.args[0])
+
+        serial_df, concurrent_df = results
+        pd.testing.assert_frame_equal(serial_df, concurrent_df)
+        self.assertEqual(concurrent_df["store_app_db_id"].tolist(), list(range(19)))
+        limiters = [c.kwargs["rate_limiter"] for c in mock_scrape_app.call_args_list]
+        self.assertIsNone(limiters[0])
+        self.assertIsNotNone(limiters[-1])
+
+
 class TestExtractDomains(unittest.TestCase):
     def test_extract_domains_hardcoded_values(self) -> None:
         cases = [
@@ -69,5 +150,42 @@ class TestExtractDomains(unittest.TestCase):
                 self.assertEqual(result, expected)
 
 
+@patch("adscrawler.app_stores.scrape_stores.time.sleep")
+class TestSearchWithRetries(unittest.TestCase):
+    def test_block_penalizes_storefront_instead_of_sleeping(self, mock_sleep) -> None:
+        rate_limiter = Mock()
+        # search_play_store wraps the block of its last strategy
+        wrapped = RuntimeError("All Play Store search strategies failed")
+        wrapped.__cause__ = ExtraHTTPError("429")
+        search = Mock(side_effect=[wrapped, TemporaryBlockException(), ["app"]])
+
+        result = _search_with_retries(search, 1, "us", rate_limiter)
+
+        self.assertEqual(result, ["app"])
+        mock_sleep.assert_not_called()
+        self.assertEqual(
+            [c.args for c in rate_limiter.penalize.call_args_list],
+            [(1, "us", 0.5), (1, "us", 1.0)],
+        )
+        rate_limiter.wait.assert_called_with(1, "us", weight=SEARCH_REQUEST_WEIGHT)
+        self.assertEqual(rate_limiter.wait.call_count, 3)
+
+    def test_other_errors_sleep_and_raise(self, mock_sleep) -> None:
+        rate_limiter = Mock()
+        search = Mock(side_effect=ValueError("bad response"))
+
+        with self.assertRaises(ValueError):
+            _search_with_retries(search, 2, "us", rate_limiter)
+
+        self.assertEqual([c.args for c in mock_sleep.call_args_list], [(0.5,), (1.0,)])
+        rate_limiter.penalize.assert_not_called()
+
+    def test_without_rate_limiter_block_sleeps(self, mock_sleep) -> None:
+        search = Mock(side_effect=[TemporaryBlockException(), ["app"]])
+
+        self.assertEqual(_search_with_retries(search, 2, "us", None), ["app"])
+        mock_sleep.assert_called_once_with(0.5)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+import pandas as pd
+
+from adscrawler.app_stores.utils import (
+    CountryResolver,
+    build_name_to_alpha2,
+    resolve_country_id,
+)
+
+
+def make_countries_df() -> pd.DataFrame:
+    rows = [
+        (1, "US", "USA", "United States", "Vereinigte Staaten"),
+        (2, "OM", "OMN", "Oman", "Oman"),
+        (3, "RO", "ROU", "Romania", "Rumänien"),
+        (4, "GN", "GIN", "Guinea", "Guinea"),
+        (5, "PG", "PNG", "Papua New Guinea", "Papua-Neuguinea"),
+        (6, "NE", "NER", "Niger", "Niger"),
+        (7, "NG", "NGA", "Nigeria", "Nigeria"),
+        (8, "DE", "DEU", "Germany", "Deutschland"),
+    ]
+    return pd.DataFrame(rows, columns=["id", "alpha2", "alpha3", "langen", "langde"])
+
+
+class TestCountryResolver(unittest.TestCase):
+    addresses = [
+        "1 Main St, Bucharest, Romania",
+        "Port Moresby, Papua New Guinea",
+        "Lagos NIGERIA",
+        "Berlin, DEU",
+        "Acme GmbH, 10115 Berlin, DE",
+        "Kyiv, Ukraine",
+        "Muscat, Oman",
+        "nowhere",
+        "",
+    ]
+
+    def test_resolve_many_matches_resolve_country_id(self) -> None:
+        countries_df = make_countries_df()
+        resolver = CountryResolver(countries_df)
+        country_id_map = dict(
+            zip(countries_df["alpha2"], countries_df["id"], strict=True)
+        )
+        name_to_alpha2 = build_name_to_alpha2(countries_df)
+
+        expected = [
+            resolve_country_id(a, country_id_map, name_to_alpha2)
+            for a in self.addresses
+        ]
+        result = resolver.resolve_many(pd.Series(self.addresses + [None]))
+
+        pd.testing.assert_series_equal(
+            result[:-1], pd.Series(expected, dtype="Int64"), check_names=False
+        )
+        self.assertEqual(expected[:5], [3, 5, 7, 8, 8])
+        self.assertTrue(pd.isna(result.iloc[-1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from adscrawler.dbcon import cache
+from adscrawler.dbcon.connection import PostgresEngine
+
+
+def make_pgdb(config_key: str = "madrone") -> PostgresEngine:
+    pgdb = PostgresEngine.__new__(PostgresEngine)
+    pgdb.config_key = config_key
+    return pgdb
+
+
+class TestReferenceCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.query = Mock(side_effect=lambda pgdb, store=None: object())
+        self.query.__name__ = "query_things"
+        self.cached = cache.reference_cache(ttl=60, maxsize=2, tables=("things",))(
+            lambda pgdb, store=None: self.query(pgdb, store)
+        )
+        self.addCleanup(cache._CACHES.remove, self.cached)
+
+    def test_positional_and_keyword_calls_share_an_entry(self) -> None:
+        first = self.cached(make_pgdb(), 1)
+        second = self.cached(store=1, pgdb=make_pgdb())
+
+        self.assertIs(first, second)
+        self.assertEqual(self.query.call_count, 1)
+        self.assertEqual(self.cached.cache_info()["hits"], 1)
+
+    @patch("adscrawler.dbcon.cache.time.monotonic")
+    def test_entries_expire_after_ttl(self, mock_monotonic) -> None:
+        mock_monotonic.return_value = 0.0
+        self.cached(make_pgdb())
+        mock_monotonic.return_value = 61.0
+        self.cached(make_pgdb())
+
+        self.assertEqual(self.query.call_count, 2)
+
+    def test_maxsize_evicts_least_recently_used(self) -> None:
+        pgdb = make_pgdb()
+        for store in [1, 2, 1, 3]:
+            self.cached(pgdb, store)
+        self.cached(pgdb, 1)
+
+        self.assertEqual(self.query.call_count, 3)
+        self.assertEqual(self.cached.cache_info()["currsize"], 2)
+
+    def test_invalidate_tables_and_prime(self) -> None:
+        pgdb = make_pgdb()
+        self.cached(pgdb)
+        cache.invalidate_tables("other")
+        self.cached(pgdb)
+        self.assertEqual(self.query.call_count, 1)
+
+        cache.invalidate_tables("things")
+        self.cached(pgdb)
+        self.assertEqual(self.query.call_count, 2)
+
+        primed = object()
+        self.cached.prime(primed, pgdb=pgdb)
+        self.assertIs(self.cached(pgdb), primed)
+
+
+if __name__ == "__main__":
+    unittest.main()
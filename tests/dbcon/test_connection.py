@@ -0,0 +1,63 @@
+import unittest
+from unittest.mock import patch
+
+from adscrawler.dbcon import connection
+
+TEST_CONFIG = {
+    "testdb": {
+        "host": "db.example.com",
+        "db": "appgoblin",
+        "db_user": "tester",
+        "db_password": "secret",
+    }
+}
+
+
+class TestGetDbConnection(unittest.TestCase):
+    def setUp(self) -> None:
+        connection._ENGINES.clear()
+        self.addCleanup(connection._ENGINES.clear)
+
+    @patch.dict(connection.CONFIG, TEST_CONFIG)
+    def test_engine_is_built_once_per_process(self) -> None:
+        first = connection.get_db_connection("testdb")
+        second = connection.get_db_connection("testdb")
+
+        self.assertIs(first, second)
+        self.assertIsInstance(first.engine.pool, connection.TimedQueuePool)
+        self.assertEqual(first.pool_status()["size"], connection.POOL_SIZE)
+
+    @patch.dict(connection.CONFIG, TEST_CONFIG)
+    def test_reset_after_fork_drops_engines(self) -> None:
+        first = connection.get_db_connection("testdb")
+
+        connection._reset_after_fork()
+
+        self.assertIsNot(connection.get_db_connection("testdb"), first)
+
+
+class TestSSHTunnel(unittest.TestCase):
+    def make_tunnel(self) -> connection.SSHTunnel:
+        return connection.SSHTunnel(
+            host="db.example.com",
+            os_user="tester",
+            ssh_port=22,
+            remote_port=5432,
+            ssh_pkey=None,
+            ssh_pkey_password=None,
+        )
+
+    @patch("adscrawler.dbcon.connection.asyncssh.connect")
+    def test_start_raises_when_first_connect_fails(self, mock_connect) -> None:
+        mock_connect.side_effect = OSError("connection refused")
+
+        with self.assertRaises(OSError):
+            self.make_tunnel().start(timeout=5)
+
+    def test_wait_ready_times_out_while_down(self) -> None:
+        with self.assertRaises(ConnectionError):
+            self.make_tunnel().wait_ready(timeout=0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
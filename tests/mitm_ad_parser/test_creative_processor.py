@@ -0,0 +1,180 @@
+import io
+import pathlib
+import shutil
+import subprocess
+import tempfile
+import types
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from adscrawler.mitm_ad_parser import creative_processor as cp
+
+
+def random_phashes(rng: np.random.Generator, count: int) -> list[str]:
+    return [f"{int(value):016x}" for value in rng.integers(0, 2**63, count)]
+
+
+class TestPhashIndex(unittest.TestCase):
+    def test_find_near_matches_brute_force(self) -> None:
+        rng = np.random.default_rng(0)
+        phashes = random_phashes(rng, 2000)
+        # Near and exact duplicates of a few assets
+        for phash in phashes[:50]:
+            flipped = int(phash, 16) ^ (1 << int(rng.integers(0, 64)))
+            phashes.append(f"{flipped:016x}")
+        phashes += phashes[:10]
+        index = cp.PhashIndex(max_distance=12)
+        index.update(
+            pd.DataFrame(
+                {
+                    "md5_hash": [f"md5-{i}" for i in range(len(phashes))] + ["none"],
+                    "phash": [*phashes, None],
+                }
+            )
+        )
+
+        self.assertEqual(len(index), len(phashes))
+        self.assertEqual(index.get("md5-3"), phashes[3])
+        self.assertIsNone(index.get("none"))
+        for query in phashes[:60] + random_phashes(rng, 20):
+            for max_distance in [0, 2, 12]:
+                expected = {
+                    f"md5-{i}"
+                    for i, phash in enumerate(phashes)
+                    if (int(phash, 16) ^ int(query, 16)).bit_count() <= max_distance
+                }
+                self.assertEqual(set(index.find_near(query, max_distance)), expected)
+
+    def test_replaced_phash(self) -> None:
+        index = cp.PhashIndex()
+        index.add("a", "ffff000000000000")
+        index.add("a", "0000000000000000")
+
+        self.assertEqual(index.find_near("ffff000000000000", 0), [])
+        self.assertEqual(index.find_near("0000000000000000"), ["a"])
+        with self.assertRaises(ValueError):
+            index.find_near("0000000000000000", cp.PHASH_NEAR_DISTANCE + 1)
+
+
+class TestGetPhash(unittest.TestCase):
+    def setUp(self) -> None:
+        self.addCleanup(cp._PHASH_INDEXES.clear)
+        cp._PHASH_INDEXES.clear()
+
+    @patch.object(cp, "query_creative_assets")
+    def test_assets_are_read_once(self, mock_assets) -> None:
+        mock_assets.return_value = pd.DataFrame(
+            {"md5_hash": ["a", "b"], "phash": ["00000000000000ff", None]}
+        )
+        pgdb = types.SimpleNamespace(config_key="test")
+
+        self.assertEqual(cp.get_phash("a", "png", pgdb), "00000000000000ff")
+        cp.get_phash_index(pgdb).update(
+            pd.DataFrame({"md5_hash": ["c"], "phash": ["0f0f0f0f0f0f0f0f"]})
+        )
+        self.assertEqual(cp.get_phash("c", "png", pgdb), "0f0f0f0f0f0f0f0f")
+
+        mock_assets.assert_called_once()
+
+
+class TestSampleFrames(unittest.TestCase):
+    def test_read_ppm_frames(self) -> None:
+        rng = np.random.default_rng(0)
+        images = [
+            Image.fromarray(rng.integers(0, 256, (h, w, 3), dtype=np.uint8))
+            for w, h in [(4, 3), (320, 17), (1, 1)]
+        ]
+        stream = b""
+        for image in images:
+            buffer = io.BytesIO()
+            image.save(buffer, "PPM")
+            stream += buffer.getvalue()
+
+        frames = cp.read_ppm_frames(stream)
+
+        self.assertEqual([f.tobytes() for f in frames], [i.tobytes() for i in images])
+        self.assertEqual(cp.read_ppm_frames(b""), [])
+        with self.assertRaises(ValueError):
+            cp.read_ppm_frames(stream + b"P5 1 1 255 x")
+
+    @patch.object(cp.subprocess, "run")
+    def test_frames_placed_by_timestamp(self, mock_run) -> None:
+        # A GIF frame at 5s is the first frame at or after seconds 1, 3 and 5
+        pts_times = ["0", "5", "10.04"]
+        images = [Image.new("RGB", (640, 360), (i, 0, 0)) for i in range(3)]
+        stream = b""
+        for image in images:
+            buffer = io.BytesIO()
+            image.save(buffer, "PPM")
+            stream += buffer.getvalue()
+        stderr = "".join(
+            f"[Parsed_showinfo_2 @ 0x1] n:{n:4d} pts:{n * 100:7d} pts_time:{t:<8}"
+            " duration:1 fmt:rgb24\n"
+            for n, t in enumerate(pts_times)
+        )
+        mock_run.return_value = subprocess.CompletedProcess(
+            [], 0, stdout=stream, stderr=stderr.encode()
+        )
+        self.addCleanup(cp.get_sample_frames.cache_clear)
+
+        frames = cp.get_sample_frames(pathlib.Path("creative.gif"))
+
+        self.assertEqual(
+            {second: frame.getpixel((0, 0))[0] for second, frame in frames.items()},
+            {0: 0, 1: 1, 3: 1, 5: 1, 10: 2},
+        )
+        self.assertEqual(frames[5].size, (640, 360))
+        self.assertEqual(cp.make_thumbnail(frames[5]).size, (320, 180))
+        with self.assertRaises(ValueError):
+            cp.frames_by_second(images, [0.0])
+
+    @unittest.skipUnless(shutil.which("ffmpeg"), "needs ffmpeg")
+    def test_one_ffmpeg_run_per_video(self) -> None:
+        tmp = pathlib.Path(self.enterContext(tempfile.TemporaryDirectory()))
+        for name, seconds in [("long", 12), ("short", 2)]:
+            subprocess.run(
+                [
+                    "ffmpeg",
+                    "-loglevel",
+                    "error",
+                    "-f",
+                    "lavfi",
+                    "-i",
+                    f"testsrc=duration={seconds}:size=640x360:rate=10",
+                    "-pix_fmt",
+                    "yuv420p",
+                    str(tmp / f"{name}.mp4"),
+                ],
+                check=True,
+            )
+        self.addCleanup(cp.get_sample_frames.cache_clear)
+        self.addCleanup(cp._PHASH_INDEXES.clear)
+        cp._PHASH_INDEXES["test"] = cp.PhashIndex()
+        pgdb = types.SimpleNamespace(config_key="test")
+
+        with (
+            patch.object(cp, "CREATIVE_RAW_DIR", tmp),
+            patch.object(cp, "CREATIVE_THUMBS_DIR", tmp),
+            patch.object(cp.subprocess, "run", wraps=subprocess.run) as run,
+        ):
+            md5_hash = cp.store_creative_and_thumb_to_local(
+                pd.Series({"response_content": (tmp / "long.mp4").read_bytes()}),
+                file_extension="mp4",
+            )
+            phash = cp.get_phash(md5_hash, "mp4", pgdb)
+
+        run.assert_called_once()
+        self.assertEqual(len(phash), 16)
+        self.assertEqual(Image.open(tmp / f"{md5_hash}.jpg").size, (320, 180))
+        frames = cp.get_sample_frames(tmp / f"{md5_hash}.mp4")
+        self.assertEqual(list(frames), list(cp.SAMPLE_SECONDS))
+        self.assertEqual(frames[0].size, (640, 360))
+        self.assertEqual(list(cp.get_sample_frames(tmp / "short.mp4")), [0, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import base64
+import gzip
+import hashlib
+import json
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from adscrawler.config import CONFIG
+from adscrawler.mitm_ad_parser import decrypt_applovin as da
+
+TEST_CONFIG = {
+    "applovin": {
+        "CONST_A": base64.b64encode(b"const-a").decode(),
+        "CONST_B": base64.b64encode(b"const-b").decode(),
+        "C1": da.to_signed_64(0xBF58476D1CE4E5B9),
+        "C2": da.to_signed_64(0x94D049BB133111EB),
+    }
+}
+
+SDK_PREFIX32 = "k" * 32
+
+LENGTHS = [0, 1, 7, 8, 9, 31, 32, 33, 255, 1000, 4099]
+
+# Seeds close to 2**64 make V1's unwrapped seed + counter carry
+SEEDS = [0, 1, 0x0123456789ABCDEF, (1 << 63) - 5, (1 << 64) - 1, (1 << 64) - 2000]
+
+
+def sample_payloads() -> list[bytes]:
+    rng = np.random.default_rng(0)
+    ad = {"ads": [{"package_name": "com.example.game", "html": "<div>" * 200}]}
+    return [
+        rng.integers(0, 256, length, dtype=np.uint8).tobytes() for length in LENGTHS
+    ] + [gzip.compress(json.dumps(ad).encode()), json.dumps(ad).encode()]
+
+
+@patch.dict(CONFIG, TEST_CONFIG)
+class TestXorPermute(unittest.TestCase):
+    def test_matches_byte_by_byte_v2(self) -> None:
+        key = hashlib.sha256(b"digest").digest()
+        for data in sample_payloads():
+            for seed in SEEDS:
+                self.assertEqual(
+                    da.xor_permute_np(data, seed, key),
+                    da.xor_permute(data, seed, key),
+                    (len(data), seed),
+                )
+        for seed in SEEDS:
+            self.assertEqual(
+                da.mix64_blocks(seed, 24).tolist(),
+                [da.mix64(seed, i) for i in (0, 8, 16)],
+            )
+
+    def test_matches_byte_by_byte_v1(self) -> None:
+        key = hashlib.sha256(b"digest").digest()
+        for data in sample_payloads():
+            for seed in SEEDS:
+                self.assertEqual(
+                    da.xor_permute_v1_np(data, seed, key),
+                    bytes(da.xor_permute_v1(data, seed, key)),
+                    (len(data), seed),
+                )
+
+    def test_decodes_v1_and_v2_payloads(self) -> None:
+        text = json.dumps({"ads": [{"package_name": "com.example.game"}]})
+        plain = gzip.compress(text.encode())
+        seed = (1 << 64) - 3
+
+        ckey = hashlib.sha256(
+            (CONFIG["applovin"]["CONST_A"] + SDK_PREFIX32).encode()
+        ).digest()
+        seed_bytes = bytes(
+            a ^ b for a, b in zip(seed.to_bytes(8, "little"), ckey, strict=False)
+        )
+        raw_v1 = seed_bytes + bytes(da.xor_permute_v1(plain, seed, ckey))
+        payload_v1 = base64.b64encode(raw_v1).decode()
+        payload_v1 = payload_v1.replace("+", "-").replace("/", "_").replace("=", "*")
+        self.assertEqual(da.decode_v1_from(payload_v1.encode(), SDK_PREFIX32), text)
+
+        digest = hashlib.sha256(
+            (CONFIG["applovin"]["CONST_B"] + SDK_PREFIX32).encode()
+        ).digest()
+        seed_enc = seed ^ int.from_bytes(digest[:8], "little")
+        blob_v2 = (
+            b"2:sha1:key:"
+            + b"\x00" * 8
+            + seed_enc.to_bytes(8, "little")
+            + da.xor_permute(plain, seed, digest)
+        )
+        self.assertEqual(da.decode_v2_from(blob_v2, SDK_PREFIX32), text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import json
+import pathlib
+import struct
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from mitmproxy import http
+from mitmproxy.io import FlowWriter
+from mitmproxy.test import tflow
+
+from adscrawler.mitm_ad_parser import mitm_logs
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 8 + struct.pack(">II", 320, 320)
+
+
+def make_flow(
+    url: str, body: bytes, content_type: str, content_encoding: str | None = None
+) -> http.HTTPFlow:
+    flow = tflow.tflow(resp=True)
+    flow.request.url = url
+    flow.response.headers["Content-Type"] = content_type
+    if content_encoding:
+        flow.response.headers["Content-Encoding"] = content_encoding
+    flow.response.content = body
+    return flow
+
+
+class TestParseLog(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = patch.object(mitm_logs, "MITM_DIR", pathlib.Path(tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.video = bytes(range(256)) * 400
+        self.ad_response = json.dumps(
+            {
+                "ads": [{"video": "https://c.io/v/abc.mp4"}],
+                "tracking": [f"https://t.example.com/e?i={i}" for i in range(10)],
+            }
+        )
+        self.script = b"var x = 1;\n" * 4000
+        flows = [
+            make_flow(mitm_logs.IGNORE_URLS[0], b"", "text/plain"),
+            make_flow(
+                "https://ads.example.com/bid",
+                self.ad_response.encode(),
+                "application/json; charset=utf-8",
+                content_encoding="gzip",
+            ),
+            make_flow("https://c.io/v/abc.mp4", self.video, "video/mp4"),
+            make_flow("https://c.io/v/def.mp4?x=1", self.video[:1000], ""),
+            make_flow("https://c.io/i/icon.png", PNG + b"\x00" * 60_000, "image/png"),
+            tflow.tflow(),
+            make_flow(
+                "https://cfg.example.com/s", b'{"debug": false}', "application/json"
+            ),
+            make_flow("https://cdn.example.com/app.js", self.script, "text/javascript"),
+            make_flow("https://api.vungle.com/ads", b"ad abc.mp4", "text/plain"),
+        ]
+        with open(pathlib.Path(tmp.name, "traffic_com.example.log"), "wb") as f:
+            writer = FlowWriter(f)
+            for flow in flows:
+                writer.add(flow)
+
+    def test_parses_flows_into_columns(self) -> None:
+        df = mitm_logs.parse_log("com.example", None, pgdb=None, include_all=True)
+
+        self.assertEqual(
+            df["url"].tolist(),
+            [
+                "https://ads.example.com/bid",
+                "https://c.io/v/abc.mp4",
+                "https://c.io/v/def.mp4?x=1",
+                "https://c.io/i/icon.png",
+                "http://address:22/path",
+                "https://cfg.example.com/s",
+                "https://cdn.example.com/app.js",
+                "https://api.vungle.com/ads",
+            ],
+        )
+        self.assertEqual(df.loc[0, "response_text"], self.ad_response)
+        self.assertEqual(df.loc[0, "response_content"], self.ad_response.encode())
+        # Media is kept as bytes only, large bodies as views of a spill file
+        self.assertTrue(df.loc[1:3, "response_text"].isna().all())
+        self.assertIsInstance(df.loc[1, "response_content"], memoryview)
+        self.assertEqual(bytes(df.loc[1, "response_content"]), self.video)
+        self.assertEqual(df.loc[2, "response_content"], self.video[:1000])
+        self.assertEqual(df.loc[1, "response_size_bytes"], len(self.video))
+        self.assertTrue(df.loc[4, ["response_text", "response_content"]].isna().all())
+        self.assertEqual(df["run_id"].unique().tolist(), [-1])
+
+    def test_only_ad_responses_are_decoded(self) -> None:
+        df = mitm_logs.parse_log("com.example", None, pgdb=None, include_all=True)
+
+        # Small or untyped bodies of other hosts keep only their bytes
+        self.assertTrue(df.loc[5:6, "response_text"].isna().all())
+        self.assertEqual(df.loc[5, "response_content"], b'{"debug": false}')
+        self.assertIsInstance(df.loc[6, "response_content"], memoryview)
+        self.assertEqual(bytes(df.loc[6, "response_content"]), self.script)
+        # Known ad networks are decoded whatever their type and size
+        self.assertEqual(df.loc[7, "response_text"], "ad abc.mp4")
+
+    def test_creative_columns_of_spilled_content(self) -> None:
+        df = mitm_logs.parse_log("com.example", None, pgdb=None, include_all=True)
+        df["status_code"] = 200
+        df["tld_url"] = df["tld_url"].where(df.index != 3, "googleusercontent.com")
+
+        df = mitm_logs.add_is_creative_column(mitm_logs.add_file_extension(df))
+
+        self.assertEqual(
+            df["is_creative"].tolist(), [False, True, False, False, False] + [False] * 3
+        )
+
+    def test_metadata_only(self) -> None:
+        df = mitm_logs.parse_log("com.example", None, pgdb=None)
+
+        self.assertEqual(
+            df.columns.tolist(), [*mitm_logs.FLOW_COLUMNS, "run_id", "pub_store_id"]
+        )
+        self.assertEqual(len(df), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
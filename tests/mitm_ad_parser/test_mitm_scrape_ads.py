@@ -0,0 +1,126 @@
+import json
+import pathlib
+import pickle
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from mitmproxy.io import FlowWriter
+
+from adscrawler.mitm_ad_parser import mitm_logs
+from adscrawler.mitm_ad_parser import mitm_scrape_ads as msa
+from adscrawler.mitm_ad_parser.mitm_scrape_ads import (
+    SentVideoIndex,
+    find_sent_video_df,
+)
+from adscrawler.mitm_ad_parser.models import AdInfo
+from tests.mitm_ad_parser.test_mitm_logs import make_flow
+
+
+def make_flows() -> pd.DataFrame:
+    bodies = [
+        json.dumps({"ad": {"video": "https://cdn.example.com/v/abc123.mp4"}}),
+        "<VAST><MediaFile>https://x.2mdn.net/id/abc123xyz/720</MediaFile></VAST>",
+        None,
+        np.nan,
+        "prefix-abc123-suffix",
+        "ABC123 abc12 3abc123",
+        json.dumps({"creative_id": "zz-9911", "url": "https://a.io/zz-9911.webm"}),
+        "",
+        b"abc123 as bytes",
+        "abc123",
+    ]
+    return pd.DataFrame(
+        {
+            "response_text": bodies,
+            "called_at": pd.date_range("2026-01-01", periods=len(bodies), freq="s"),
+            "url": [f"https://example.com/{i}" for i in range(len(bodies))],
+        },
+        index=[10, 11, 12, 13, 14, 15, 16, 17, 18, 10],
+    )
+
+
+class TestSentVideoIndex(unittest.TestCase):
+    def assert_same_as_scan(self, df: pd.DataFrame, video_ids: list[str]) -> None:
+        index = SentVideoIndex(df, video_ids)
+        for video_id in video_ids:
+            for called_at in [df["called_at"].min(), df["called_at"].max()]:
+                row = pd.Series({"called_at": called_at})
+                expected = find_sent_video_df(df, row, video_id)
+                result = find_sent_video_df(df, row, video_id, index)
+                if expected is None:
+                    self.assertIsNone(result, video_id)
+                else:
+                    pd.testing.assert_frame_equal(result, expected)
+
+    def test_matches_scan_of_all_bodies(self) -> None:
+        video_ids = ["abc123", "abc123xyz", "zz-9911", "9911.webm", "nomatch", "nan"]
+        self.assert_same_as_scan(make_flows(), video_ids)
+
+    def test_prefers_responses_before_the_creative(self) -> None:
+        df = make_flows()
+        row = pd.Series({"called_at": df["called_at"].iloc[1]})
+
+        result = find_sent_video_df(df, row, "abc123", SentVideoIndex(df, ["abc123"]))
+
+        self.assertEqual(result["url"].tolist(), df["url"].iloc[:2].tolist())
+
+    def test_random_bodies(self) -> None:
+        rng = np.random.default_rng(0)
+        alphabet = list('abc12-_./":{} ')
+        bodies = [
+            "".join(rng.choice(alphabet, rng.integers(0, 60))) for _ in range(200)
+        ]
+        df = pd.DataFrame(
+            {
+                "response_text": bodies,
+                "called_at": pd.to_datetime(rng.integers(0, 10**9, 200), unit="s"),
+            }
+        )
+        video_ids = {
+            body[i : i + n] for body in bodies[:50] for i, n in [(3, 5), (10, 7)]
+        }
+        video_ids |= {"".join(rng.choice(alphabet[:6], 5)) for _ in range(50)}
+        self.assert_same_as_scan(df, sorted(v for v in video_ids if v))
+
+
+class TestParseStoreIdMitmLog(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = patch.object(mitm_logs, "MITM_DIR", pathlib.Path(tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        flows = [
+            make_flow(
+                "https://ads.example.com/bid", b'{"ads": []}', "application/json"
+            ),
+            make_flow(
+                "https://c.io/v/unsent.mp4", bytes(range(256)) * 400, "video/mp4"
+            ),
+        ]
+        with open(pathlib.Path(tmp.name, "com.example_7.log"), "wb") as f:
+            writer = FlowWriter(f)
+            for flow in flows:
+                writer.add(flow)
+
+    @patch.object(msa, "store_creative_and_thumb_to_local", side_effect=OSError)
+    @patch.object(msa, "parse_creative_request")
+    def test_error_rows_of_spilled_creatives_pickle(
+        self, mock_parse_request, _mock_store
+    ) -> None:
+        mock_parse_request.return_value = (AdInfo(adv_store_id=None), "no adv")
+
+        error_messages = msa.parse_store_id_mitm_log("com.example", 7, pgdb=None)
+
+        rows = [x for x in error_messages if isinstance(x, pd.Series)]
+        self.assertEqual(rows[0]["url"], "https://c.io/v/unsent.mp4")
+        self.assertNotIn("response_content", rows[0])
+        # scan_all_apps gets these back from worker processes
+        self.assertEqual(len(pickle.loads(pickle.dumps(error_messages))), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
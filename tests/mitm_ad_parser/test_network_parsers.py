@@ -0,0 +1,256 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pandas as pd
+
+from adscrawler.mitm_ad_parser import network_parsers as np_
+
+STORE_URL = "https://play.google.com/store/apps/details?id=com.example.game"
+
+# Path to the Location it redirects to, paths not listed answer 200
+REDIRECTS = {
+    "/click/a": "/hop/a1",
+    "/hop/a1": "/hop/a2",
+    "/hop/a2": "/landing",
+    "/click/b": "/landing",
+    "/click/loop": "/hop/loop",
+    "/hop/loop": "/click/loop",
+    "/click/store": STORE_URL,
+    "/click/deep": "market://details?id=com.example.game",
+}
+
+
+class RedirectHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(server.delay)
+        location = REDIRECTS.get(self.path.split("?")[0])
+        if location:
+            self.send_response(302)
+            if location.startswith("/"):
+                location = f"http://{self.headers['Host']}{location}"
+            self.send_header("Location", location)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        with server.lock:
+            server.in_flight -= 1
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class TestRedirectChains(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RedirectHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+        self.server.delay = 0
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        np_._REDIRECT_CHAINS.clear()
+        self.addCleanup(np_._REDIRECT_CHAINS.clear)
+
+    def test_chain_depths_loops_and_stores(self) -> None:
+        chain = np_.get_redirect_chain(f"{self.base}/click/a")
+        self.assertEqual(
+            [(hop["url"], hop["next_url"]) for hop in chain],
+            [
+                (f"{self.base}/click/a", f"{self.base}/hop/a1"),
+                (f"{self.base}/hop/a1", f"{self.base}/hop/a2"),
+                (f"{self.base}/hop/a2", f"{self.base}/landing"),
+            ],
+        )
+        loop = np_.get_redirect_chain(f"{self.base}/click/loop")
+        self.assertEqual(
+            [hop["next_url"] for hop in loop],
+            [f"{self.base}/hop/loop", f"{self.base}/click/loop"],
+        )
+        store = np_.get_redirect_chain(f"{self.base}/click/store")
+        self.assertEqual([hop["next_url"] for hop in store], [STORE_URL])
+        self.assertEqual(np_.get_redirect_chain(f"{self.base}/landing"), [])
+        # Nothing is requested from the store or past the loop
+        self.assertEqual(self.server.requests.count("/click/loop"), 1)
+        self.assertEqual(len(self.server.requests), 4 + 2 + 1 + 1)
+
+    def test_is_store_url(self) -> None:
+        self.assertTrue(np_.is_store_url(STORE_URL))
+        self.assertTrue(np_.is_store_url("https://apps.apple.com/us/app/id123"))
+        self.assertTrue(np_.is_store_url("market://details?id=com.example"))
+        self.assertFalse(np_.is_store_url("https://example.com/play.google.com/store"))
+
+    def test_requests_per_host_are_capped(self) -> None:
+        self.server.delay = 0.05
+        urls = [f"{self.base}/landing?i={i}" for i in range(12)]
+        host_limiter = np_.HostLimiter(per_host=2)
+
+        with np_.ThreadPoolExecutor(max_workers=8) as executor:
+            list(
+                executor.map(
+                    lambda url: np_.get_redirect_chain(url, host_limiter), urls
+                )
+            )
+
+        self.assertEqual(len(self.server.requests), len(urls))
+        self.assertEqual(self.server.max_in_flight, 2)
+
+    @patch.object(np_, "upsert_click_url_redirect_chains")
+    @patch.object(np_, "get_redirect_chains_by_url_hashes")
+    @patch.object(np_, "get_click_url_redirect_chains")
+    def test_batch_resolves_each_url_once(
+        self, mock_run_chains, mock_stored_chains, mock_upsert
+    ) -> None:
+        mock_run_chains.return_value = pd.DataFrame(
+            columns=["api_call_id", "hop_index", "url", "redirect_url"]
+        )
+        stored_url = "https://ads.example.com/click/stored"
+        mock_stored_chains.return_value = pd.DataFrame(
+            {
+                "url_hash": ["x"],
+                "url": [stored_url],
+                "hop_index": [0],
+                "redirect_url": [STORE_URL],
+            }
+        )
+        urls = [
+            f"{self.base}/click/a",
+            f"{self.base}/click/b",
+            f"{self.base}/click/a",
+            f"{self.base}/landing",
+            stored_url,
+        ]
+
+        click_urls = np_.follow_click_url_redirects(urls, 1, 2, pgdb=None)
+
+        self.assertEqual(
+            set(click_urls),
+            {
+                f"{self.base}/click/a",
+                f"{self.base}/hop/a1",
+                f"{self.base}/hop/a2",
+                f"{self.base}/landing",
+                f"{self.base}/click/b",
+                stored_url,
+                STORE_URL,
+            },
+        )
+        self.assertEqual(len(self.server.requests), 4 + 2 + 1)
+        # Stored chains are copied to this api call, all in one write, and
+        # the url without redirects gets a terminal hop
+        mock_upsert.assert_called_once()
+        chain_df = mock_upsert.call_args.args[0]
+        self.assertEqual(len(chain_df), 3 + 1 + 1 + 1)
+        self.assertEqual(
+            chain_df.groupby("url")["hop_index"].max().to_dict(),
+            {
+                f"{self.base}/click/a": 2,
+                f"{self.base}/click/b": 0,
+                f"{self.base}/landing": 0,
+                stored_url: 0,
+            },
+        )
+        landing_hops = chain_df[chain_df["url"] == f"{self.base}/landing"]
+        self.assertTrue(landing_hops["next_url"].isna().all())
+        self.assertEqual(set(chain_df["run_id"]), {1})
+        self.assertEqual(set(chain_df["api_call_id"]), {2})
+
+        # The next api call is served from the process cache
+        mock_stored_chains.reset_mock()
+        np_.follow_click_url_redirects(urls, 1, 3, pgdb=None)
+
+        self.assertEqual(len(self.server.requests), 7)
+        mock_stored_chains.assert_not_called()
+        self.assertEqual(len(mock_upsert.call_args.args[0]), 6)
+
+    @patch.object(np_, "upsert_click_url_redirect_chains")
+    @patch.object(np_, "get_redirect_chains_by_url_hashes")
+    @patch.object(np_, "get_click_url_redirect_chains")
+    def test_stored_empty_chain_is_not_requested(
+        self, mock_run_chains, mock_stored_chains, mock_upsert
+    ) -> None:
+        landing = f"{self.base}/landing"
+        mock_run_chains.return_value = pd.DataFrame(
+            columns=["api_call_id", "hop_index", "url", "redirect_url"]
+        )
+        mock_stored_chains.return_value = pd.DataFrame(
+            {
+                "url_hash": ["x"],
+                "url": [landing],
+                "hop_index": [0],
+                "redirect_url": [None],
+            }
+        )
+
+        click_urls = np_.follow_click_url_redirects([landing], 1, 2, pgdb=None)
+
+        self.assertEqual(click_urls, [])
+        self.assertEqual(self.server.requests, [])
+        chain_df = mock_upsert.call_args.args[0]
+        self.assertEqual(chain_df["url"].to_list(), [landing])
+        self.assertTrue(chain_df["next_url"].isna().all())
+
+        # Already written for this api call, nothing new to write
+        mock_upsert.reset_mock()
+        mock_run_chains.return_value = pd.DataFrame(
+            {
+                "api_call_id": [2],
+                "hop_index": [0],
+                "url": [landing],
+                "redirect_url": [None],
+            }
+        )
+        self.assertEqual(np_.follow_click_url_redirects([landing], 1, 2, pgdb=None), [])
+        mock_upsert.assert_not_called()
+
+    @patch.object(np_, "upsert_df")
+    @patch.object(np_, "upsert_urls")
+    def test_terminal_hop_has_null_next_url_id(
+        self, mock_upsert_urls, mock_upsert_df
+    ) -> None:
+        mock_upsert_urls.return_value = pd.DataFrame(
+            {"url": ["https://a.example", "https://b.example"], "url_id": [1, 2]}
+        )
+        chain_df = pd.DataFrame(
+            {
+                "run_id": [1, 1],
+                "api_call_id": [2, 2],
+                "hop_index": [0, 0],
+                "url": ["https://a.example", "https://b.example"],
+                "next_url": ["https://b.example", None],
+            }
+        )
+
+        np_.upsert_click_url_redirect_chains(chain_df, pgdb=None)
+
+        self.assertEqual(
+            sorted(mock_upsert_urls.call_args.kwargs["urls"]),
+            ["https://a.example", "https://b.example"],
+        )
+        written = mock_upsert_df.call_args.kwargs["df"]
+        self.assertEqual(written["next_url_id"].to_list(), [2, None])
+
+
+class TestGetResponseBytes(unittest.TestCase):
+    def test_spilled_and_stringified_bodies(self) -> None:
+        body = b"\x08\x96\x01"
+        for content in [body, memoryview(bytearray(body)), repr(body)]:
+            self.assertEqual(
+                np_.get_response_bytes({"response_content": content}), body
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""Test helpers that run a process module's S3 reads, writes and deletes in a tmp dir."""
+
+# LocalS3Client takes boto3's keyword argument names
+# ruff: noqa: N803
+
+import io
+import pathlib
+import shutil
+import tempfile
+import types
+import unittest
+from unittest.mock import patch
+
+import duckdb
+from botocore.exceptions import ClientError
+
+from adscrawler.config import CONFIG
+
+
+class LocalDuckDB:
+    """DuckDB connection that writes s3://bucket/ paths to a local directory."""
+
+    def __init__(self, root: pathlib.Path) -> None:
+        self.s3_root = f"s3://{CONFIG['s3']['bucket']}/"
+        self.root = f"{root}/"
+        self.con = duckdb.connect()
+
+    def __enter__(self) -> "LocalDuckDB":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.con.close()
+
+    def execute(self, query: str) -> duckdb.DuckDBPyConnection:
+        return self.con.execute(query.replace(self.s3_root, self.root))
+
+
+class LocalS3Client:
+    """The parts of a boto3 S3 client storage uses, on a local directory."""
+
+    def __init__(self, root: pathlib.Path) -> None:
+        self.root = root
+
+    def get_paginator(self, operation_name: str) -> "LocalS3Client":
+        return self
+
+    def paginate(self, Bucket: str, Prefix: str) -> list[dict]:
+        keys = sorted(
+            p.relative_to(self.root).as_posix()
+            for p in self.root.glob("**/*")
+            if p.is_file()
+        )
+        return [{"Contents": [{"Key": k} for k in keys if k.startswith(Prefix)]}]
+
+    def list_objects_v2(
+        self,
+        Bucket: str,
+        Prefix: str,
+        StartAfter: str = "",
+        Delimiter: str | None = None,
+        **kwargs: object,
+    ) -> dict:
+        contents = [
+            obj
+            for obj in self.paginate(Bucket, Prefix)[0]["Contents"]
+            if obj["Key"] > StartAfter
+        ]
+        if Delimiter is None:
+            return {"Contents": contents}
+        dirs = {
+            Prefix + obj["Key"][len(Prefix) :].split(Delimiter)[0] + Delimiter
+            for obj in contents
+            if Delimiter in obj["Key"][len(Prefix) :]
+        }
+        return {"CommonPrefixes": [{"Prefix": d} for d in sorted(dirs)]}
+
+    def get_object(self, Bucket: str, Key: str) -> dict:
+        path = self.root / Key
+        if not path.exists():
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(path.read_bytes())}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs: object) -> dict:
+        path = self.root / Key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(Body)
+        return {}
+
+    def copy(self, CopySource: dict, Bucket: str, Key: str, **kwargs: object) -> None:
+        path = self.root / Key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(self.root / CopySource["Key"], path)
+
+    def delete_objects(self, Bucket: str, Delete: dict) -> dict:
+        for obj in Delete["Objects"]:
+            (self.root / obj["Key"]).unlink()
+        return {}
+
+
+class LocalS3TestCase(unittest.TestCase):
+    """Runs the S3 reads, writes and deletes of ``module`` in a tmp dir."""
+
+    module: types.ModuleType
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = pathlib.Path(tmp.name)
+        self.s3_client = LocalS3Client(self.root)
+        targets = [("adscrawler.process.storage.get_s3_client", self.get_client)]
+        targets += [
+            (f"{self.module.__name__}.{name}", func)
+            for name, func in [
+                ("get_s3_client", self.get_client),
+                ("get_duckdb_connection", self.connect),
+            ]
+            if hasattr(self.module, name)
+        ]
+        for target, func in targets:
+            patcher = patch(target, side_effect=func)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_client(self, key_name: str = "s3") -> LocalS3Client:
+        return self.s3_client
+
+    def connect(self, s3_config_key: str) -> LocalDuckDB:
+        return LocalDuckDB(self.root)
@@ -0,0 +1,275 @@
+import datetime
+import hashlib
+import unittest
+from unittest.mock import patch
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from adscrawler.process import (
+    AGG_APP_HASH_BUCKETS_DAILY,
+    AGG_APP_HASH_BUCKETS_FILLED,
+    AGG_APP_HASH_BUCKETS_WEEKLY,
+)
+from adscrawler.process import app_metrics_history as amh
+from tests.process.local_s3 import LocalS3TestCase
+
+WEEK_STARTS = [datetime.date(2026, 3, 2), datetime.date(2026, 3, 9)]
+
+
+def hash_bucket_of(store_id: str) -> str:
+    return hashlib.md5(store_id.encode()).hexdigest()[:2]
+
+
+class TestWeeklyAllBuckets(LocalS3TestCase):
+    module = amh
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.write_daily_files()
+
+    def write_daily_files(self) -> None:
+        rng = np.random.default_rng(0)
+        store_ids = [f"com.example.app{i}" for i in range(12)]
+        for day in pd.date_range("2026-03-01", "2026-03-15", freq="D"):
+            for hash_bucket in {hash_bucket_of(x) for x in store_ids}:
+                ids = [x for x in store_ids if hash_bucket_of(x) == hash_bucket]
+                n = len(ids) * 2
+                df = pd.DataFrame(
+                    {
+                        "store_id": ids * 2,
+                        "country": ["US"] * len(ids) + ["DE"] * len(ids),
+                        "crawled_date": day.date(),
+                        "installs": rng.integers(0, 10**6, n),
+                        "rating": rng.uniform(1, 5, n),
+                        "rating_count": rng.integers(0, 10**4, n),
+                        "review_count": rng.integers(0, 10**3, n),
+                        "histogram": [list(rng.integers(0, 100, 5)) for _ in range(n)],
+                        "store_last_updated": rng.integers(0, 10**9, n),
+                        "crawled_at": day + pd.Timedelta(hours=1),
+                    }
+                )
+                path = self.root / (
+                    f"{AGG_APP_HASH_BUCKETS_DAILY}/store=1/hash_bucket={hash_bucket}/"
+                    f"snapshot_date={day.date()}/data_0.parquet"
+                )
+                path.parent.mkdir(parents=True)
+                df.to_parquet(path)
+        # Stale output from an earlier run and an older week that must be kept
+        for week_start in [WEEK_STARTS[0], datetime.date(2026, 2, 23)]:
+            path = self.root / (
+                f"{AGG_APP_HASH_BUCKETS_WEEKLY}/store=1/hash_bucket=zz/"
+                f"week_start={week_start}/data_0.parquet"
+            )
+            path.parent.mkdir(parents=True)
+            pd.DataFrame({"store_id": ["stale"]}).to_parquet(path)
+
+    def read_weekly(self) -> pd.DataFrame:
+        return (
+            duckdb.sql(f"""
+                SELECT * EXCLUDE (store)
+                FROM read_parquet(
+                    '{self.root}/{AGG_APP_HASH_BUCKETS_WEEKLY}/store=1/*/*/*.parquet',
+                    hive_partitioning = true, union_by_name = true
+                )
+                ORDER BY ALL
+                """)
+            .df()
+            .reset_index(drop=True)
+        )
+
+    def test_single_pass_matches_per_bucket(self) -> None:
+        written = amh.make_s3_app_hash_metrics_history_weekly_all(
+            store=1, range_start_mon=WEEK_STARTS[0], range_end=WEEK_STARTS[1]
+        )
+        single_pass = self.read_weekly()
+
+        self.assertEqual(sum(written.values()), 2 * 12 * 2)
+        self.assertEqual(
+            written[(hash_bucket_of("com.example.app0"), "2026-03-02")],
+            len(
+                single_pass[
+                    (single_pass["hash_bucket"] == hash_bucket_of("com.example.app0"))
+                    & (single_pass["week_start"] == pd.Timestamp("2026-03-02"))
+                ]
+            ),
+        )
+        # Stale week was deleted, the older week is untouched
+        self.assertEqual(
+            single_pass.loc[single_pass["hash_bucket"] == "zz", "week_start"].tolist(),
+            [pd.Timestamp("2026-02-23")],
+        )
+
+        for hash_bucket in single_pass["hash_bucket"].unique():
+            for week_start in WEEK_STARTS:
+                amh.make_s3_app_hash_metrics_history_weekly(
+                    store=1,
+                    range_start=week_start,
+                    range_end=week_start + datetime.timedelta(days=6),
+                    hash_bucket=hash_bucket,
+                )
+        pd.testing.assert_frame_equal(self.read_weekly(), single_pass)
+
+
+class TestInterpolatedWeekly(LocalS3TestCase):
+    module = amh
+
+    # (store_id, country, week_start, days_since_monday, installs,
+    #  rating_count, store_last_updated)
+    WEEKLY_ROWS = [
+        ("com.example.a", "US", "2026-01-05", 0, 1000, 10, 100),
+        ("com.example.a", "US", "2026-01-19", 3, 2700, 44, None),
+        ("com.example.a", "US", "2026-01-26", 0, 2500, 30, 300),
+        ("com.example.b", "DE", "2026-01-12", 0, 500, 20, None),
+        ("com.example.b", "DE", "2026-01-26", 0, 400, 10, None),
+    ]
+
+    # Hand computed: Mondays between crawls are interpolated from the last
+    # crawl before them, installs never go down, store_last_updated carries
+    # forward and Mondays after the last crawl are dropped
+    GOLDEN = [
+        ("com.example.a", "US", "2026-01-12", 1700, 24, 100),
+        ("com.example.a", "US", "2026-01-19", 2400, 38, 100),
+        ("com.example.a", "US", "2026-01-26", 2500, 30, 300),
+        ("com.example.b", "DE", "2026-01-12", 500, 20, None),
+        ("com.example.b", "DE", "2026-01-19", 500, 15, None),
+        ("com.example.b", "DE", "2026-01-26", 400, 10, None),
+    ]
+
+    def setUp(self) -> None:
+        super().setUp()
+        rows = pd.DataFrame(
+            self.WEEKLY_ROWS,
+            columns=[
+                "store_id",
+                "country",
+                "week_start",
+                "days_since_monday",
+                "installs",
+                "rating_count",
+                "store_last_updated",
+            ],
+        )
+        rows["days_since_monday"] = rows["days_since_monday"].astype("int32")
+        rows["rating"] = 4.5
+        rows["review_count"] = rows["rating_count"] // 2
+        for col in amh.STAR_COLS:
+            rows[col] = rows["rating_count"]
+        # Stale output for a week in range that must be replaced
+        stale = self.root / (
+            f"{AGG_APP_HASH_BUCKETS_FILLED}/store=1/hash_bucket=00/"
+            "week_start=2026-01-19/data_0.parquet"
+        )
+        stale.parent.mkdir(parents=True)
+        pd.DataFrame({"store_id": ["stale"]}).to_parquet(stale)
+        for week_start, week in rows.groupby("week_start"):
+            path = self.root / (
+                f"{AGG_APP_HASH_BUCKETS_WEEKLY}/store=1/hash_bucket=00/"
+                f"week_start={week_start}/data_0.parquet"
+            )
+            path.parent.mkdir(parents=True)
+            week.drop(columns="week_start").to_parquet(path, index=False)
+
+    def test_matches_golden_output(self) -> None:
+        amh.write_app_hash_buckets_interpolated_to_s3(
+            query_start_mon=datetime.date(2026, 1, 5),
+            delete_start_mon=datetime.date(2026, 1, 12),
+            end_date=datetime.date(2026, 2, 8),
+            store=1,
+            hash_bucket="00",
+        )
+
+        filled = duckdb.sql(f"""
+            SELECT store_id, country, week_start::VARCHAR AS week_start,
+                installs, rating_count, store_last_updated,
+                rating, review_count, five_star, hash_bucket
+            FROM read_parquet(
+                '{self.root}/{AGG_APP_HASH_BUCKETS_FILLED}/store=1/*/*/*.parquet',
+                hive_partitioning = true, union_by_name = true
+            )
+            ORDER BY store_id, country, week_start
+            """).df()
+        golden = pd.DataFrame(
+            self.GOLDEN,
+            columns=[
+                "store_id",
+                "country",
+                "week_start",
+                "installs",
+                "rating_count",
+                "store_last_updated",
+            ],
+        )
+        pd.testing.assert_frame_equal(
+            filled[golden.columns].astype(object), golden.astype(object)
+        )
+        self.assertEqual(filled["rating"].tolist(), [4.5] * len(golden))
+        self.assertEqual(
+            filled["hash_bucket"].tolist(),
+            [hash_bucket_of(x) for x in golden["store_id"]],
+        )
+
+
+class TestCohortActiveUsers(unittest.TestCase):
+    def make_cohorts(self) -> pd.DataFrame:
+        rng = np.random.default_rng(1)
+        weeks = pd.date_range("2026-01-05", periods=30, freq="W-MON")
+        frames = []
+        for store_app in range(60):
+            # Gaps in the weeks must count as weeks passed
+            app_weeks = weeks[np.sort(rng.choice(30, rng.integers(1, 30), False))]
+            d7, k = [(0.2, -0.5), (0.05, -0.3), (np.nan, np.nan)][store_app % 3]
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "store_app": store_app,
+                        "week_start": app_weeks,
+                        "installs_diff": rng.uniform(0, 1e5, len(app_weeks)),
+                        "d7": d7,
+                        "k": k,
+                    }
+                )
+            )
+        return pd.concat(frames, ignore_index=True).sample(frac=1, random_state=2)
+
+    def test_matches_sum_over_earlier_weeks(self) -> None:
+        cohorts = self.make_cohorts()
+
+        result = amh.cohort_active_users(cohorts)
+
+        for row in cohorts.sample(200, random_state=3).itertuples():
+            earlier = cohorts[
+                (cohorts["store_app"] == row.store_app)
+                & (cohorts["week_start"] <= row.week_start)
+            ]
+            weeks_passed = (row.week_start - earlier["week_start"]).dt.days // 7
+            for col, mult in [("wau", amh.WAU_MULT), ("mau", amh.MAU_MULT)]:
+                retention = np.where(
+                    weeks_passed == 0,
+                    1.0,
+                    np.minimum(row.d7 * mult * weeks_passed.clip(lower=1) ** row.k, 1),
+                )
+                expected = np.nansum(earlier["installs_diff"] * retention)
+                self.assertAlmostEqual(
+                    result.loc[row.Index, col], expected, delta=1e-6 * expected
+                )
+
+    def test_chunks_give_same_result(self) -> None:
+        cohorts = self.make_cohorts()
+
+        with patch.object(amh, "COHORT_APP_CHUNK", 7):
+            chunked = amh.cohort_active_users(cohorts)
+
+        pd.testing.assert_frame_equal(chunked, amh.cohort_active_users(cohorts))
+
+    def test_duplicate_weeks_raise(self) -> None:
+        cohorts = self.make_cohorts()
+        cohorts = pd.concat([cohorts, cohorts.iloc[[5]]])
+
+        with self.assertRaises(ValueError):
+            amh.cohort_active_users(cohorts)
+
+
+if __name__ == "__main__":
+    unittest.main()
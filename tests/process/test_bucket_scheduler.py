@@ -0,0 +1,107 @@
+import json
+import pathlib
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from adscrawler.process.bucket_scheduler import (
+    BucketCheckpoint,
+    run_hash_buckets,
+    workers_for_memory,
+)
+
+STAGES = ["weekly", "interpolate"]
+
+
+def record_stage(hash_bucket: str, stage: str, out_dir: str, fail: dict) -> None:
+    """Picklable task, fails the first fail[(hash_bucket, stage)] attempts."""
+    marker = pathlib.Path(out_dir, f"{hash_bucket}-{stage}")
+    attempts = len(list(pathlib.Path(out_dir).glob(f"{marker.name}.*")))
+    pathlib.Path(out_dir, f"{marker.name}.{attempts}").touch()
+    if fail.get((hash_bucket, stage), 0) > attempts:
+        raise ValueError(f"{hash_bucket} {stage} failed")
+    marker.touch()
+
+
+class TestRunHashBuckets(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.out_dir = tmp.name
+        self.checkpoint_path = pathlib.Path(tmp.name, "checkpoints", "run.json")
+
+    def attempts(self, hash_bucket: str, stage: str) -> int:
+        return len(list(pathlib.Path(self.out_dir).glob(f"{hash_bucket}-{stage}.*")))
+
+    def run_buckets(self, fail: dict, workers: int = 1, **kwargs) -> dict:
+        return run_hash_buckets(
+            task=record_stage,
+            stages=STAGES,
+            checkpoint=BucketCheckpoint(self.checkpoint_path),
+            task_kwargs={"out_dir": self.out_dir, "fail": fail},
+            workers=workers,
+            hash_buckets=["00", "01", "02"],
+            **kwargs,
+        )
+
+    def test_failed_bucket_retries_from_failed_stage(self) -> None:
+        failed = self.run_buckets(fail={("01", "interpolate"): 1})
+
+        self.assertEqual(failed, {})
+        self.assertEqual(self.attempts("01", "weekly"), 1)
+        self.assertEqual(self.attempts("01", "interpolate"), 2)
+        self.assertFalse(self.checkpoint_path.exists())
+
+    def test_gives_up_and_keeps_checkpoint(self) -> None:
+        failed = self.run_buckets(fail={("02", "weekly"): 5}, max_retries=1)
+
+        self.assertEqual(list(failed), ["02"])
+        self.assertEqual(self.attempts("02", "weekly"), 2)
+        self.assertEqual(self.attempts("02", "interpolate"), 0)
+        done = json.loads(self.checkpoint_path.read_text())
+        self.assertEqual(done, {"00": STAGES, "01": STAGES})
+
+    def test_resume_skips_finished_stages(self) -> None:
+        self.checkpoint_path.parent.mkdir()
+        self.checkpoint_path.write_text(json.dumps({"00": STAGES, "01": ["weekly"]}))
+
+        failed = self.run_buckets(fail={})
+
+        self.assertEqual(failed, {})
+        self.assertEqual(self.attempts("00", "weekly"), 0)
+        self.assertEqual(self.attempts("00", "interpolate"), 0)
+        self.assertEqual(self.attempts("01", "weekly"), 0)
+        self.assertEqual(self.attempts("01", "interpolate"), 1)
+        self.assertEqual(self.attempts("02", "weekly"), 1)
+
+    def test_process_pool_matches_serial(self) -> None:
+        failed = self.run_buckets(
+            fail={("00", "weekly"): 1, ("02", "interpolate"): 1}, workers=2
+        )
+
+        self.assertEqual(failed, {})
+        for hash_bucket in ["00", "01", "02"]:
+            for stage in STAGES:
+                self.assertTrue(
+                    pathlib.Path(self.out_dir, f"{hash_bucket}-{stage}").exists()
+                )
+        self.assertEqual(self.attempts("00", "weekly"), 2)
+        self.assertEqual(self.attempts("02", "weekly"), 1)
+        self.assertEqual(self.attempts("02", "interpolate"), 2)
+
+    @patch("adscrawler.process.bucket_scheduler.os.sysconf")
+    def test_workers_capped_by_memory_budget(self, mock_sysconf) -> None:
+        # 16GB of RAM
+        mock_sysconf.side_effect = {
+            "SC_PAGE_SIZE": 4096,
+            "SC_PHYS_PAGES": 16 * 1024**3 // 4096,
+        }.get
+
+        self.assertEqual(workers_for_memory(8, None), 8)
+        self.assertEqual(workers_for_memory(8, 6), 2)
+        self.assertEqual(workers_for_memory(8, 32), 1)
+        self.assertEqual(workers_for_memory(2, 4), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
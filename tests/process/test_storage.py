@@ -0,0 +1,200 @@
+import io
+import pathlib
+import unittest
+from unittest.mock import MagicMock, patch
+
+import duckdb
+import pyarrow.csv as pa_csv
+
+from adscrawler.process import storage
+from tests.process.local_s3 import LocalS3TestCase
+
+TEST_CONFIG = {
+    "s3test": {
+        "bucket": "test-bucket",
+        "host": "s3.example.com",
+        "access_key_id": "key'id",
+        "secret_key": "secret",
+        "region_name": "us-west-01",
+    }
+}
+
+
+def plain_database() -> duckdb.DuckDBPyConnection:
+    """_create_duckdb_database without httpfs, which needs network to install."""
+    con = duckdb.connect()
+    storage._apply_duckdb_settings(con)
+    return con
+
+
+class TestGetDuckdbConnection(unittest.TestCase):
+    def setUp(self) -> None:
+        storage._reset_duckdb_after_fork()
+        self.addCleanup(storage._reset_duckdb_after_fork)
+        settings = dict(storage.DUCKDB_SETTINGS)
+        self.addCleanup(storage.DUCKDB_SETTINGS.update, settings)
+        for target, kwargs in [
+            ("_create_duckdb_database", {"side_effect": plain_database}),
+            ("_create_duckdb_secret", {}),
+        ]:
+            patcher = patch.object(storage, target, **kwargs)
+            setattr(self, target, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_database_and_secret_are_built_once_per_process(self) -> None:
+        with storage.get_duckdb_connection("s3test") as first:
+            first.execute("CREATE TABLE shared AS SELECT 42 AS x")
+        with storage.get_duckdb_connection("s3test") as second:
+            self.assertEqual(second.sql("SELECT x FROM shared").fetchall(), [(42,)])
+
+        self._create_duckdb_database.assert_called_once()
+        self._create_duckdb_secret.assert_called_once()
+
+    def test_cursors_per_task_are_independent(self) -> None:
+        first = storage.get_duckdb_connection("s3test")
+        second = storage.get_duckdb_connection("s3test")
+        first.execute("CREATE TEMP TABLE task AS SELECT 1 AS x")
+
+        with self.assertRaises(duckdb.CatalogException):
+            second.sql("SELECT * FROM task")
+        first.close()
+        self.assertEqual(second.sql("SELECT 1").fetchall(), [(1,)])
+        second.close()
+
+    def test_configure_duckdb_applies_to_open_database(self) -> None:
+        storage.get_duckdb_connection("s3test").close()
+
+        storage.configure_duckdb(threads=2, memory_limit="1GB")
+
+        with storage.get_duckdb_connection("s3test") as con:
+            threads, memory_limit = con.sql(
+                "SELECT current_setting('threads'), current_setting('memory_limit')"
+            ).fetchone()
+        self.assertEqual(threads, 2)
+        self.assertIn(memory_limit, {"1.0 GB", "953.6 MiB"})
+
+    def test_reset_after_fork_builds_new_database(self) -> None:
+        storage.get_duckdb_connection("s3test").close()
+
+        storage._reset_duckdb_after_fork()
+        storage.get_duckdb_connection("s3test").close()
+
+        self.assertEqual(self._create_duckdb_database.call_count, 2)
+        self.assertEqual(self._create_duckdb_secret.call_count, 2)
+
+
+class TestCreateDuckdbSecret(unittest.TestCase):
+    @patch.dict(storage.CONFIG, TEST_CONFIG)
+    @patch.object(storage, "get_s3_endpoint", return_value="http://127.0.0.1:9000")
+    def test_secret_is_quoted_and_scoped_to_bucket(self, _endpoint) -> None:
+        con = MagicMock()
+
+        storage._create_duckdb_secret(con, "s3test")
+
+        query = con.execute.call_args.args[0]
+        self.assertTrue(query.startswith("CREATE OR REPLACE SECRET s3test ("))
+        self.assertIn("KEY_ID 'key''id'", query)
+        self.assertIn("ENDPOINT '127.0.0.1:9000'", query)
+        self.assertIn("USE_SSL false", query)
+        self.assertIn("SCOPE 's3://test-bucket'", query)
+
+
+class TestStreamDuckdbCsv(unittest.TestCase):
+    @patch.object(storage, "get_duckdb_connection")
+    def test_keeps_empty_strings_apart_from_null(self, mock_connection) -> None:
+        mock_connection.return_value = duckdb.connect()
+        query = """
+            SELECT * FROM (VALUES
+                (1, NULL, DATE '2026-01-05'),
+                (2, '', NULL),
+                (3, 'tab' || chr(9) || 'quote" comma, new' || chr(10) || 'line', NULL),
+                (4, '\\N', DATE '2026-01-07')
+            ) t(id, note, day)
+        """
+
+        chunks = list(storage.stream_duckdb_csv(query, batch_size=2))
+
+        self.assertEqual(len(chunks), 2)
+        # Read the way Postgres COPY (FORMAT csv) does: only unquoted empty is NULL
+        table = pa_csv.read_csv(
+            io.BytesIO(b"".join(chunks)),
+            read_options=pa_csv.ReadOptions(column_names=["id", "note", "day"]),
+            convert_options=pa_csv.ConvertOptions(
+                strings_can_be_null=True, quoted_strings_can_be_null=False
+            ),
+        )
+        expected = duckdb.sql(query).fetchall()
+        self.assertEqual(list(zip(*table.to_pydict().values(), strict=True)), expected)
+
+
+class TestPublishS3Prefix(LocalS3TestCase):
+    module = storage
+
+    def write_tmp(self, *names: str) -> None:
+        for name in names:
+            path = self.root / "tmp/out" / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(name)
+
+    def published_names(self) -> list[str]:
+        return sorted(
+            pathlib.Path(path).read_text()
+            for path in self.local_paths(
+                storage.get_published_parquet_paths("bucket", "agg/out")
+            )
+        )
+
+    def local_paths(self, s3_paths: list[str]) -> list[pathlib.Path]:
+        return [self.root / path.split("/", 3)[3] for path in s3_paths]
+
+    def test_keeps_previous_generation_until_next_publish(self) -> None:
+        self.write_tmp("a=1/x.parquet", "a=2/y.parquet")
+        first = storage.publish_s3_prefix("bucket", "tmp/out", "agg/out")
+        self.write_tmp("a=1/z.parquet")
+        second = storage.publish_s3_prefix("bucket", "tmp/out/", "agg/out/")
+
+        self.assertEqual(self.published_names(), ["a=1/z.parquet"])
+        # One generation directory per publish
+        self.assertEqual(len({path.rsplit("/", 2)[0] for path in first}), 1)
+        self.assertTrue(second[0].endswith("/a=1/z.parquet"))
+        self.assertTrue(all(p.exists() for p in self.local_paths(first)))
+        self.assertFalse(list((self.root / "tmp/out").glob("**/*.parquet")))
+
+        self.write_tmp("w.parquet")
+        storage.publish_s3_prefix("bucket", "tmp/out", "agg/out")
+
+        self.assertEqual(self.published_names(), ["w.parquet"])
+        self.assertFalse(any(p.exists() for p in self.local_paths(first)))
+        self.assertTrue(all(p.exists() for p in self.local_paths(second)))
+
+    def test_failed_copy_keeps_published_files(self) -> None:
+        self.write_tmp("x.parquet")
+        storage.publish_s3_prefix("bucket", "tmp/out", "agg/out")
+        self.write_tmp("y.parquet", "z.parquet")
+
+        with patch.object(self.s3_client, "copy", side_effect=OSError("copy failed")):
+            with self.assertRaises(OSError):
+                storage.publish_s3_prefix("bucket", "tmp/out", "agg/out")
+
+        self.assertEqual(self.published_names(), ["x.parquet"])
+
+    def test_manifest_starts_from_listed_files(self) -> None:
+        (self.root / "agg/out").mkdir(parents=True)
+        (self.root / "agg/out/old.parquet").write_text("old.parquet")
+        self.assertEqual(self.published_names(), ["old.parquet"])
+
+        self.write_tmp("x.parquet")
+        (self.root / "tmp/out").rename(self.root / "agg/out/delta_1")
+        storage.update_s3_manifest(
+            "bucket",
+            "agg/out",
+            add_paths=storage.get_parquet_paths_by_prefix("bucket", "agg/out/delta_1/"),
+        )
+        self.assertEqual(self.published_names(), ["old.parquet", "x.parquet"])
+
+        storage.update_s3_manifest("bucket", "agg/out", remove_under="agg/out/delta_1")
+        self.assertEqual(self.published_names(), ["old.parquet"])
+
+
+if __name__ == "__main__":
+    unittest.main()
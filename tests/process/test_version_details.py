@@ -0,0 +1,304 @@
+import datetime
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from adscrawler.config import CONFIG
+from adscrawler.process import (
+    AGG_MATCHED_SDK_STRINGS,
+    AGG_MATCHED_SDK_STRINGS_LATEST,
+    AGG_PATTERN_MATCHES,
+    AGG_VERSION_DETAILS,
+    LOOKUP_SDK_MEDIATION_PATTERNS,
+    LOOKUP_SDK_PACKAGE_PATTERNS,
+    LOOKUP_SDK_PATH_PATTERNS,
+    LOOKUP_VERSION_CODES,
+    LOOKUP_VERSION_STRINGS,
+    RAW_DATA_VERSION_DETAILS,
+    RAW_DATA_VERSION_DETAILS_INCOMING,
+)
+from adscrawler.process import version_details as vd
+from adscrawler.process.storage import (
+    get_parquet_paths_by_prefix,
+    get_published_parquet_paths,
+)
+from tests.process.local_s3 import LocalS3TestCase
+
+BUCKET = CONFIG["s3"]["bucket"]
+
+
+def days_ago(days: int) -> str:
+    """A raw partition date, compaction only writes recent ones."""
+    today = datetime.datetime.now(datetime.UTC).date()
+    return (today - datetime.timedelta(days=days)).isoformat()
+
+
+# One id per string_bucket a test string falls into
+SECOND_BUCKET_ID = 60_000_000
+
+OUTPUTS = {
+    AGG_VERSION_DETAILS: ["string_id", "version_code_id"],
+    AGG_PATTERN_MATCHES: ["string_id", "sdk_id"],
+    AGG_MATCHED_SDK_STRINGS: [
+        "store_app",
+        "version_code_id",
+        "string_id",
+        "sdk_id",
+        "version_code_created_at",
+    ],
+    AGG_MATCHED_SDK_STRINGS_LATEST: ["store_app", "string_id", "sdk_id"],
+}
+
+
+class TestUpdateVersionDetailsAggregates(LocalS3TestCase):
+    module = vd
+
+    def setUp(self) -> None:
+        super().setUp()
+        # Compactions of the test are merged right away
+        patcher = patch.object(vd, "_RAW_SETTLE_MS", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # DuckDB creates the output directory, but not its parents
+        for parent in ["agg-data", "tmp"]:
+            (self.root / parent).mkdir()
+        self.strings = pd.DataFrame(
+            {
+                "id": [1, 2, 3, 4, 5, SECOND_BUCKET_ID],
+                "xml_path": [None, None, "manifest/meta-data", None, None, None],
+                "tag": "meta-data",
+                "value_name": [
+                    "com.applovin.sdk.AppLovinSdk",
+                    "com.unity3d.ads.UnityAds",
+                    None,
+                    "com.example.internal",
+                    "com.google.ads.mediation.applovin.Adapter",
+                    "com.unity3d.services.Core",
+                ],
+            }
+        )
+        self.version_codes = pd.DataFrame(
+            {
+                "id": [1, 2, 3, 4],
+                "created_at": pd.to_datetime(
+                    ["2026-01-01", "2026-02-01", "2026-01-15", "2026-01-20"]
+                ),
+                "store_app": [100, 100, 200, 300],
+                "version_code": ["1", "2", "7", "3"],
+            }
+        )
+        self.package_patterns = pd.DataFrame(
+            {
+                "id": [1, 2],
+                "sdk_id": [10, 20],
+                "package_pattern": ["com.applovin", "com.unity3d"],
+            }
+        )
+        self.write_lookups()
+        self.write_raw(days_ago(4), [(1, 1), (2, 1), (3, 2), (4, 2), (1, 3)])
+        self.write_raw(days_ago(3), [(2, 2), (5, 4), (SECOND_BUCKET_ID, 3)])
+
+    @property
+    def state(self) -> dict | None:
+        return vd._read_version_details_state()
+
+    def write_lookups(self) -> None:
+        for key, df in [
+            (LOOKUP_VERSION_STRINGS, self.strings),
+            (LOOKUP_VERSION_CODES, self.version_codes),
+            (LOOKUP_SDK_PACKAGE_PATTERNS, self.package_patterns),
+            (
+                LOOKUP_SDK_PATH_PATTERNS,
+                pd.DataFrame(
+                    {"id": [1], "sdk_id": [30], "path_pattern": ["manifest/meta-data"]}
+                ),
+            ),
+            (
+                LOOKUP_SDK_MEDIATION_PATTERNS,
+                pd.DataFrame(
+                    {"sdk_id": [40], "mediation_pattern": ["com.google.ads.mediation"]}
+                ),
+            ),
+        ]:
+            path = self.root / key
+            path.parent.mkdir(parents=True, exist_ok=True)
+            df.to_parquet(path)
+
+    def write_raw(self, date_str: str, pairs: list[tuple[int, int]]) -> None:
+        """Compact ``(string_id, version_code_id)`` pairs into raw-data."""
+        path = self.root / (
+            f"{RAW_DATA_VERSION_DETAILS_INCOMING}/date={date_str}/incoming.parquet"
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame(pairs, columns=["string_id", "version_code_id"]).to_parquet(path)
+        vd.compact_incoming_version_details(date_str)
+
+    def read_outputs(self) -> dict[str, list[tuple]]:
+        outputs = {}
+        with self.connect("s3") as con:
+            for prefix, columns in OUTPUTS.items():
+                paths = get_published_parquet_paths(BUCKET, prefix)
+                outputs[prefix] = sorted(
+                    con.execute(f"""
+                        SELECT {", ".join(columns)}
+                        FROM read_parquet({paths})
+                    """).fetchall(),
+                    key=str,
+                )
+        return outputs
+
+    def delta_files(self) -> list[str]:
+        return [
+            path
+            for prefix in OUTPUTS
+            for path in get_published_parquet_paths(BUCKET, prefix)
+            if "/delta_" in path
+        ]
+
+    def test_incremental_matches_full_rebuild(self) -> None:
+        vd.update_version_details_aggregates()
+        self.assertEqual(self.state["seq"], 0)
+        self.assertEqual(self.state["max_string_id"], SECOND_BUCKET_ID)
+
+        # New strings, an app update, a backfilled old version and a new app
+        self.strings = pd.concat(
+            [
+                self.strings,
+                pd.DataFrame(
+                    {
+                        "id": [SECOND_BUCKET_ID + 1, SECOND_BUCKET_ID + 2],
+                        "xml_path": None,
+                        "tag": "meta-data",
+                        "value_name": ["com.applovin.mediation.Max", "org.example"],
+                    }
+                ),
+            ]
+        )
+        self.version_codes = pd.concat(
+            [
+                self.version_codes,
+                pd.DataFrame(
+                    {
+                        "id": [5, 6, 7],
+                        "created_at": pd.to_datetime(
+                            ["2026-03-01", "2025-12-01", "2026-03-01"]
+                        ),
+                        "store_app": [200, 100, 400],
+                        "version_code": ["8", "0", "1"],
+                    }
+                ),
+            ]
+        )
+        self.write_lookups()
+        self.write_raw(
+            days_ago(2),
+            [
+                # Already merged
+                (1, 1),
+                (5, 4),
+                # Late details of the latest version of app 100
+                (3, 2),
+                (5, 2),
+                (SECOND_BUCKET_ID + 1, 5),
+                (2, 5),
+                (1, 6),
+                (SECOND_BUCKET_ID + 2, 7),
+                (2, 7),
+            ],
+        )
+        vd.update_version_details_aggregates()
+
+        self.assertEqual(self.state["seq"], 1)
+        self.assertEqual(self.state["rebuilt_seq"], 0)
+        self.assertTrue(self.delta_files())
+        incremental = self.read_outputs()
+        latest = incremental[AGG_MATCHED_SDK_STRINGS_LATEST]
+        self.assertNotIn((200, 1, 10), latest)
+        self.assertIn((200, SECOND_BUCKET_ID + 1, 10), latest)
+        self.assertIn((100, 5, 40), latest)
+
+        # Nothing new: the outputs stay as they are
+        vd.update_version_details_aggregates()
+        self.assertEqual(self.state["seq"], 2)
+        self.assertEqual(self.read_outputs(), incremental)
+
+        vd.update_version_details_aggregates(full_rebuild=True)
+        self.assertEqual(self.state["rebuilt_seq"], 3)
+        self.assertEqual(self.delta_files(), [])
+        self.assertEqual(self.read_outputs(), incremental)
+
+    def test_changed_patterns_rebuild(self) -> None:
+        vd.update_version_details_aggregates()
+        self.package_patterns.loc[1, "package_pattern"] = "com.unity3d.ads"
+        self.write_lookups()
+        self.write_raw(days_ago(2), [(4, 4)])
+
+        vd.update_version_details_aggregates()
+
+        self.assertEqual(self.state["rebuilt_seq"], 1)
+        self.assertEqual(self.delta_files(), [])
+        matches = self.read_outputs()[AGG_PATTERN_MATCHES]
+        self.assertNotIn((SECOND_BUCKET_ID, 20), matches)
+        self.assertIn((2, 20), matches)
+
+    def test_failed_update_is_redone(self) -> None:
+        vd.update_version_details_aggregates()
+        state = self.state
+        self.write_raw(days_ago(2), [(2, 3)])
+        with patch.object(
+            vd, "_publish_matched_app_sdk_strings_latest", return_value=False
+        ):
+            vd.update_version_details_aggregates()
+        self.assertEqual(self.state, state)
+
+        vd.update_version_details_aggregates()
+
+        self.assertEqual(self.state["seq"], 1)
+        self.assertEqual(
+            len([p for p in self.delta_files() if AGG_VERSION_DETAILS in p]), 1
+        )
+        self.assertIn((200, 2, 20), self.read_outputs()[AGG_MATCHED_SDK_STRINGS_LATEST])
+
+    def test_raw_files_tracked_by_watermark(self) -> None:
+        vd.update_version_details_aggregates()
+        self.assertNotIn("raw_files", self.state)
+        self.write_raw(days_ago(2), [(2, 3)])
+
+        with patch.object(
+            vd, "get_parquet_paths_by_prefix", wraps=get_parquet_paths_by_prefix
+        ) as listing:
+            vd.update_version_details_aggregates()
+
+        raw_listings = [
+            call
+            for call in listing.call_args_list
+            if call.args[1].startswith(RAW_DATA_VERSION_DETAILS)
+        ]
+        # One listing per string_bucket, from the date before the watermark on
+        self.assertEqual(len(raw_listings), 2)
+        for call in raw_listings:
+            self.assertIn(
+                f"/date={days_ago(vd._RAW_LATE_DAYS)}", call.kwargs["start_after"]
+            )
+        self.assertIn((200, 2, 20), self.read_outputs()[AGG_MATCHED_SDK_STRINGS_LATEST])
+
+    def test_state_with_raw_files_list(self) -> None:
+        vd.update_version_details_aggregates()
+        state = self.state
+        del state["raw_compacted_ms"]
+        state["raw_files"] = get_parquet_paths_by_prefix(
+            BUCKET, f"{RAW_DATA_VERSION_DETAILS}/"
+        )
+        vd._write_version_details_state(state)
+        self.write_raw(days_ago(2), [(2, 3)])
+
+        vd.update_version_details_aggregates()
+
+        self.assertNotIn("raw_files", self.state)
+        self.assertIn("raw_compacted_ms", self.state)
+        self.assertIn((200, 2, 20), self.read_outputs()[AGG_MATCHED_SDK_STRINGS_LATEST])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import datetime
+import unittest
+from unittest.mock import Mock, patch
+
+import pandas as pd
+
+from adscrawler import scrape
+
+
+class TestHostThrottle(unittest.TestCase):
+    @patch("adscrawler.scrape.time.sleep")
+    @patch("adscrawler.scrape.time.monotonic", return_value=100.0)
+    def test_wait_spaces_requests_per_host(self, _mock_monotonic, mock_sleep) -> None:
+        throttle = scrape.HostThrottle(min_interval=0.5)
+
+        throttle.wait("http://example.com/app-ads.txt")
+        throttle.wait("https://example.com/app-ads.txt")
+        throttle.wait("http://other.com/app-ads.txt")
+
+        mock_sleep.assert_called_once_with(0.5)
+
+
+class TestRequestAppAds(unittest.TestCase):
+    @patch("adscrawler.scrape.get_ads_url")
+    def test_replaced_responses_are_closed(self, mock_get) -> None:
+        responses = [
+            Mock(status_code=status, headers={"Content-Length": "30"})
+            for status in [403, 403, 404, 200]
+        ]
+        responses[-1].text = "google.com, pub-1, DIRECT, f08c"
+        mock_get.side_effect = responses
+
+        text = scrape.request_app_ads("http://example.com/app-ads.txt")
+
+        self.assertEqual(text, responses[-1].text)
+        for response in responses[:-1]:
+            response.close.assert_called()
+
+    @patch("adscrawler.scrape.get_ads_url")
+    def test_still_failing_raises(self, mock_get) -> None:
+        responses = [Mock(status_code=500, headers={}) for _ in range(3)]
+        mock_get.side_effect = responses
+
+        with self.assertRaises(scrape.NoAdsTxtError):
+            scrape.request_app_ads("http://example.com/app-ads.txt")
+
+        for response in responses:
+            response.close.assert_called()
+
+
+class TestParseAdsTxt(unittest.TestCase):
+    txt = (
+        "# ads.txt\r\n"
+        "OWNERDOMAIN=example.com\r\n"
+        "\r\n"
+        "google.com, pub-1, DIRECT, f08c47fec0942fa0\r\n"
+        "appnexus.com, 123, RESELLER # inline\r\n"
+        "unity.com, 9, DIRECT, abc, note1, note2"
+    )
+
+    def test_parse_ads_txt_columns(self) -> None:
+        df = scrape.parse_ads_txt(self.txt)
+
+        self.assertEqual(df.columns.tolist(), scrape.ADS_TXT_COLUMNS)
+        self.assertEqual(
+            df["domain"].tolist(),
+            ["OWNERDOMAIN=example.com", "google.com", "appnexus.com", "unity.com"],
+        )
+        self.assertEqual(df.loc[2, "relationship"], "RESELLER#inline")
+        self.assertTrue(pd.isna(df.loc[2, "certification_auth"]))
+        self.assertEqual(df.loc[3, "notes"], "note1,note2")
+
+    def test_parse_ads_txt_without_notes(self) -> None:
+        df = scrape.parse_ads_txt("google.com, pub-1, DIRECT\n")
+
+        self.assertEqual(df.columns.tolist(), scrape.ADS_TXT_COLUMNS[:-1])
+
+    def test_feed_in_chunks_matches_whole_text(self) -> None:
+        parser = scrape.AdsTxtParser()
+        for i in range(0, len(self.txt), 7):
+            parser.feed(self.txt[i : i + 7])
+
+        pd.testing.assert_frame_equal(parser.close(), scrape.parse_ads_txt(self.txt))
+
+    def test_clean_raw_txt_df(self) -> None:
+        df = scrape.clean_raw_txt_df(scrape.parse_ads_txt(self.txt))
+
+        self.assertEqual(
+            df["domain_name"].tolist(), ["google.com", "appnexus.com", "unity.com"]
+        )
+        self.assertEqual(df["relationship"].tolist(), ["DIRECT", "RESELLER", "DIRECT"])
+
+
+class TestCrawlAppAds(unittest.TestCase):
+    @patch("adscrawler.scrape.save_app_ads_results")
+    @patch("adscrawler.scrape.fetch_app_ads")
+    @patch("adscrawler.scrape.query_pub_domains_to_crawl_ads_txt")
+    def test_crawl_app_ads_writes_in_batches(
+        self,
+        mock_query: Mock,
+        mock_fetch: Mock,
+        mock_save: Mock,
+    ) -> None:
+        mock_query.return_value = pd.DataFrame(
+            {"id": range(5), "url": [f"site{i}.com" for i in range(5)]}
+        )
+        mock_fetch.side_effect = lambda url, domain_id: scrape.AppAdsTxtResult(
+            domain_id=domain_id,
+            crawl_result=3,
+            crawled_at=datetime.datetime.now(tz=datetime.UTC),
+            txt_df=None,
+        )
+        mock_save.return_value = 0
+        pgdb = Mock()
+
+        scrape.crawl_app_ads(pgdb=pgdb, limit=5, workers=3, batch_size=2)
+
+        self.assertEqual(mock_fetch.call_count, 5)
+        batch_sizes = [len(c.kwargs["results"]) for c in mock_save.call_args_list]
+        self.assertEqual(batch_sizes, [2, 2, 1])
+        saved_ids = sorted(
+            r["domain_id"]
+            for c in mock_save.call_args_list
+            for r in c.kwargs["results"]
+        )
+        self.assertEqual(saved_ids, list(range(5)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import types
+import unittest
+from unittest.mock import patch
+
+import geoip2.errors
+import pandas as pd
+
+from adscrawler.mitm_ad_parser import mitm_logs
+from adscrawler.tools import geo
+
+CITIES = {
+    "1.1.1.1": ("AU", "NSW", "Sydney", "Cloudflare"),
+    "8.8.8.8": ("US", "CA", "Mountain View", "Google"),
+}
+
+
+class FakeReader:
+    """geoip2 Reader answering from CITIES, counting opens and lookups."""
+
+    opened: list[tuple[str, int]] = []
+    lookups: list[str] = []
+
+    def __init__(self, path: str, mode: int) -> None:
+        FakeReader.opened.append((path.rsplit("/", 1)[-1], mode))
+
+    def _find(self, ip: str) -> tuple:
+        FakeReader.lookups.append(ip)
+        if ip not in CITIES:
+            raise geoip2.errors.AddressNotFoundError(f"{ip} not found")
+        return CITIES[ip]
+
+    def city(self, ip: str) -> types.SimpleNamespace:
+        country, state, city, _org = self._find(ip)
+        name = types.SimpleNamespace
+        return name(
+            country=name(iso_code=country, name=country),
+            subdivisions=name(most_specific=name(iso_code=state, name=state)),
+            city=name(name=city),
+            postal=name(code=None),
+            location=name(latitude=0.0, longitude=0.0),
+            traits=name(network=f"{ip}/32"),
+        )
+
+    def asn(self, ip: str) -> types.SimpleNamespace:
+        return types.SimpleNamespace(
+            autonomous_system_number=1,
+            autonomous_system_organization=CITIES[ip][3],
+        )
+
+
+class TestLookupIps(unittest.TestCase):
+    def setUp(self) -> None:
+        FakeReader.opened, FakeReader.lookups = [], []
+        patcher = patch.object(geo.geoip2.database, "Reader", FakeReader)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for cached in [geo.get_geo_readers, geo.lookup_ip]:
+            cached.cache_clear()
+            self.addCleanup(cached.cache_clear)
+
+    def test_each_unique_ip_is_looked_up_once(self) -> None:
+        ips = ["8.8.8.8", "1.1.1.1", "8.8.8.8", None, "10.0.0.1", "1.1.1.1"]
+
+        df = geo.lookup_ips(ips)
+        again = geo.lookup_ips(ips)
+
+        self.assertEqual(df.columns.tolist(), ["ip_address", *geo.GEO_FIELDS])
+        self.assertEqual(df["ip_address"].tolist(), ["8.8.8.8", "1.1.1.1", "10.0.0.1"])
+        self.assertEqual(df.iloc[1, 1:].tolist(), ["AU", "NSW", "Sydney", "Cloudflare"])
+        self.assertTrue(df.iloc[2, 1:].isna().all())
+        pd.testing.assert_frame_equal(again, df)
+        self.assertEqual(
+            FakeReader.opened,
+            [
+                ("GeoLite2-City.mmdb", geo.geoip2.database.MODE_MMAP),
+                ("GeoLite2-ASN.mmdb", geo.geoip2.database.MODE_MMAP),
+            ],
+        )
+        self.assertEqual(FakeReader.lookups, ["8.8.8.8", "1.1.1.1", "10.0.0.1"])
+
+    @patch.object(mitm_logs, "query_countries")
+    def test_snapshot_keeps_rows(self, mock_countries) -> None:
+        mock_countries.return_value = pd.DataFrame(
+            {"id": [1, 2], "alpha2": ["US", "AU"]}
+        )
+        df = pd.DataFrame(
+            {
+                "mitm_uuid": ["a", "b", "c", "d"],
+                "ip_address": ["8.8.8.8", "10.0.0.1", "8.8.8.8", "1.1.1.1"],
+            }
+        )
+
+        gdf = mitm_logs.make_ip_geo_snapshot_df(df, pgdb=None)
+
+        self.assertEqual(gdf["mitm_uuid"].tolist(), ["a", "b", "c", "d"])
+        self.assertEqual(gdf["country_id"].tolist()[::2], [1, 1])
+        self.assertEqual(gdf["org"].tolist()[2:], ["Google", "Cloudflare"])
+        self.assertEqual(len(FakeReader.lookups), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()